@@ -0,0 +1,252 @@
+# analytics_controller.py
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import case, delete, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from model.analytics_model import AppointmentRollup
+from model.appointment_model import Appointment
+from model.doctor_model import Doctors
+from core.sharding import shards
+from core.leader import run_as_leader
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات التجميع ----------------
+PERIODS = ("day", "week")
+SLOTS_PER_DAY = 13              # من 10:00 حتى 16:00 كل نصف ساعة
+WORKING_DAYS_PER_WEEK = 5       # الأحد - الخميس
+RECONCILE_DAYS_BACK = int(os.getenv("ANALYTICS_RECONCILE_DAYS_BACK", "35"))
+RECONCILE_DAYS_AHEAD = int(os.getenv("ANALYTICS_RECONCILE_DAYS_AHEAD", "90"))
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("ANALYTICS_RECONCILE_INTERVAL", str(60 * 60)))
+
+STATUS_COLUMNS = {"Scheduled": "scheduled", "Cancelled": "cancelled", "Completed": "completed"}
+
+
+def week_start(day: date) -> date:
+    """بداية الأسبوع يوم الأحد."""
+    return day - timedelta(days=(day.weekday() + 1) % 7)
+
+
+def period_start(period: str, day: date) -> date:
+    return day if period == "day" else week_start(day)
+
+
+# ---------------- التحديث التزايدي مع كل حجز/إلغاء ----------------
+def apply_rollup_delta(db: Session, doctor_id: int, specialty: str, date_time: datetime, **deltas: int):
+    """
+    يضيف الفروقات (scheduled=+1, cancelled=+1 ...) لصفوف اليوم والأسبوع
+    بعبارة upsert واحدة داخل نفس معاملة الحجز.
+    """
+    table = AppointmentRollup.__table__
+    dialect = db.get_bind().dialect.name
+    upsert = pg_insert if dialect == "postgresql" else sqlite_insert
+
+    rows = [
+        {
+            "period": period,
+            "period_start": period_start(period, date_time.date()),
+            "doctor_id": doctor_id,
+            "specialty": specialty,
+            "scheduled": deltas.get("scheduled", 0),
+            "cancelled": deltas.get("cancelled", 0),
+            "completed": deltas.get("completed", 0),
+            "updated_at": datetime.utcnow(),
+        }
+        for period in PERIODS
+    ]
+    stmt = upsert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.period, table.c.period_start, table.c.doctor_id],
+        set_={
+            "specialty": stmt.excluded.specialty,
+            "scheduled": table.c.scheduled + stmt.excluded.scheduled,
+            "cancelled": table.c.cancelled + stmt.excluded.cancelled,
+            "completed": table.c.completed + stmt.excluded.completed,
+            "updated_at": stmt.excluded.updated_at,
+        }
+    )
+    db.execute(stmt)
+
+
+def record_booking(db: Session, doctor_id: int, specialty: str, date_time: datetime):
+    apply_rollup_delta(db, doctor_id, specialty, date_time, scheduled=1)
+
+
+def record_cancellation(db: Session, doctor_id: int, specialty: str, date_time: datetime):
+    apply_rollup_delta(db, doctor_id, specialty, date_time, scheduled=-1, cancelled=1)
+
+
+# ---------------- المطابقة الدورية مع الجدول الأصلي ----------------
+def _reconcile_shard(db: Session, start: date, end: date) -> int:
+    day_column = func.date(Appointment.date_time)
+    counts = (
+        select(
+            Appointment.doctor_id,
+            Doctors.specialty,
+            day_column.label("day"),
+            *[
+                func.sum(case((Appointment.status == status, 1), else_=0)).label(column)
+                for status, column in STATUS_COLUMNS.items()
+            ]
+        )
+        .join(Doctors, Doctors.id == Appointment.doctor_id)
+        .where(Appointment.date_time >= start, Appointment.date_time < end)
+        .group_by(Appointment.doctor_id, Doctors.specialty, day_column)
+    )
+
+    if db.get_bind().dialect.name == "postgresql":
+        # نمنع التحديثات التزايدية أثناء إعادة الكتابة حتى لا تضيع أو تتكرر
+        db.execute(text("LOCK TABLE appointment_rollups IN SHARE ROW EXCLUSIVE MODE"))
+
+    now = datetime.utcnow()
+    rows = {}
+    for row in db.execute(counts):
+        day = row.day if isinstance(row.day, date) else date.fromisoformat(row.day)
+        for period in PERIODS:
+            key = (period, period_start(period, day), row.doctor_id)
+            totals = rows.setdefault(key, defaultdict(int, specialty=row.specialty))
+            for column in STATUS_COLUMNS.values():
+                totals[column] += getattr(row, column) or 0
+
+    db.execute(delete(AppointmentRollup).where(
+        AppointmentRollup.period_start >= start,
+        AppointmentRollup.period_start < end
+    ))
+    if rows:
+        db.execute(insert(AppointmentRollup), [
+            {
+                "period": period,
+                "period_start": start_day,
+                "doctor_id": doctor_id,
+                "specialty": totals["specialty"],
+                "scheduled": totals["scheduled"],
+                "cancelled": totals["cancelled"],
+                "completed": totals["completed"],
+                "updated_at": now,
+            }
+            for (period, start_day, doctor_id), totals in rows.items()
+        ])
+    db.commit()
+    return len(rows)
+
+
+def reconcile_rollups(days_back: int = RECONCILE_DAYS_BACK, days_ahead: int = RECONCILE_DAYS_AHEAD) -> int:
+    """
+    يعيد حساب العدادات من جدول المواعيد لنافذة زمنية محدودة (أسابيع كاملة)
+    ليصحح أي انحراف، مثل المواعيد التي تحولت إلى Completed. العدادات تُخزن بجانب
+    مواعيدها، فتُطابق كل شارد على حدة. يرجع عدد الصفوف.
+    """
+    today = date.today()
+    start = week_start(today - timedelta(days=days_back))
+    end = week_start(today + timedelta(days=days_ahead)) + timedelta(days=7)
+
+    total = 0
+    for name in shards.names():
+        with shards.session(name) as db:
+            total += _reconcile_shard(db, start, end)
+    return total
+
+
+async def rollup_reconcile_loop(interval_seconds: int = RECONCILE_INTERVAL_SECONDS):
+    await run_as_leader("rollup-reconcile", reconcile_rollups, interval_seconds,
+                        "فشل مطابقة إحصائيات المواعيد")
+
+
+# ---------------- القراءة للوحات التحكم ----------------
+def _validate_range(period: str, start: date, end: date):
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail="period must be 'day' or 'week'")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+
+def _capacity(period: str, day: date) -> int:
+    if period == "week":
+        return SLOTS_PER_DAY * WORKING_DAYS_PER_WEEK
+    # الجمعة والسبت عطلة
+    return SLOTS_PER_DAY if day.weekday() not in (4, 5) else 0
+
+
+def _utilisation(booked: int, capacity: int):
+    return round(booked / capacity, 4) if capacity else None
+
+
+def get_doctor_rollups(db: Session, period: str, start: date, end: date, doctor_id: int = None):
+    _validate_range(period, start, end)
+    stmt = select(AppointmentRollup).where(
+        AppointmentRollup.period == period,
+        AppointmentRollup.period_start >= period_start(period, start),
+        AppointmentRollup.period_start <= end
+    )
+    if doctor_id is not None:
+        stmt = stmt.where(AppointmentRollup.doctor_id == doctor_id)
+
+    # عدادات كل عيادة في شاردها؛ أثناء نقل عيادة قد يظهر الصف في شاردين فنأخذ الأول
+    found = {}
+    for rows in shards.scatter_gather(lambda session: session.execute(stmt).scalars().all(), db):
+        for row in rows:
+            found.setdefault((row.period_start, row.doctor_id), row)
+
+    result = []
+    for key in sorted(found):
+        row = found[key]
+        booked = row.scheduled + row.completed
+        result.append({
+            "doctor_id": row.doctor_id,
+            "specialty": row.specialty,
+            "period_start": row.period_start.isoformat(),
+            "scheduled": row.scheduled,
+            "cancelled": row.cancelled,
+            "completed": row.completed,
+            "utilisation": _utilisation(booked, _capacity(period, row.period_start)),
+        })
+    return {"period": period, "rows": result}
+
+
+def get_specialty_rollups(db: Session, period: str, start: date, end: date):
+    _validate_range(period, start, end)
+    stmt = select(
+        AppointmentRollup.specialty,
+        AppointmentRollup.period_start,
+        func.count(AppointmentRollup.doctor_id).label("doctors"),
+        func.sum(AppointmentRollup.scheduled).label("scheduled"),
+        func.sum(AppointmentRollup.cancelled).label("cancelled"),
+        func.sum(AppointmentRollup.completed).label("completed"),
+    ).where(
+        AppointmentRollup.period == period,
+        AppointmentRollup.period_start >= period_start(period, start),
+        AppointmentRollup.period_start <= end
+    ).group_by(AppointmentRollup.specialty, AppointmentRollup.period_start)
+
+    # نفس التجميع في كل شارد ثم جمع النتائج (أطباء كل شارد مختلفون)
+    totals = {}
+    for rows in shards.scatter_gather(lambda session: session.execute(stmt).all(), db):
+        for row in rows:
+            merged = totals.setdefault((row.period_start, row.specialty), defaultdict(int))
+            for column in ("doctors", "scheduled", "cancelled", "completed"):
+                merged[column] += getattr(row, column) or 0
+
+    return {
+        "period": period,
+        "rows": [
+            {
+                "specialty": specialty,
+                "period_start": start_day.isoformat(),
+                "scheduled": merged["scheduled"],
+                "cancelled": merged["cancelled"],
+                "completed": merged["completed"],
+                "utilisation": _utilisation(
+                    merged["scheduled"] + merged["completed"],
+                    _capacity(period, start_day) * merged["doctors"]
+                ),
+            }
+            for (start_day, specialty), merged in sorted(totals.items(), key=lambda item: (item[0][0], item[0][1] or ""))
+        ]
+    }
@@ -1,13 +1,15 @@
 from fastapi import HTTPException, APIRouter, Depends
 from sqlalchemy.orm import Session
-from datetime import datetime, time
+from datetime import datetime
 from jose import jwt
 from database import get_db
 from model.appointment_model import Appointment
 from model.doctor_model import Doctors
 from model.patient_model import Users
 from Controller.images_controller import get_last_user_image  # ✅ استيراد
+from core.queries import DOCTOR_BY_ID, ACTIVE_APPOINTMENT_AT_SLOT
 from fastapi.security import OAuth2PasswordBearer
+from Controller.schedule_controller import validate_booking_slot
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -32,27 +34,14 @@ def get_all_doctors(db: Session):
 # 1️⃣ حجز موعد جديد مع ربط آخر صورة
 # ------------------------
 def book_appointment(db: Session, user: Users, doctor_id: int, date_time: datetime, reason: str = None):
-    doctor = db.query(Doctors).filter(Doctors.id == doctor_id).first()
+    doctor = db.execute(DOCTOR_BY_ID, {"doctor_id": doctor_id}).scalars().first()
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
 
-    now = datetime.now()
-    if date_time <= now:
-        raise HTTPException(status_code=400, detail="Cannot book an appointment in the past")
+    validate_booking_slot(db, doctor_id, date_time)
 
-    if date_time.time() < time(10, 0) or date_time.time() > time(16, 0):
-        raise HTTPException(status_code=400, detail="Appointment must be within working hours (10:00 - 16:00)")
-
-    if date_time.weekday() > 4:
-        raise HTTPException(status_code=400, detail="Appointments are only allowed from Sunday to Thursday")
-
-    if date_time.minute not in (0, 30):
-        raise HTTPException(status_code=400, detail="Appointments must start at 00 or 30 minutes")
-
-    conflict = db.query(Appointment).filter(
-        Appointment.doctor_id == doctor_id,
-        Appointment.date_time == date_time,
-        Appointment.status != "Cancelled"
+    conflict = db.execute(
+        ACTIVE_APPOINTMENT_AT_SLOT, {"doctor_id": doctor_id, "date_time": date_time}
     ).first()
     if conflict:
         raise HTTPException(status_code=400, detail="Doctor already has an appointment at this time")
@@ -0,0 +1,339 @@
+# export_controller.py
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Literal, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from model.appointment_model import Appointment, AppointmentArchive
+from model.doctor_model import Doctors
+from model.export_model import ExportJob
+from core.idempotency import request_fingerprint
+from core.sharding import shards
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات التصدير ----------------
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR", "exports"))
+EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+EXPORT_TTL = timedelta(hours=int(os.getenv("EXPORT_TTL_HOURS", "24")))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))   # صفوف في الذاكرة في كل مرة
+EXPORT_POLL_SECONDS = int(os.getenv("EXPORT_POLL_SECONDS", "5"))
+EXPORT_STALE_SECONDS = int(os.getenv("EXPORT_STALE_SECONDS", str(10 * 60)))  # بلا نبض لهذه المدة = العامل توقف
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+EXPORT_COLUMNS = (
+    "appointment_id", "date_time", "status", "reason",
+    "doctor_id", "doctor_name", "specialty", "patient_id", "updated_at",
+)
+MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+class ExportRequest(BaseModel):
+    format: Literal["csv", "parquet"] = "csv"
+    doctor_id: Optional[int] = None
+    start: Optional[date] = None
+    end: Optional[date] = None          # شامل
+    status: Optional[str] = None
+    include_archived: bool = True
+
+
+# ---------------- كتابة الملفات على دفعات ----------------
+class _CsvWriter:
+    def __init__(self, path: Path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    """ملف Parquet عمودي: كل دفعة تُكتب كـ row group مستقلة فلا تتراكم في الذاكرة."""
+
+    def __init__(self, path: Path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([
+            ("appointment_id", pa.int64()),
+            ("date_time", pa.timestamp("us")),
+            ("status", pa.string()),
+            ("reason", pa.string()),
+            ("doctor_id", pa.int64()),
+            ("doctor_name", pa.string()),
+            ("specialty", pa.string()),
+            ("patient_id", pa.int64()),
+            ("updated_at", pa.timestamp("us")),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+
+    def close(self):
+        self.writer.close()
+
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ---------------- إنشاء مهمة / إعادة استخدام نتيجة سابقة ----------------
+def _job_view(job: ExportJob, cached: bool = False) -> dict:
+    progress = None
+    if job.total_rows:
+        progress = round(job.rows_written / job.total_rows, 4)
+    elif job.status == "done":
+        progress = 1.0
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "format": job.format,
+        "filters": json.loads(job.filters),
+        "rows_written": job.rows_written,
+        "total_rows": job.total_rows,
+        "progress": progress,
+        "cached": cached,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "expires_at": job.expires_at,
+        "download_url": f"/exports/{job.id}/download" if job.status == "done" else None,
+        "error": job.error,
+    }
+
+
+def submit_export(db: Session, data: ExportRequest) -> dict:
+    """يسجل مهمة تصدير، أو يرجع مهمة مطابقة لم تنته صلاحيتها بعد."""
+    if data.start and data.end and data.end < data.start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if data.format == "parquet" and not _parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow on the server")
+
+    filters = data.model_dump(mode="json", exclude={"format"})
+    fingerprint = request_fingerprint("appointments", data.format, filters)
+    now = datetime.utcnow()
+    existing = db.query(ExportJob).filter(
+        ExportJob.fingerprint == fingerprint,
+        ExportJob.expires_at > now,
+        ExportJob.status != "failed"
+    ).order_by(ExportJob.created_at.desc()).first()
+    if existing:
+        return _job_view(existing, cached=True)
+
+    job = ExportJob(
+        id=uuid.uuid4().hex,
+        fingerprint=fingerprint,
+        format=data.format,
+        filters=json.dumps(filters),
+        status="queued",
+        expires_at=now + EXPORT_TTL,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _wake_worker()
+    return _job_view(job)
+
+
+def get_export(db: Session, job_id: str) -> dict:
+    job = db.get(ExportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return _job_view(job)
+
+
+def get_export_file(db: Session, job_id: str) -> tuple[Path, str, str]:
+    """يرجع (المسار, نوع المحتوى, اسم الملف) لنتيجة جاهزة."""
+    job = db.get(ExportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job.status}")
+    path = EXPORT_DIR / job.file_name
+    if job.expires_at <= datetime.utcnow() or not path.exists():
+        raise HTTPException(status_code=410, detail="Export has expired")
+    return path, MEDIA_TYPES[job.format], f"appointments-{job.id}.{job.format}"
+
+
+# ---------------- تنفيذ التصدير ----------------
+def _export_statement(model, filters: dict):
+    conditions = []
+    if filters.get("doctor_id") is not None:
+        conditions.append(model.doctor_id == filters["doctor_id"])
+    if filters.get("start"):
+        conditions.append(model.date_time >= date.fromisoformat(filters["start"]))
+    if filters.get("end"):
+        conditions.append(model.date_time < date.fromisoformat(filters["end"]) + timedelta(days=1))
+    if filters.get("status"):
+        conditions.append(model.status == filters["status"])
+
+    rows = (
+        select(
+            model.id, model.date_time, model.status, model.reason,
+            model.doctor_id, Doctors.name, Doctors.specialty, model.user_id, model.updated_at,
+        )
+        .outerjoin(Doctors, Doctors.id == model.doctor_id)
+        .where(*conditions)
+        .order_by(model.date_time, model.id)
+        # مؤشر على الخادم: لا يُحمّل أكثر من دفعة واحدة في الذاكرة
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    count = select(func.count()).select_from(model).where(*conditions)
+    return rows, count
+
+
+def _update_job(job_id: str, **values):
+    # كل تحديث (التقدم كل ثانية أثناء الكتابة) نبض يثبت أن العامل ما زال حيًا
+    values["heartbeat_at"] = datetime.utcnow()
+    with SessionLocal() as db:
+        db.query(ExportJob).filter(ExportJob.id == job_id).update(values, synchronize_session=False)
+        db.commit()
+
+
+def run_export(job_id: str) -> int:
+    """يقرأ المواعيد (وأرشيفها) من كل الشاردات على دفعات ويكتبها في ملف، ويرجع عدد الصفوف."""
+    with SessionLocal() as db:
+        job = db.get(ExportJob, job_id)
+        filters, fmt = json.loads(job.filters), job.format
+
+    models = [Appointment, AppointmentArchive] if filters.get("include_archived", True) else [Appointment]
+    statements = [_export_statement(model, filters) for model in models]
+    total = sum(
+        sum(shards.scatter_gather(lambda session: session.execute(count).scalar()))
+        for _, count in statements
+    )
+    _update_job(job_id, total_rows=total)
+
+    final = EXPORT_DIR / f"{job_id}.{fmt}"
+    partial = final.with_name(final.name + ".part")
+    writer = _ParquetWriter(partial) if fmt == "parquet" else _CsvWriter(partial)
+    written = 0
+    last_progress = time.monotonic()
+    try:
+        for rows, _ in statements:
+            for name in shards.names():
+                with shards.session(name) as session:
+                    for batch in session.execute(rows).partitions():
+                        writer.write(batch)
+                        written += len(batch)
+                        if time.monotonic() - last_progress >= PROGRESS_INTERVAL_SECONDS:
+                            _update_job(job_id, rows_written=written)
+                            last_progress = time.monotonic()
+        writer.close()
+        os.replace(partial, final)
+    except Exception:
+        writer.close()
+        partial.unlink(missing_ok=True)
+        raise
+
+    now = datetime.utcnow()
+    _update_job(
+        job_id, status="done", rows_written=written, file_name=final.name,
+        finished_at=now, expires_at=now + EXPORT_TTL,
+    )
+    return written
+
+
+def _claim_next_job() -> Optional[str]:
+    """يحجز أقدم مهمة في الانتظار (أو عالقة) لهذا العامل دون التعارض مع العمال الآخرين."""
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        job = (
+            db.query(ExportJob)
+            .filter(or_(
+                ExportJob.status == "queued",
+                and_(
+                    ExportJob.status == "running",
+                    # مهام بدأت قبل إضافة العمود ليس لها نبض
+                    func.coalesce(ExportJob.heartbeat_at, ExportJob.started_at) < now - timedelta(seconds=EXPORT_STALE_SECONDS),
+                )
+            ))
+            .order_by(ExportJob.created_at)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if not job:
+            return None
+        job.status = "running"
+        job.started_at = job.heartbeat_at = now
+        job.rows_written = 0
+        db.commit()
+        return job.id
+
+
+def purge_expired_exports() -> int:
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        expired = db.query(ExportJob).filter(ExportJob.expires_at <= now, ExportJob.status != "running").all()
+        for job in expired:
+            if job.file_name:
+                (EXPORT_DIR / job.file_name).unlink(missing_ok=True)
+            db.delete(job)
+        db.commit()
+        return len(expired)
+
+
+# ---------------- عامل التصدير في الخلفية ----------------
+_wakeup: Optional[asyncio.Event] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _wake_worker():
+    # تُستدعى من خيط الطلب، فننبه الحلقة بدل انتظار دورة الاستطلاع التالية
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+async def export_worker_loop(poll_seconds: int = EXPORT_POLL_SECONDS):
+    global _wakeup, _loop
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    last_purge = 0.0
+    while True:
+        job_id = None
+        try:
+            job_id = await asyncio.to_thread(_claim_next_job)
+            if job_id:
+                rows = await asyncio.to_thread(run_export, job_id)
+                logger.info("اكتمل التصدير", extra={"export_job": job_id, "rows": rows})
+                continue
+            if time.monotonic() - last_purge > EXPORT_TTL.total_seconds() / 24:
+                await asyncio.to_thread(purge_expired_exports)
+                last_purge = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("فشل تنفيذ مهمة التصدير")
+            if job_id:
+                await asyncio.to_thread(_update_job, job_id, status="failed", error=str(e)[:1000],
+                                        finished_at=datetime.utcnow())
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), poll_seconds)
+        except asyncio.TimeoutError:
+            pass
@@ -1,16 +1,43 @@
          
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+import asyncio
+import hashlib
+import math
+import os
 import uuid
 from fastapi import UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from jose import jwt, JWTError
 from PIL import Image
-import aiofiles
+from pydantic import BaseModel
+from sqlalchemy import insert, or_, select
+from model.appointment_model import Appointment
 from model.images_model import Images
+from core.queries import LAST_IMAGE_BY_USER
+from core.fields import IMAGE_FIELDS
+from core.auth_utils import SECRET_KEY, ALGORITHM
+from core.storage import storage, LocalDiskStorage, verify_local_url, PRESIGN_EXPIRES_SECONDS
+from core.archive import ArchiveEntry
+from core.sharding import shards
 
-# ---------------- إعداد مجلد رفع الصور ----------------
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
+# ---------------- إعدادات الصور ----------------
+# الملفات تُحفظ عبر core.storage (مجلد uploads محليًا أو S3)
 ALLOWED_EXTENSIONS = (".jpg", ".jpeg", ".png")
+CONTENT_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+MAX_IMAGE_BYTES = int(os.getenv("IMAGES_MAX_BYTES", str(200 * 1024 * 1024)))
+# الرفع المتعدد للصور الكبيرة (الأشعة): كل جزء 8MB على الأقل (S3 يشترط 5MB)
+MULTIPART_PART_SIZE = int(os.getenv("IMAGES_MULTIPART_PART_SIZE", str(8 * 1024 * 1024)))
+MAX_MULTIPART_PARTS = 1000
+
+# ---------------- إعداد الرفع الجماعي ----------------
+MAX_BATCH_FILES = int(os.getenv("IMAGES_MAX_BATCH_FILES", "20"))
+BATCH_WRITE_CONCURRENCY = int(os.getenv("IMAGES_BATCH_WRITE_CONCURRENCY", "8"))
+# التحقق عبر PIL يستهلك المعالج، لذلك نحده بمجموعة خيوط ثابتة
+validation_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("IMAGES_VALIDATION_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    thread_name_prefix="image-validation"
+)
 
 
 # ---------------- دالة التحقق من صلاحية الصورة ----------------
@@ -26,24 +53,42 @@ def validate_image(file: UploadFile):
         raise HTTPException(status_code=400, detail="الملف ليس صورة صالحة")
 
 
-# ---------------- دالة حفظ الصورة محليًا ----------------
+# ---------------- دالة حفظ الصورة ----------------
+def new_image_key(filename: str) -> str:
+    return f"{uuid.uuid4().hex}_{os.path.basename(filename)}"
+
+
 async def save_image(file: UploadFile) -> str:
-    """يحفظ الصورة داخل مجلد uploads ويعيد اسم الملف."""
-    filename = f"{uuid.uuid4().hex}_{file.filename}"
-    file_path = UPLOAD_DIR / filename
-    async with aiofiles.open(file_path, "wb") as out_file:
-        content = await file.read()
-        await out_file.write(content)
+    """يحفظ الصورة في التخزين المهيأ ويعيد اسم الملف."""
+    filename = new_image_key(file.filename)
+    await storage.save(filename, file)
     return filename
 
 
+# ---------------- التحقق من ملكية الموعد ----------------
+def ensure_own_appointment(db, user_id: int, appointment_id: int = None):
+    """الصورة تُربط فقط بموعد يخص نفس المريض، وإلا تظهر في أرشيف طبيب مريض آخر."""
+    if appointment_id is None:
+        return
+    shard = shards.locate_appointment(db, appointment_id, user_id)
+    if shard is not None:
+        with shards.session_for(shard, db) as shard_db:
+            owned = shard_db.execute(
+                select(Appointment.id).where(Appointment.id == appointment_id, Appointment.user_id == user_id)
+            ).first()
+        if owned:
+            return
+    raise HTTPException(status_code=404, detail="Appointment not found")
+
+
 # ---------------- دالة تسجيل الصورة في قاعدة البيانات ----------------
-def register_image(db, user_id: int, filename: str) -> Images:
+def register_image(db, user_id: int, filename: str, appointment_id: int = None) -> Images:
     """يسجل الصورة في قاعدة البيانات ويرجع كائن الصورة."""
     new_image = Images(
         filename=filename,
-        url=f"/uploads/{filename}",
-        user_id=user_id
+        url=storage.public_url(filename),
+        user_id=user_id,
+        appointment_id=appointment_id
     )
     db.add(new_image)
     db.commit()
@@ -54,12 +99,294 @@ def register_image(db, user_id: int, filename: str) -> Images:
 # ---------------- دالة جلب آخر صورة للمستخدم ----------------
 def get_last_user_image(db, user_id: int):
     """ترجع آخر صورة رفعها المستخدم (إن وجدت)."""
-    last_image = (
-        db.query(Images)
-        .filter(Images.user_id == user_id)
-        .order_by(Images.id.desc())
-        .first()
-    )
+    last_image = db.execute(LAST_IMAGE_BY_USER, {"user_id": user_id}).scalars().first()
     if not last_image:
         return None
     return last_image
+
+
+# ---------------- دالة رفع الصورة كاملة (تحقق + حفظ + تسجيل) ----------------
+async def upload_to_local(file: UploadFile, user_id: int, db, appointment_id: int = None) -> dict:
+    """يتحقق من الصورة ويحفظها في التخزين ثم يسجلها في قاعدة البيانات."""
+    await run_in_threadpool(ensure_own_appointment, db, user_id, appointment_id)
+    validate_image(file)
+    filename = await save_image(file)
+    image = register_image(db, user_id, filename, appointment_id)
+    return {"message": "File uploaded successfully", "image_id": image.id, "url": image.url}
+
+
+# ---------------- دالة جلب كل صور المستخدم ----------------
+def get_user_images(db, user_id: int, fields: str = None) -> dict:
+    """ترجع كل الصور التي رفعها المستخدم (بالحقول المطلوبة فقط إن مُررت fields)."""
+    names = IMAGE_FIELDS.parse(fields)
+    stmt = IMAGE_FIELDS.statement(names).where(Images.user_id == user_id).order_by(Images.id.desc())
+    return {"images": [IMAGE_FIELDS.render(names, row) for row in db.execute(stmt)]}
+
+
+# ---------------- بصمة محتوى الملف ----------------
+async def file_digest(file: UploadFile, chunk_size: int = 1024 * 1024) -> str:
+    """يحسب sha256 لمحتوى الملف على دفعات ثم يعيد المؤشر لبدايته."""
+    digest = hashlib.sha256()
+    while chunk := await file.read(chunk_size):
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+
+# ---------------- الرفع الجماعي لعدة صور ----------------
+def _verify_stored_image(key: str):
+    with storage.open(key) as stored, Image.open(stored) as img:
+        img.verify()
+
+
+async def _store_batch_file(file: UploadFile, write_slots: asyncio.Semaphore) -> dict:
+    """يحفظ ملفًا واحدًا من الدفعة ويتحقق منه، ويرجع حالته دون رمي استثناء."""
+    result = {"filename": file.filename, "status": "rejected"}
+    if not file.filename or not file.filename.lower().endswith(ALLOWED_EXTENSIONS):
+        result["detail"] = "الملف يجب أن يكون JPG أو PNG فقط"
+        return result
+
+    stored_name = new_image_key(file.filename)
+    async with write_slots:
+        await storage.save(stored_name, file)
+
+    try:
+        await asyncio.get_running_loop().run_in_executor(validation_pool, _verify_stored_image, stored_name)
+    except Exception:
+        await run_in_threadpool(storage.delete, stored_name)
+        result["detail"] = "الملف ليس صورة صالحة"
+        return result
+
+    result.update(status="uploaded", stored_as=stored_name)
+    return result
+
+
+async def upload_batch(files: list[UploadFile], user_id: int, db, appointment_id: int = None) -> dict:
+    """
+    يحفظ عدة صور بالتوازي ويتحقق منها في مجموعة خيوط محدودة،
+    ثم يسجل الصالحة منها بعبارة INSERT واحدة و commit واحد.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="لم يتم إرسال أي ملف")
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"الحد الأقصى {MAX_BATCH_FILES} ملفًا في الطلب الواحد")
+    await run_in_threadpool(ensure_own_appointment, db, user_id, appointment_id)
+
+    write_slots = asyncio.Semaphore(BATCH_WRITE_CONCURRENCY)
+    results = await asyncio.gather(*(_store_batch_file(file, write_slots) for file in files))
+    uploaded = [result for result in results if result["status"] == "uploaded"]
+
+    if uploaded:
+        rows = [
+            {
+                "filename": result["stored_as"],
+                "url": storage.public_url(result["stored_as"]),
+                "user_id": user_id,
+                "appointment_id": appointment_id
+            }
+            for result in uploaded
+        ]
+        try:
+            image_ids = db.execute(
+                insert(Images).returning(Images.id, sort_by_parameter_order=True),
+                rows
+            ).scalars().all()
+            db.commit()
+        except Exception:
+            db.rollback()
+            for result in uploaded:
+                await run_in_threadpool(storage.delete, result["stored_as"])
+            raise
+        for result, row, image_id in zip(uploaded, rows, image_ids):
+            result.update(image_id=image_id, url=row["url"])
+
+    return {
+        "uploaded": len(uploaded),
+        "failed": len(results) - len(uploaded),
+        "files": results
+    }
+
+
+# ---------------- الرفع المباشر إلى التخزين (روابط موقعة) ----------------
+class UploadedPart(BaseModel):
+    part_number: int
+    etag: str
+
+
+class CompleteUploadRequest(BaseModel):
+    upload_token: str
+    appointment_id: int | None = None
+    parts: list[UploadedPart] | None = None   # للرفع المتعدد فقط
+
+
+def _upload_token(user_id: int, key: str, upload_id: str = None) -> str:
+    payload = {
+        "purpose": "image-upload",
+        "id": user_id,
+        "key": key,
+        "upload_id": upload_id,
+        # مهلة إضافية لإكمال الرفع بعد انتهاء صلاحية آخر رابط
+        "exp": datetime.utcnow() + timedelta(seconds=PRESIGN_EXPIRES_SECONDS * 2),
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def _read_upload_token(token: str, user_id: int) -> dict:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=400, detail="Invalid or expired upload token")
+    if payload.get("purpose") != "image-upload" or payload.get("id") != user_id:
+        raise HTTPException(status_code=400, detail="Invalid or expired upload token")
+    return payload
+
+
+def _content_type(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="الملف يجب أن يكون JPG أو PNG فقط")
+    return CONTENT_TYPES[extension]
+
+
+def create_direct_upload(user_id: int, filename: str) -> dict:
+    """رابط PUT موقع يرفع إليه العميل الصورة مباشرة ثم يستدعي complete."""
+    content_type = _content_type(filename)
+    key = new_image_key(filename)
+    return {
+        "upload": storage.presign_put(key, content_type),
+        "upload_token": _upload_token(user_id, key),
+        "max_bytes": MAX_IMAGE_BYTES,
+        "expires_in": PRESIGN_EXPIRES_SECONDS,
+    }
+
+
+def create_multipart_upload(user_id: int, filename: str, size: int) -> dict:
+    """يبدأ رفعًا متعددًا للملفات الكبيرة ويرجع رابطًا موقعًا لكل جزء."""
+    content_type = _content_type(filename)
+    if size <= 0 or size > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=400, detail=f"الحجم المسموح حتى {MAX_IMAGE_BYTES} بايت")
+    part_count = math.ceil(size / MULTIPART_PART_SIZE)
+    if part_count > MAX_MULTIPART_PARTS:
+        raise HTTPException(status_code=400, detail="File has too many parts")
+
+    key = new_image_key(filename)
+    upload_id = storage.create_multipart(key, content_type)
+    return {
+        "part_size": MULTIPART_PART_SIZE,
+        "parts": [
+            {"part_number": number, **storage.presign_part(key, upload_id, number)}
+            for number in range(1, part_count + 1)
+        ],
+        "upload_token": _upload_token(user_id, key, upload_id),
+        "expires_in": PRESIGN_EXPIRES_SECONDS,
+    }
+
+
+def abort_multipart_upload(user_id: int, upload_token: str) -> dict:
+    payload = _read_upload_token(upload_token, user_id)
+    if not payload.get("upload_id"):
+        raise HTTPException(status_code=400, detail="Not a multipart upload")
+    storage.abort_multipart(payload["key"], payload["upload_id"])
+    return {"message": "Upload aborted"}
+
+
+def complete_direct_upload(db, user_id: int, data: CompleteUploadRequest) -> dict:
+    """
+    يُستدعى بعد أن يرفع العميل الملف: يكمل الرفع المتعدد إن وجد، ويتحقق من الحجم
+    ومن أن الملف صورة فعلًا، ثم يسجل صف Images. تكرار الاستدعاء يرجع نفس الصورة.
+    """
+    payload = _read_upload_token(data.upload_token, user_id)
+    key = payload["key"]
+
+    existing = db.query(Images).filter(Images.filename == key, Images.user_id == user_id).first()
+    if existing:
+        return {"message": "File uploaded successfully", "image_id": existing.id, "url": existing.url}
+
+    ensure_own_appointment(db, user_id, data.appointment_id)
+    if payload.get("upload_id"):
+        if not data.parts:
+            raise HTTPException(status_code=400, detail="parts are required to complete a multipart upload")
+        storage.complete_multipart(key, payload["upload_id"], [(part.part_number, part.etag) for part in data.parts])
+
+    stat = storage.stat(key)
+    if stat is None:
+        raise HTTPException(status_code=400, detail="File was not uploaded")
+    if stat[0] > MAX_IMAGE_BYTES:
+        storage.delete(key)
+        raise HTTPException(status_code=400, detail=f"الحجم المسموح حتى {MAX_IMAGE_BYTES} بايت")
+    try:
+        validation_pool.submit(_verify_stored_image, key).result()
+    except Exception:
+        storage.delete(key)
+        raise HTTPException(status_code=400, detail="الملف ليس صورة صالحة")
+
+    image = register_image(db, user_id, key, data.appointment_id)
+    return {"message": "File uploaded successfully", "image_id": image.id, "url": image.url}
+
+
+async def receive_direct_put(key: str, token: str, stream) -> dict:
+    """يستقبل جسم PUT للروابط الموقعة عندما يكون التخزين محليًا (لا يوجد S3 يستقبله)."""
+    if not isinstance(storage, LocalDiskStorage):
+        raise HTTPException(status_code=404, detail="Not found")
+    grant = verify_local_url(key, token)
+    if grant.get("upload_id"):
+        path = storage.part_path(grant["upload_id"], grant["part"])
+        if not path.parent.is_dir():
+            raise HTTPException(status_code=404, detail="Upload not found")
+        limit = MULTIPART_PART_SIZE
+    else:
+        path = storage.path(key)
+        limit = MAX_IMAGE_BYTES
+    etag = await storage.receive(path, stream, limit)
+    return {"etag": f'"{etag}"'}
+
+
+# ---------------- أرشيف صور مواعيد الطبيب في يوم ----------------
+def doctor_day_archive_entries(db, doctor, day: date, start: int = 0) -> tuple[list[ArchiveEntry], list[int], int]:
+    """
+    ملفات أرشيف صور مواعيد الطبيب في يوم، بترتيب ثابت (وقت الموعد ثم رقمه ثم رقم الصورة)
+    حتى يستأنف العميل من رقم الملف الذي توقف عنده. ترجع (الملفات من start, المرضى, العدد الكلي).
+    """
+    day_start = datetime.combine(day, time())
+    with shards.session_for(shards.route(doctor.clinic_id), db) as shard_db:
+        appointments = shard_db.execute(
+            select(Appointment.id, Appointment.user_id, Appointment.date_time, Appointment.image_id)
+            .where(
+                Appointment.doctor_id == doctor.id,
+                Appointment.date_time >= day_start,
+                Appointment.date_time < day_start + timedelta(days=1),
+                Appointment.status != "Cancelled"
+            )
+            .order_by(Appointment.date_time, Appointment.id)
+        ).all()
+    if not appointments:
+        return [], [], 0
+
+    # الصورة مرتبطة بالموعد إما عبر image_id (آخر صورة عند الحجز) أو عبر Images.appointment_id،
+    # وفي الحالتين يجب أن تكون صورة مريض الموعد نفسه
+    appointment_ids = [appointment.id for appointment in appointments]
+    image_ids = [appointment.image_id for appointment in appointments if appointment.image_id]
+    patient_ids = sorted({appointment.user_id for appointment in appointments})
+    images = db.execute(
+        select(Images.id, Images.user_id, Images.filename, Images.appointment_id, Images.updated_at)
+        .where(
+            or_(Images.id.in_(image_ids), Images.appointment_id.in_(appointment_ids)),
+            Images.user_id.in_(patient_ids)
+        )
+        .order_by(Images.id)
+    ).all()
+
+    entries = []
+    included = set()
+    for appointment in appointments:
+        folder = f"{appointment.date_time:%H%M}_appointment_{appointment.id}"
+        for image in images:
+            # نفس الصورة قد تُربط بعدة مواعيد لنفس المريض، فتُضاف مرة واحدة
+            if image.id in included or image.user_id != appointment.user_id:
+                continue
+            if image.appointment_id != appointment.id and image.id != appointment.image_id:
+                continue
+            included.add(image.id)
+            entries.append(ArchiveEntry(name=f"{folder}/{image.filename}", key=image.filename, modified=image.updated_at))
+
+    return entries[start:], patient_ids, len(entries)
@@ -0,0 +1,300 @@
+# import_controller.py
+# ---------------- الاستيراد الجماعي للأطباء والمرضى ----------------
+# إدخال عيادة جديدة يعني عشرات آلاف الصفوف. بدل /register لكل صف (استعلام تكرار +
+# bcrypt + commit) نقرأ CSV كتدفق على دفعات، ونتحقق من كل دفعة، ونحسب bcrypt في
+# مجموعة عمليات متوازية، ثم COPY إلى جدول مؤقت وعبارة INSERT ... ON CONFLICT واحدة.
+import argparse
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterable, Optional, TextIO
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from sqlalchemy import Column, MetaData, Table, func, inspect, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from model.doctor_model import Doctors
+from model.patient_model import Users
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات الاستيراد ----------------
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "2000"))
+IMPORT_HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", str(os.cpu_count() or 1)))
+MAX_REPORTED_ERRORS = 100
+MAX_BCRYPT_BYTES = 72
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+_bcrypt = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash_password(password: str) -> str:
+    # تُنفذ داخل عمليات منفصلة (bcrypt يستهلك المعالج ويحجز GIL في عملية واحدة)
+    return _bcrypt.hash(password)
+
+
+# ---------------- مجموعة عمليات bcrypt ----------------
+# مجموعة واحدة لكل عملية تُنشأ مع أول ملف يُستورد. لا نستخدم fork: عامل uvicorn متعدد
+# الخيوط، ونسخه أثناء طلب قد يورث الأطفال أقفالًا محجوزة ويضاعف ذاكرته في كل طفل.
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _hash_pool(workers: int = IMPORT_HASH_WORKERS) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _reset_pool():
+    """عملية فرعية ماتت (OOM...): المجموعة معطلة نهائيًا، ننشئ غيرها في الاستيراد التالي."""
+    global _pool
+    with _pool_lock:
+        broken, _pool = _pool, None
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+@dataclass(frozen=True)
+class ImportKind:
+    model: type
+    columns: tuple[str, ...]          # أعمدة CSV التي تُكتب في الجدول (مع hashed_password)
+    required: tuple[str, ...]
+    unique: tuple[str, ...]           # تُقارن بأحرف صغيرة لاكتشاف التكرار داخل الملف
+    defaults: dict
+
+
+IMPORT_KINDS = {
+    "patients": ImportKind(
+        model=Users,
+        columns=("username", "email", "first_name", "last_name", "phone_number", "role"),
+        required=("username", "email", "first_name", "last_name", "password"),
+        unique=("username", "email"),
+        defaults={"role": "patient"},
+    ),
+    "doctors": ImportKind(
+        model=Doctors,
+        columns=("name", "email", "specialty", "phone", "clinic_id"),
+        required=("name", "email", "password"),
+        unique=("email",),
+        defaults={},
+    ),
+}
+
+
+# ---------------- التحقق من الدفعة ----------------
+def _validate_batch(kind: ImportKind, batch: list[tuple[int, dict]], seen: dict[str, set], errors: list) -> list[dict]:
+    valid = []
+    for line, row in batch:
+        row = {key.strip(): (value.strip() if isinstance(value, str) else value) for key, value in row.items() if key}
+        missing = [column for column in kind.required if not row.get(column)]
+        if missing:
+            errors.append({"line": line, "error": f"Missing {', '.join(missing)}"})
+            continue
+        if not EMAIL_PATTERN.match(row["email"]):
+            errors.append({"line": line, "error": "Invalid email"})
+            continue
+        if len(row["password"].encode("utf-8")) > MAX_BCRYPT_BYTES:
+            errors.append({"line": line, "error": "Password too long, max 72 bytes"})
+            continue
+        if row.get("clinic_id"):
+            try:
+                row["clinic_id"] = int(row["clinic_id"])
+            except ValueError:
+                errors.append({"line": line, "error": "clinic_id must be an integer"})
+                continue
+        duplicate = next((column for column in kind.unique if row[column].lower() in seen[column]), None)
+        if duplicate:
+            errors.append({"line": line, "error": f"Duplicate {duplicate} in file"})
+            continue
+        for column in kind.unique:
+            seen[column].add(row[column].lower())
+
+        values = {column: row.get(column) or kind.defaults.get(column) for column in kind.columns}
+        values["password"] = row["password"]
+        valid.append(values)
+    return valid
+
+
+def _read_batches(stream: TextIO, batch_size: int) -> Iterable[list[tuple[int, dict]]]:
+    reader = csv.DictReader(stream)
+    batch = []
+    for row in reader:
+        batch.append((reader.line_num, row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------------- التحميل ----------------
+def _extra_columns(db: Session, table_name: str) -> dict:
+    """
+    أعمدة موجودة في الجدول الفعلي بقيم افتراضية في Python فقط (is_active / created_at
+    من نماذج التسجيل)؛ بدونها يُنشأ الحساب بـ NULL فيُرفض عند تسجيل الدخول.
+    """
+    present = {column["name"] for column in inspect(db.connection()).get_columns(table_name)}
+    candidates = {"is_active": True, "created_at": datetime.utcnow()}
+    return {name: value for name, value in candidates.items() if name in present}
+
+
+class _PostgresLoader:
+    """COPY لكل دفعة إلى جدول مؤقت، ثم INSERT ... SELECT ... ON CONFLICT DO NOTHING واحدة."""
+
+    def __init__(self, db: Session, kind: ImportKind, columns: list[str], extra: dict):
+        self.db = db
+        self.table = kind.model.__table__
+        self.columns = columns
+        self.extra = extra
+        dialect = db.get_bind().dialect
+        self.driver = dialect.driver          # psycopg2 أو psycopg (الإصدار 3)
+        definitions = ", ".join(f"{name} {self.table.c[name].type.compile(dialect)}" for name in columns)
+        db.execute(text(f"CREATE TEMP TABLE import_staging ({definitions}) ON COMMIT DROP"))
+        self.cursor = db.connection().connection.cursor()
+
+    def write(self, rows: list[dict]):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["" if row[name] is None else row[name] for name in self.columns])
+        statement = f"COPY import_staging ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)"
+        if self.driver == "psycopg":
+            with self.cursor.copy(statement) as copy:
+                copy.write(buffer.getvalue())
+        else:
+            buffer.seek(0)
+            self.cursor.copy_expert(statement, buffer)
+
+    def finish(self) -> int:
+        extra_names = list(self.extra)
+        result = self.db.execute(
+            text(
+                f"INSERT INTO {self.table.name} ({', '.join(self.columns + extra_names)}) "
+                f"SELECT {', '.join(self.columns + [':' + name for name in extra_names])} FROM import_staging "
+                "ON CONFLICT DO NOTHING"
+            ),
+            self.extra,
+        )
+        return result.rowcount
+
+
+class _ExecutemanyLoader:
+    """بديل SQLite (التطوير): executemany لكل دفعة مع تجاهل الصفوف الموجودة."""
+
+    def __init__(self, db: Session, kind: ImportKind, columns: list[str], extra: dict):
+        self.db = db
+        # أعمدة النموذج + is_active / created_at إن كانت موجودة في الجدول الفعلي فقط
+        model_table = kind.model.__table__
+        self.table = Table(
+            model_table.name, MetaData(),
+            *[Column(column.name, column.type) for column in model_table.columns],
+            *[Column(name) for name in extra if name not in model_table.c],
+        )
+        self.extra = extra
+        self.before = self._count()
+
+    def _count(self) -> int:
+        return self.db.execute(select(func.count()).select_from(self.table)).scalar()
+
+    def write(self, rows: list[dict]):
+        self.db.execute(sqlite_insert(self.table).on_conflict_do_nothing(), [{**row, **self.extra} for row in rows])
+
+    def finish(self) -> int:
+        return self._count() - self.before
+
+
+# ---------------- التنفيذ ----------------
+def import_accounts(db: Session, kind_name: str, stream: TextIO, batch_size: int = IMPORT_BATCH_SIZE,
+                    workers: int = IMPORT_HASH_WORKERS, on_batch: Optional[Callable[[int], None]] = None) -> dict:
+    """يستورد ملف CSV كاملًا في معاملة واحدة ويرجع تقريرًا بعدد الصفوف والسرعة."""
+    kind = IMPORT_KINDS.get(kind_name)
+    if kind is None:
+        raise HTTPException(status_code=400, detail=f"Unknown import kind, use one of: {', '.join(IMPORT_KINDS)}")
+
+    started = time.monotonic()
+    columns = list(kind.columns) + ["hashed_password"]
+    extra = _extra_columns(db, kind.model.__table__.name)
+    loader_class = _PostgresLoader if db.get_bind().dialect.name == "postgresql" else _ExecutemanyLoader
+    loader = loader_class(db, kind, columns, extra)
+
+    seen = {column: set() for column in kind.unique}
+    errors: list = []
+    rows_read = rows_valid = 0
+    pool = _hash_pool(workers)
+    try:
+        for batch in _read_batches(stream, batch_size):
+            rows_read += len(batch)
+            valid = _validate_batch(kind, batch, seen, errors)
+            hashes = pool.map(_hash_password, [row.pop("password") for row in valid],
+                              chunksize=max(1, len(valid) // (workers * 4)))
+            for row, hashed in zip(valid, hashes):
+                row["hashed_password"] = hashed
+            if valid:
+                loader.write(valid)
+            rows_valid += len(valid)
+            if on_batch:
+                on_batch(rows_read)
+        inserted = loader.finish()
+        db.commit()
+    except BrokenProcessPool:
+        db.rollback()
+        _reset_pool()
+        raise
+    except Exception:
+        db.rollback()
+        raise
+
+    seconds = time.monotonic() - started
+    report = {
+        "kind": kind_name,
+        "rows_read": rows_read,
+        "inserted": inserted,
+        "already_existing": rows_valid - inserted,
+        "invalid": len(errors),
+        "errors": errors[:MAX_REPORTED_ERRORS],
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows_read / seconds, 1) if seconds else None,
+    }
+    logger.info("اكتمل الاستيراد الجماعي", extra={key: value for key, value in report.items() if key != "errors"})
+    return report
+
+
+# ---------------- سطر الأوامر ----------------
+# python -m Controller.import_controller patients clinic7_patients.csv
+# python -m Controller.import_controller doctors clinic7_doctors.csv --batch-size 5000
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m Controller.import_controller")
+    parser.add_argument("kind", choices=list(IMPORT_KINDS))
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=IMPORT_HASH_WORKERS)
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+
+    def progress(rows: int):
+        elapsed = time.monotonic() - started
+        print(f"{rows} rows read ({rows / elapsed:.0f} rows/s)" if elapsed else f"{rows} rows read", flush=True)
+
+    with open(args.path, newline="", encoding="utf-8-sig") as stream, SessionLocal() as db:
+        print(import_accounts(db, args.kind, stream, args.batch_size, args.workers, on_batch=progress))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# schedule_controller.py
+# ---------------- جداول عمل الأطباء ----------------
+# لكل طبيب فترات عمل أسبوعية واستثناءات لأيام محددة (إجازة أو ساعات مختلفة).
+# تُترجم مرة واحدة إلى ScheduleRules في الذاكرة: مجموعة أوقات البداية المسموحة
+# لكل يوم، فالتحقق من موعد O(1) وسرد مواعيد يوم O(عدد المواعيد) دون قراءة قاعدة البيانات.
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from time import monotonic
+from typing import Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from model.schedule_model import DoctorScheduleWindow, DoctorScheduleException
+from core.queries import DOCTOR_BY_ID
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات الجدول ----------------
+# كل عامل يحتفظ بنسخته؛ التعديل يلغي نسخة العامل الحالي فورًا والباقي بعد هذه المدة
+SCHEDULE_CACHE_SECONDS = int(os.getenv("SCHEDULE_CACHE_SECONDS", "60"))
+MIN_SLOT_MINUTES = 5
+MAX_SLOT_MINUTES = 240
+
+
+@dataclass(frozen=True)
+class Window:
+    start: int          # دقيقة بداية أول موعد من بداية اليوم
+    end: int            # دقيقة نهاية آخر موعد
+    slot_minutes: int
+
+
+# الجدول الافتراضي: الأحد - الخميس، أول موعد 10:00 وآخر موعد 16:00 كل نصف ساعة
+# (weekday: 0 = الاثنين ... 6 = الأحد، فالجمعة 4 والسبت 5 عطلة)
+DEFAULT_WEEKDAYS = (6, 0, 1, 2, 3)
+DEFAULT_WINDOW = Window(start=10 * 60, end=16 * 60 + 30, slot_minutes=30)
+
+
+def _minutes(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def _clock(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class ScheduleRules:
+    """جدول طبيب مترجم: أوقات البداية المسموحة لكل يوم أسبوع ولكل يوم استثنائي."""
+
+    _CLOSED = ((), frozenset())
+
+    def __init__(self, weekly: dict[int, list[Window]], exceptions: dict[date, list[Window]] = None):
+        self._weekly = {weekday: self._compile(windows) for weekday, windows in weekly.items()}
+        self._exceptions = {day: self._compile(windows) for day, windows in (exceptions or {}).items()}
+
+    @staticmethod
+    def _compile(windows: list[Window]) -> tuple[tuple[int, ...], frozenset]:
+        starts = sorted({
+            minute
+            for window in windows
+            for minute in range(window.start, window.end - window.slot_minutes + 1, window.slot_minutes)
+        })
+        return tuple(starts), frozenset(starts)
+
+    def _day(self, day: date):
+        if day in self._exceptions:
+            return self._exceptions[day]
+        return self._weekly.get(day.weekday(), self._CLOSED)
+
+    def allows(self, value: datetime) -> bool:
+        if value.second or value.microsecond:
+            return False
+        return value.hour * 60 + value.minute in self._day(value.date())[1]
+
+    def reject_reason(self, value: datetime) -> Optional[str]:
+        """سبب رفض الموعد بنفس رسائل الخطأ المعتادة، أو None إن كان مسموحًا."""
+        if self.allows(value):
+            return None
+        starts = self._day(value.date())[0]
+        if not starts:
+            return "Doctor is not working on this day"
+        minute = value.hour * 60 + value.minute
+        if minute < starts[0] or minute > starts[-1]:
+            return f"Appointment must be within working hours ({_clock(starts[0])}-{_clock(starts[-1])})"
+        return "Appointment must start at a slot boundary"
+
+    def slots(self, day: date) -> list[datetime]:
+        midnight = datetime.combine(day, time())
+        return [midnight + timedelta(minutes=minute) for minute in self._day(day)[0]]
+
+
+DEFAULT_RULES = ScheduleRules({weekday: [DEFAULT_WINDOW] for weekday in DEFAULT_WEEKDAYS})
+
+
+# ---------------- التخزين المؤقت ----------------
+_rules_cache: dict[int, tuple[float, ScheduleRules]] = {}
+_rules_lock = threading.Lock()
+
+
+def _load_rules(db: Session, doctor_id: int) -> ScheduleRules:
+    windows = db.query(DoctorScheduleWindow).filter(DoctorScheduleWindow.doctor_id == doctor_id).all()
+    exceptions = db.query(DoctorScheduleException).filter(
+        DoctorScheduleException.doctor_id == doctor_id,
+        DoctorScheduleException.day >= date.today()
+    ).all()
+    if not windows and not exceptions:
+        return DEFAULT_RULES
+
+    weekly: dict[int, list[Window]] = {}
+    for row in windows:
+        weekly.setdefault(row.weekday, []).append(
+            Window(_minutes(row.start_time), _minutes(row.end_time), row.slot_minutes)
+        )
+    if not windows:
+        weekly = {weekday: [DEFAULT_WINDOW] for weekday in DEFAULT_WEEKDAYS}
+
+    special: dict[date, list[Window]] = {}
+    for row in exceptions:
+        day_windows = special.setdefault(row.day, [])
+        if not row.closed:
+            day_windows.append(Window(_minutes(row.start_time), _minutes(row.end_time), row.slot_minutes or 30))
+    # يوم فيه إجازة لا تُضاف إليه ساعات من صفوف أخرى
+    for row in exceptions:
+        if row.closed:
+            special[row.day] = []
+    return ScheduleRules(weekly, special)
+
+
+def get_schedule_rules(db: Session, doctor_id: int) -> ScheduleRules:
+    entry = _rules_cache.get(doctor_id)
+    now = monotonic()
+    if entry and entry[0] > now:
+        return entry[1]
+    rules = _load_rules(db, doctor_id)
+    with _rules_lock:
+        _rules_cache[doctor_id] = (now + SCHEDULE_CACHE_SECONDS, rules)
+    return rules
+
+
+def invalidate_schedule_rules(doctor_id: Optional[int] = None):
+    with _rules_lock:
+        if doctor_id is None:
+            _rules_cache.clear()
+        else:
+            _rules_cache.pop(doctor_id, None)
+
+
+# ---------------- التحقق من الموعد ----------------
+def validate_booking_slot(db: Session, doctor_id: int, date_time: datetime):
+    if date_time <= datetime.now():
+        raise HTTPException(status_code=400, detail="Cannot book an appointment in the past")
+    reason = get_schedule_rules(db, doctor_id).reject_reason(date_time)
+    if reason:
+        raise HTTPException(status_code=400, detail=reason)
+
+
+def bookable_slots(db: Session, doctor_id: int, day: date) -> list[datetime]:
+    """كل مواعيد اليوم حسب جدول الطبيب (بدون استبعاد المحجوز)، القادمة فقط."""
+    now = datetime.now()
+    return [slot for slot in get_schedule_rules(db, doctor_id).slots(day) if slot > now]
+
+
+# ---------------- تعديل الجدول (للإدارة) ----------------
+class ScheduleWindowRequest(BaseModel):
+    weekday: int                 # 0 = الاثنين ... 6 = الأحد
+    start_time: time
+    end_time: time
+    slot_minutes: int = 30
+
+
+class ScheduleExceptionRequest(BaseModel):
+    day: date
+    closed: bool = False
+    start_time: Optional[time] = None
+    end_time: Optional[time] = None
+    slot_minutes: Optional[int] = None
+    note: Optional[str] = None
+
+
+def _check_window(start: time, end: time, slot_minutes: int):
+    if not MIN_SLOT_MINUTES <= slot_minutes <= MAX_SLOT_MINUTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"slot_minutes must be between {MIN_SLOT_MINUTES} and {MAX_SLOT_MINUTES}"
+        )
+    if _minutes(end) - _minutes(start) < slot_minutes:
+        raise HTTPException(status_code=400, detail="end_time must leave room for at least one slot after start_time")
+
+
+def _require_doctor(db: Session, doctor_id: int):
+    if not db.execute(DOCTOR_BY_ID, {"doctor_id": doctor_id}).scalars().first():
+        raise HTTPException(status_code=404, detail="Doctor not found")
+
+
+def _window_view(row: DoctorScheduleWindow) -> dict:
+    return {
+        "weekday": row.weekday,
+        "start_time": row.start_time.strftime("%H:%M"),
+        "end_time": row.end_time.strftime("%H:%M"),
+        "slot_minutes": row.slot_minutes,
+    }
+
+
+def _exception_view(row: DoctorScheduleException) -> dict:
+    return {
+        "id": row.id,
+        "day": row.day,
+        "closed": row.closed,
+        "start_time": row.start_time.strftime("%H:%M") if row.start_time else None,
+        "end_time": row.end_time.strftime("%H:%M") if row.end_time else None,
+        "slot_minutes": row.slot_minutes,
+        "note": row.note,
+    }
+
+
+def get_doctor_schedule(db: Session, doctor_id: int) -> dict:
+    _require_doctor(db, doctor_id)
+    windows = db.query(DoctorScheduleWindow).filter(
+        DoctorScheduleWindow.doctor_id == doctor_id
+    ).order_by(DoctorScheduleWindow.weekday, DoctorScheduleWindow.start_time).all()
+    exceptions = db.query(DoctorScheduleException).filter(
+        DoctorScheduleException.doctor_id == doctor_id,
+        DoctorScheduleException.day >= date.today()
+    ).order_by(DoctorScheduleException.day, DoctorScheduleException.start_time).all()
+    return {
+        "doctor_id": doctor_id,
+        "default": not windows,
+        "weekly": [_window_view(row) for row in windows] or [
+            {
+                "weekday": weekday,
+                "start_time": _clock(DEFAULT_WINDOW.start),
+                "end_time": _clock(DEFAULT_WINDOW.end),
+                "slot_minutes": DEFAULT_WINDOW.slot_minutes,
+            }
+            for weekday in DEFAULT_WEEKDAYS
+        ],
+        "exceptions": [_exception_view(row) for row in exceptions],
+    }
+
+
+def replace_weekly_schedule(db: Session, doctor_id: int, windows: list[ScheduleWindowRequest]) -> dict:
+    """يستبدل الجدول الأسبوعي كاملًا (قائمة فارغة = الرجوع للجدول الافتراضي)."""
+    _require_doctor(db, doctor_id)
+    by_day: dict[int, list[ScheduleWindowRequest]] = {}
+    for window in windows:
+        if not 0 <= window.weekday <= 6:
+            raise HTTPException(status_code=400, detail="weekday must be between 0 (Monday) and 6 (Sunday)")
+        _check_window(window.start_time, window.end_time, window.slot_minutes)
+        by_day.setdefault(window.weekday, []).append(window)
+    for day_windows in by_day.values():
+        day_windows.sort(key=lambda window: window.start_time)
+        for previous, current in zip(day_windows, day_windows[1:]):
+            if current.start_time < previous.end_time:
+                raise HTTPException(status_code=400, detail="Schedule windows on the same day must not overlap")
+
+    db.query(DoctorScheduleWindow).filter(DoctorScheduleWindow.doctor_id == doctor_id).delete()
+    db.add_all([
+        DoctorScheduleWindow(doctor_id=doctor_id, **window.model_dump())
+        for window in windows
+    ])
+    db.commit()
+    invalidate_schedule_rules(doctor_id)
+    logger.info("تم تحديث جدول الطبيب", extra={"doctor_id": doctor_id, "windows": len(windows)})
+    return get_doctor_schedule(db, doctor_id)
+
+
+def add_schedule_exception(db: Session, doctor_id: int, data: ScheduleExceptionRequest) -> dict:
+    _require_doctor(db, doctor_id)
+    if data.day < date.today():
+        raise HTTPException(status_code=400, detail="Cannot change the schedule of a past day")
+    values = data.model_dump()
+    if data.closed:
+        values.update(start_time=None, end_time=None, slot_minutes=None)
+    else:
+        if not data.start_time or not data.end_time:
+            raise HTTPException(status_code=400, detail="start_time and end_time are required unless closed")
+        values["slot_minutes"] = data.slot_minutes or 30
+        _check_window(data.start_time, data.end_time, values["slot_minutes"])
+
+    row = DoctorScheduleException(doctor_id=doctor_id, **values)
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    invalidate_schedule_rules(doctor_id)
+    return _exception_view(row)
+
+
+def delete_schedule_exception(db: Session, doctor_id: int, exception_id: int) -> dict:
+    row = db.query(DoctorScheduleException).filter(
+        DoctorScheduleException.id == exception_id,
+        DoctorScheduleException.doctor_id == doctor_id
+    ).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Schedule exception not found")
+    db.delete(row)
+    db.commit()
+    invalidate_schedule_rules(doctor_id)
+    return {"message": "Schedule exception deleted", "id": exception_id}
@@ -0,0 +1,232 @@
+# series_controller.py
+# ---------------- المواعيد المتكررة ----------------
+# مريض الأمراض المزمنة يحجز نفس الطبيب أسبوعيًا لعدة أشهر. نولد كل المواعيد في
+# الذاكرة، ونفحصها مقابل جدول الطبيب (من الذاكرة) والمواعيد الموجودة باستعلام نطاق
+# واحد، ثم ندخلها كلها بعبارة INSERT واحدة. إلغاء السلسلة عبارة UPDATE واحدة.
+import logging
+import os
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Literal, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from model.appointment_model import Appointment
+from model.doctor_model import Doctors
+from model.patient_model import Users
+from Controller.images_controller import get_last_user_image
+from Controller.analytics_controller import record_booking, record_cancellation
+from Controller.schedule_controller import get_schedule_rules
+from core.events import publish_appointment_event
+from core.holds import holds
+from core.queries import DOCTOR_BY_ID
+from core.sharding import shards, copy_reference_rows
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات السلاسل ----------------
+SERIES_MAX_OCCURRENCES = int(os.getenv("SERIES_MAX_OCCURRENCES", "52"))
+FREQUENCY_WEEKS = {"weekly": 1, "biweekly": 2}
+
+
+class SeriesRequest(BaseModel):
+    doctor_id: int
+    start: datetime                          # أول موعد، والباقي بنفس اليوم والساعة
+    frequency: Literal["weekly", "biweekly"] = "weekly"
+    count: Optional[int] = None              # عدد المواعيد
+    until: Optional[date] = None             # أو حتى تاريخ (شامل)
+    reason: Optional[str] = None
+    skip_conflicts: bool = False             # احجز المتاح فقط بدل رفض السلسلة كلها
+
+
+def expand_occurrences(data: SeriesRequest) -> list[datetime]:
+    if data.count is None and data.until is None:
+        raise HTTPException(status_code=400, detail="Either count or until is required")
+    if data.count is not None and not 1 <= data.count <= SERIES_MAX_OCCURRENCES:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {SERIES_MAX_OCCURRENCES}")
+    if data.until is not None and data.until < data.start.date():
+        raise HTTPException(status_code=400, detail="until must be after start")
+
+    step = timedelta(weeks=FREQUENCY_WEEKS[data.frequency])
+    occurrences = []
+    current = data.start
+    while data.count is None or len(occurrences) < data.count:
+        if data.until is not None and current.date() > data.until:
+            break
+        if len(occurrences) == SERIES_MAX_OCCURRENCES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"A series can have at most {SERIES_MAX_OCCURRENCES} occurrences"
+            )
+        occurrences.append(current)
+        current += step
+    return occurrences
+
+
+def _find_conflicts(shard_db: Session, rules, doctor_id: int, user_id: int, occurrences: list[datetime]) -> dict:
+    """سبب رفض كل موعد غير متاح: {date_time: reason}."""
+    now = datetime.now()
+    conflicts = {}
+    for occurrence in occurrences:
+        if occurrence <= now:
+            conflicts[occurrence] = "Cannot book an appointment in the past"
+        elif reason := rules.reject_reason(occurrence):
+            conflicts[occurrence] = reason
+
+    candidates = [occurrence for occurrence in occurrences if occurrence not in conflicts]
+    if candidates:
+        # استعلام نطاق واحد لكل السلسلة (الحدود تسمح بتقليم الأقسام الشهرية)
+        booked = shard_db.scalars(select(Appointment.date_time).where(
+            Appointment.doctor_id == doctor_id,
+            Appointment.date_time >= candidates[0],
+            Appointment.date_time <= candidates[-1],
+            Appointment.date_time.in_(candidates),
+            Appointment.status != "Cancelled"
+        )).all()
+        for occurrence in booked:
+            conflicts[occurrence] = "Doctor already has an appointment at this time"
+        for occurrence in holds.held_by_others(doctor_id, candidates, user_id):
+            conflicts.setdefault(occurrence, "Slot is held by another patient")
+    return conflicts
+
+
+def book_series(db: Session, user: Users, data: SeriesRequest) -> dict:
+    doctor = db.execute(DOCTOR_BY_ID, {"doctor_id": data.doctor_id}).scalars().first()
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+
+    occurrences = expand_occurrences(data)
+    rules = get_schedule_rules(db, doctor.id)
+    last_image = get_last_user_image(db, user.id)
+    image_id = last_image.id if last_image else None
+
+    with shards.session_for(shards.route(doctor.clinic_id), db) as shard_db:
+        conflicts = _find_conflicts(shard_db, rules, doctor.id, user.id, occurrences)
+        report = [
+            {"date_time": occurrence.strftime("%Y-%m-%d %H:%M"), "reason": conflicts[occurrence]}
+            for occurrence in occurrences if occurrence in conflicts
+        ]
+        available = [occurrence for occurrence in occurrences if occurrence not in conflicts]
+        if not available or (report and not data.skip_conflicts):
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Some occurrences are not available", "conflicts": report}
+            )
+
+        if shard_db is not db:
+            copy_reference_rows(shard_db, db, user.id, doctor.id, image_id)
+
+        series_id = uuid.uuid4().hex
+        rows = [
+            {
+                "user_id": user.id,
+                "doctor_id": doctor.id,
+                "date_time": occurrence,
+                "reason": data.reason,
+                "status": "Scheduled",
+                "image_id": image_id,
+                "series_id": series_id,
+            }
+            for occurrence in available
+        ]
+        try:
+            # INSERT واحد لكل المواعيد؛ الفهرس الفريد يبقى الضمان ضد حجز متزامن
+            created = shard_db.execute(
+                insert(Appointment).returning(
+                    Appointment.id, Appointment.doctor_id, Appointment.date_time, Appointment.status
+                ),
+                rows
+            ).all()
+        except IntegrityError:
+            shard_db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail="One of the occurrences was booked by another patient, please retry"
+            )
+        for appointment in created:
+            record_booking(shard_db, doctor.id, doctor.specialty, appointment.date_time)
+            publish_appointment_event(shard_db, "booked", appointment)
+        shard_db.commit()
+
+    for occurrence in available:
+        holds.release(doctor.id, occurrence, user.id)
+    logger.info("تم حجز سلسلة مواعيد", extra={"series_id": series_id, "booked": len(created), "skipped": len(report)})
+    return {
+        "message": "Appointment series booked successfully",
+        "series_id": series_id,
+        "appointments": [
+            {"appointment_id": appointment.id, "date_time": appointment.date_time.strftime("%Y-%m-%d %H:%M")}
+            for appointment in sorted(created, key=lambda appointment: appointment.date_time)
+        ],
+        "skipped": report,
+    }
+
+
+def _locate_series(db: Session, user_id: int, series_id: str) -> Optional[str]:
+    """السلسلة كلها لطبيب واحد، فتكون في شارد عيادته."""
+    hits = shards.scatter_gather(
+        lambda session: session.execute(
+            select(Appointment.doctor_id).where(Appointment.series_id == series_id, Appointment.user_id == user_id).limit(1)
+        ).scalar(),
+        db,
+    )
+    doctor_id = next((hit for hit in hits if hit is not None), None)
+    if doctor_id is None:
+        return None
+    clinic_id = db.execute(select(Doctors.clinic_id).where(Doctors.id == doctor_id)).scalar()
+    return shards.route(clinic_id)
+
+
+def get_series(db: Session, user: Users, series_id: str) -> dict:
+    shard = _locate_series(db, user.id, series_id)
+    if shard is None:
+        raise HTTPException(status_code=404, detail="Series not found")
+    with shards.session_for(shard, db) as shard_db:
+        rows = shard_db.execute(
+            select(Appointment.id, Appointment.date_time, Appointment.status)
+            .where(Appointment.series_id == series_id, Appointment.user_id == user.id)
+            .order_by(Appointment.date_time)
+        ).all()
+    return {
+        "series_id": series_id,
+        "appointments": [
+            {"appointment_id": row.id, "date_time": row.date_time.strftime("%Y-%m-%d %H:%M"), "status": row.status}
+            for row in rows
+        ],
+    }
+
+
+def cancel_series(db: Session, user: Users, series_id: str) -> tuple[str, list]:
+    """يلغي كل المواعيد القادمة في السلسلة بعبارة UPDATE واحدة، ويرجع (الشارد, المواعيد الملغاة)."""
+    shard = _locate_series(db, user.id, series_id)
+    if shard is None:
+        raise HTTPException(status_code=404, detail="Series not found")
+
+    with shards.session_for(shard, db) as shard_db:
+        cancelled = shard_db.execute(
+            update(Appointment)
+            .where(
+                Appointment.series_id == series_id,
+                Appointment.user_id == user.id,
+                Appointment.status != "Cancelled",
+                Appointment.date_time > datetime.now()
+            )
+            .values(status="Cancelled", updated_at=datetime.utcnow())
+            .returning(Appointment.id, Appointment.doctor_id, Appointment.date_time, Appointment.status)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not cancelled:
+            raise HTTPException(status_code=400, detail="Series has no upcoming appointments to cancel")
+
+        specialty = db.execute(
+            select(Doctors.specialty).where(Doctors.id == cancelled[0].doctor_id)
+        ).scalar()
+        for appointment in cancelled:
+            record_cancellation(shard_db, appointment.doctor_id, specialty, appointment.date_time)
+            publish_appointment_event(shard_db, "cancelled", appointment)
+        shard_db.commit()
+    return shard, cancelled
@@ -0,0 +1,130 @@
+# sync_controller.py
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session, joinedload
+
+from model.appointment_model import Appointment
+from model.images_model import Images
+from core.sharding import shards
+
+# ---------------- إعدادات المزامنة ----------------
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "200"))
+# هامش أمان: معاملة بدأت قبل قليل قد تلتزم بقيمة updated_at أقدم من آخر صف أرسلناه،
+# لذلك لا يتقدم المؤشر أبعد من (الآن - الهامش) وتعاد تلك الصفوف مرة أخرى إن لزم
+SYNC_SAFETY_LAG = timedelta(seconds=int(os.getenv("SYNC_SAFETY_LAG_SECONDS", "5")))
+
+_EPOCH = (datetime(1970, 1, 1), 0)
+
+
+# ---------------- المؤشر (updated_at, id) بصيغة مبهمة للعميل ----------------
+def encode_cursor(position: tuple[datetime, int]) -> str:
+    raw = json.dumps([position[0].isoformat(), position[1]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> tuple[datetime, int]:
+    if not cursor:
+        return _EPOCH
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        stamp, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(stamp), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+
+
+def _after(model, position: tuple[datetime, int]):
+    # (updated_at, id) > (stamp, id) بشكل يستفيد من فهرس (user_id, updated_at, id)
+    stamp, row_id = position
+    return or_(model.updated_at > stamp, and_(model.updated_at == stamp, model.id > row_id))
+
+
+def _changed_rows(db: Session, model, user_id: int, position, limit: int, *options):
+    stmt = (
+        select(model)
+        .where(model.user_id == user_id, _after(model, position))
+        .order_by(model.updated_at, model.id)
+        .limit(limit + 1)
+    )
+    if options:
+        stmt = stmt.options(*options)
+    rows = db.execute(stmt).scalars().all()
+    return rows[:limit], len(rows) > limit
+
+
+def _serialize_appointment(app: Appointment) -> dict:
+    return {
+        "appointment_id": app.id,
+        "doctor_name": app.doctor.name if app.doctor else "Unknown",
+        "date_time": app.date_time.strftime("%Y-%m-%d %H:%M"),
+        "status": app.status,
+        "reason": app.reason or "-",
+        "image_url": app.image.url if app.image else None,
+        "series_id": app.series_id,
+        "updated_at": app.updated_at.isoformat(),
+    }
+
+
+def _serialize_image(img: Images) -> dict:
+    return {
+        "id": img.id,
+        "filename": img.filename,
+        "url": img.url,
+        "appointment_id": img.appointment_id,
+        "updated_at": img.updated_at.isoformat(),
+    }
+
+
+# ---------------- التغييرات منذ آخر مزامنة ----------------
+def get_changes(db: Session, user_id: int, since: Optional[str], limit: int = SYNC_PAGE_SIZE):
+    """
+    يرجع المواعيد والصور التي أُنشئت أو عُدلت (بما فيها الإلغاء) بعد المؤشر،
+    مع مؤشر جديد يرسله العميل في المرة القادمة. الصفوف المكررة آمنة لأن العميل يستبدل حسب id.
+    """
+    position = decode_cursor(since)
+
+    # المواعيد موزعة على الشاردات: كل شارد يرجع أول limit صف بعد المؤشر ثم ندمجها
+    pages = shards.scatter_gather(
+        lambda session: _changed_rows(
+            session, Appointment, user_id, position, limit,
+            joinedload(Appointment.doctor), joinedload(Appointment.image)
+        ),
+        db,
+    )
+    merged = {a.id: a for rows, _ in pages for a in rows}
+    appointments = sorted(merged.values(), key=lambda a: (a.updated_at, a.id))
+    more_appointments = any(more for _, more in pages) or len(appointments) > limit
+    appointments = appointments[:limit]
+    images, more_images = _changed_rows(db, Images, user_id, position, limit)
+
+    # نتقدم فقط حتى أصغر "آخر صف" بين الجدولين إن كانت هناك صفحات متبقية
+    # حتى لا نتخطى صفوف الجدول الآخر
+    ends = []
+    if more_appointments:
+        ends.append((appointments[-1].updated_at, appointments[-1].id))
+    if more_images:
+        ends.append((images[-1].updated_at, images[-1].id))
+    has_more = bool(ends)
+
+    if has_more:
+        next_position = min(ends)
+        appointments = [a for a in appointments if (a.updated_at, a.id) <= next_position]
+        images = [i for i in images if (i.updated_at, i.id) <= next_position]
+    else:
+        latest = [(row.updated_at, row.id) for row in (appointments[-1:] + images[-1:])]
+        next_position = max(latest + [position])
+        safe_limit = (datetime.utcnow() - SYNC_SAFETY_LAG, 0)
+        next_position = max(position, min(next_position, safe_limit))
+
+    return {
+        "appointments": [_serialize_appointment(a) for a in appointments],
+        "images": [_serialize_image(i) for i in images],
+        "cursor": encode_cursor(next_position),
+        "has_more": has_more,
+    }
@@ -0,0 +1,192 @@
+# waitlist_controller.py
+import logging
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi_mail import FastMail, MessageSchema
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from model.appointment_model import Appointment
+from model.doctor_model import Doctors
+from model.patient_model import Users
+from model.waitlist_model import WaitlistEntry
+from Controller.images_controller import get_last_user_image
+from Controller.patient_controller import conf
+from core.events import publish_appointment_event
+from core.sharding import shards, copy_reference_rows
+from Controller.analytics_controller import record_booking
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------
+# 1️⃣ الانضمام لقائمة الانتظار
+# ------------------------
+def join_waitlist(db: Session, user: Users, doctor_id: int, day: date):
+    if day < date.today():
+        raise HTTPException(status_code=400, detail="Cannot join a waitlist for a past day")
+
+    if not db.query(Doctors.id).filter(Doctors.id == doctor_id).first():
+        raise HTTPException(status_code=404, detail="Doctor not found")
+
+    entry = WaitlistEntry(user_id=user.id, doctor_id=doctor_id, day=day, status="Waiting")
+    db.add(entry)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="You are already on the waitlist for this day")
+    db.refresh(entry)
+    return {"message": "Added to waitlist", "waitlist_id": entry.id}
+
+
+# ------------------------
+# 2️⃣ مغادرة قائمة الانتظار
+# ------------------------
+def leave_waitlist(db: Session, user: Users, entry_id: int):
+    entry = db.query(WaitlistEntry).filter(
+        WaitlistEntry.id == entry_id,
+        WaitlistEntry.user_id == user.id,
+        WaitlistEntry.status == "Waiting"
+    ).first()
+    if not entry:
+        raise HTTPException(status_code=404, detail="Waitlist entry not found")
+
+    entry.status = "Left"
+    db.commit()
+    return {"message": "Removed from waitlist", "waitlist_id": entry.id}
+
+
+# ------------------------
+# 3️⃣ عرض قوائم الانتظار الخاصة بالمريض
+# ------------------------
+def get_user_waitlist(db: Session, user: Users):
+    entries = db.query(WaitlistEntry).filter(
+        WaitlistEntry.user_id == user.id,
+        WaitlistEntry.status == "Waiting"
+    ).order_by(WaitlistEntry.day).all()
+    return {
+        "waitlist": [
+            {"waitlist_id": entry.id, "doctor_id": entry.doctor_id, "day": entry.day.isoformat()}
+            for entry in entries
+        ]
+    }
+
+
+# ------------------------
+# 4️⃣ ملء الموعد الملغى من قائمة الانتظار
+# ------------------------
+def _book_from_waitlist(doctor_id: int, slot: datetime) -> Optional[tuple]:
+    """
+    يأخذ أقدم مريض مؤهل من قائمة الانتظار (بحث فهرس واحد) ويحجز له الموعد
+    المتحرر في شارد عيادة الطبيب. يرجع (المريض, الموعد) أو None.
+    """
+    with SessionLocal() as db:
+        doctor = db.get(Doctors, doctor_id)
+        if doctor is None:
+            return None
+        shard, moving = shards.locate_clinic(doctor.clinic_id)
+        if moving:
+            # العيادة قيد النقل: الحجوزات مرفوضة مؤقتًا، فيبقى المنتظرون كما هم
+            logger.info("تخطي ملء الموعد من قائمة الانتظار أثناء نقل العيادة", extra={"doctor_id": doctor_id})
+            return None
+
+        skipped = []
+        while True:
+            query = db.query(WaitlistEntry).filter(
+                WaitlistEntry.doctor_id == doctor_id,
+                WaitlistEntry.day == slot.date(),
+                WaitlistEntry.status == "Waiting"
+            )
+            if skipped:
+                query = query.filter(WaitlistEntry.id.notin_(skipped))
+            entry = (
+                query.order_by(WaitlistEntry.created_at, WaitlistEntry.id)
+                .with_for_update(skip_locked=True)
+                .first()
+            )
+            if not entry:
+                return None
+
+            # المريض غير مؤهل إن كان لديه موعد آخر في نفس الوقت (في أي عيادة)
+            busy = shards.scatter_gather(
+                lambda session: session.query(Appointment.id).filter(
+                    Appointment.user_id == entry.user_id,
+                    Appointment.date_time == slot,
+                    Appointment.status != "Cancelled"
+                ).first() is not None,
+                db,
+            )
+            if any(busy):
+                skipped.append(entry.id)
+                continue
+
+            last_image = get_last_user_image(db, entry.user_id)
+            image_id = last_image.id if last_image else None
+            with shards.session_for(shard, db) as shard_db:
+                if shard_db is not db:
+                    copy_reference_rows(shard_db, db, entry.user_id, doctor_id, image_id)
+                appointment = Appointment(
+                    user_id=entry.user_id,
+                    doctor_id=doctor_id,
+                    date_time=slot,
+                    reason="Booked from waitlist",
+                    status="Scheduled",
+                    image_id=image_id
+                )
+                shard_db.add(appointment)
+                try:
+                    shard_db.flush()
+                except IntegrityError:
+                    # شخص آخر حجز الموعد قبلنا
+                    shard_db.rollback()
+                    db.rollback()
+                    return None
+
+                entry.status = "Booked"
+                entry.appointment_id = appointment.id
+                record_booking(shard_db, doctor_id, doctor.specialty, slot)
+                publish_appointment_event(shard_db, "booked", appointment)
+                # في الشارد الرئيسي تكون معاملة واحدة؛ وإلا يُثبت الموعد أولًا ثم حالة الانتظار
+                shard_db.commit()
+                shard_db.refresh(appointment)
+                shard_db.expunge(appointment)
+            db.commit()
+
+            patient = db.query(Users).filter(Users.id == entry.user_id).first()
+            db.expunge_all()
+            return patient, appointment
+
+
+async def send_waitlist_notification(patient: Users, appointment: Appointment):
+    body = f"""
+مرحبًا {patient.first_name} {patient.last_name}،
+تحرر موعد كنت تنتظره وتم حجزه لك تلقائيًا.
+
+📅 الموعد: {appointment.date_time.strftime("%Y-%m-%d %H:%M")}
+
+إذا لم يعد الموعد مناسبًا يمكنك إلغاؤه من التطبيق."""
+
+    message = MessageSchema(
+        subject="تم حجز موعدك من قائمة الانتظار ✅",
+        recipients=[patient.email],
+        body=body,
+        subtype="plain"
+    )
+    try:
+        await FastMail(conf).send_message(message)
+    except Exception as e:
+        logger.warning("فشل إرسال إشعار قائمة الانتظار إلى %s: %s", patient.email, e)
+
+
+async def backfill_freed_slot(doctor_id: int, slot: datetime):
+    """مهمة خلفية تُشغَّل بعد إلغاء موعد حتى لا يتأخر طلب الإلغاء."""
+    if slot <= datetime.now():
+        return
+    booked = await run_in_threadpool(_book_from_waitlist, doctor_id, slot)
+    if booked:
+        await send_waitlist_notification(*booked)
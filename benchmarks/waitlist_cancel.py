@@ -0,0 +1,170 @@
+# waitlist_cancel.py
+# ---------------- زمن الإلغاء وملء الموعد من قائمة انتظار من 10k مريض ----------------
+# يقيس طلب الإلغاء نفسه (_cancel_appointment: ما ينتظره المريض) ومهمة الخلفية التي
+# تحجز الموعد المتحرر لأقدم منتظر (_book_from_waitlist)، على طبيب واحد ويوم واحد
+# ينتظره --waitlisted مريض. يعمل على قاعدة التطبيق نفسها (database.py و DB_DRIVER)
+# لأن المسار يمر عبر SessionLocal والشاردات، على صفوف ينشئها ثم يحذفها: قاعدة تجريبية فقط.
+#
+#   python -m benchmarks.waitlist_cancel --waitlisted 10000 --cancels 200
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from fastapi import BackgroundTasks
+from sqlalchemy import delete, func, insert, select, text
+
+from benchmarks.common import plan_indexes, print_report, summary
+from database import Base, SessionLocal, engine
+from core import partitioning
+from model.analytics_model import AppointmentRollup
+from model.appointment_model import Appointment
+from model.doctor_model import Doctors
+from model.patient_model import Users
+from model.waitlist_model import WaitlistEntry
+from routers.appointment_router import _cancel_appointment
+from Controller.waitlist_controller import _book_from_waitlist
+
+SLOT_INDEX = "uq_appointments_doctor_slot"
+QUEUE_INDEX = "ix_waitlist_queue"
+WARMUP_CYCLES = 10
+
+
+def _check_indexes() -> bool:
+    if engine.dialect.name != "postgresql":
+        return True
+    with engine.connect() as conn:
+        present = set(conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename IN ('appointments', 'waitlist')"
+        )).scalars())
+    if SLOT_INDEX not in present:
+        # create_all لا يضيف فهارس لجدول موجود مسبقًا
+        print(f"WARNING: {SLOT_INDEX} is missing, create it by hand:\n"
+              f"  CREATE UNIQUE INDEX {SLOT_INDEX} ON appointments (doctor_id, date_time) "
+              f"WHERE status <> 'Cancelled';")
+    return SLOT_INDEX in present and QUEUE_INDEX in present
+
+
+def _seed(tag: str, waitlisted: int, day: date) -> tuple[int, Users]:
+    """طبيب، ومريض يحجز ويلغي، و waitlisted مريض في طابور نفس اليوم بترتيب created_at."""
+    with SessionLocal() as db:
+        doctor = Doctors(name=f"Bench {tag}", email=f"bench-{tag}@example.com", hashed_password="x",
+                         specialty=f"bench-{tag}")
+        db.add(doctor)
+        db.flush()
+        db.execute(text(
+            "INSERT INTO patients (username, email, first_name, last_name, hashed_password, role) "
+            "SELECT :prefix || g, :prefix || g || '@example.com', 'Bench', 'Patient', 'x', 'patient' "
+            "FROM generate_series(0, :count) AS g"
+        ), {"prefix": f"bench_{tag}_", "count": waitlisted})
+        patient_ids = db.execute(
+            select(Users.id).where(Users.username.like(f"bench_{tag}_%")).order_by(Users.id)
+        ).scalars().all()
+        booker_id, waiting = patient_ids[0], patient_ids[1:]
+        joined = datetime.utcnow() - timedelta(days=1)
+        db.execute(insert(WaitlistEntry), [
+            {"user_id": user_id, "doctor_id": doctor.id, "day": day, "status": "Waiting",
+             "created_at": joined + timedelta(milliseconds=position)}
+            for position, user_id in enumerate(waiting)
+        ])
+        db.commit()
+        if engine.dialect.name == "postgresql":
+            db.execute(text("ANALYZE waitlist"))
+        booker = db.get(Users, booker_id)
+        db.expunge(booker)
+        return doctor.id, booker
+
+
+def _explain_queue_head(doctor_id: int, day: date):
+    query = (
+        select(WaitlistEntry)
+        .where(WaitlistEntry.doctor_id == doctor_id, WaitlistEntry.day == day, WaitlistEntry.status == "Waiting")
+        .order_by(WaitlistEntry.created_at, WaitlistEntry.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    compiled = query.compile(dialect=engine.dialect)
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.construct_params()).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    print(f"EXPLAIN waitlist queue head: indexes={sorted(plan_indexes(plan)) or ['<seq scan>']}")
+
+
+def _cleanup(tag: str, doctor_id: int):
+    with SessionLocal() as db:
+        db.execute(delete(Appointment).where(Appointment.doctor_id == doctor_id))
+        db.execute(delete(WaitlistEntry).where(WaitlistEntry.doctor_id == doctor_id))
+        db.execute(delete(AppointmentRollup).where(AppointmentRollup.doctor_id == doctor_id))
+        db.execute(delete(Users).where(Users.username.like(f"bench_{tag}_%")))
+        db.execute(delete(Doctors).where(Doctors.id == doctor_id))
+        db.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.waitlist_cancel")
+    parser.add_argument("--waitlisted", type=int, default=10_000)
+    parser.add_argument("--cancels", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    args = parser.parse_args(argv)
+    if args.cancels + WARMUP_CYCLES > min(24 * 60, args.waitlisted):
+        sys.exit(f"--cancels + {WARMUP_CYCLES} warm-up cycles must fit in one day and in --waitlisted")
+
+    Base.metadata.create_all(bind=engine)
+    partitioning.ensure_future_partitions()
+    indexes_ok = _check_indexes()
+
+    tag = uuid.uuid4().hex[:8]
+    day = date.today() + timedelta(days=7)
+    doctor_id, booker = _seed(tag, args.waitlisted, day)
+    print(f"seeded doctor {doctor_id} with {args.waitlisted} waitlisted patients on {day}")
+    try:
+        _explain_queue_head(doctor_id, day)
+        slots = (datetime.combine(day, datetime.min.time()) + timedelta(minutes=i) for i in range(24 * 60))
+        cancel_samples, backfill_samples = [], []
+
+        def cycle():
+            slot = next(slots)
+            with SessionLocal() as db:
+                appointment = Appointment(user_id=booker.id, doctor_id=doctor_id, date_time=slot,
+                                          status="Scheduled", reason="benchmark")
+                db.add(appointment)
+                db.commit()
+                appointment_id = appointment.id
+            with SessionLocal() as db:
+                started = time.perf_counter()
+                _cancel_appointment(db, booker, appointment_id, BackgroundTasks())
+                cancel_samples.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            booked = _book_from_waitlist(doctor_id, slot)
+            backfill_samples.append(time.perf_counter() - started)
+            if not booked:
+                raise RuntimeError(f"slot {slot} was not backfilled from the waitlist")
+
+        for _ in range(WARMUP_CYCLES):
+            cycle()          # تسخين (لا يُحتسب)
+        cancel_samples.clear()
+        backfill_samples.clear()
+        for _ in range(args.cancels):
+            cycle()
+
+        with SessionLocal() as db:
+            remaining = db.execute(select(func.count()).select_from(WaitlistEntry).where(
+                WaitlistEntry.doctor_id == doctor_id, WaitlistEntry.status == "Waiting"
+            )).scalar()
+        print_report(
+            f"cancel with {args.waitlisted} waitlisted patients ({remaining} still waiting at the end)",
+            {"cancel_request": summary(cancel_samples), "waitlist_backfill": summary(backfill_samples)},
+        )
+    finally:
+        if not args.keep:
+            _cleanup(tag, doctor_id)
+
+    if not indexes_ok:
+        sys.exit(f"{SLOT_INDEX} / {QUEUE_INDEX} missing, backfill is not atomic or not indexed")
+
+
+if __name__ == "__main__":
+    main()
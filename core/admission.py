@@ -0,0 +1,188 @@
+# admission.py
+# ---------------- التحكم بالقبول وإسقاط الحمل ----------------
+# عند بطء Postgres تتراكم الطلبات خلف get_db ويتباطأ كل شيء معًا. هنا نحد عدد
+# الطلبات الجارية لكل فئة مسار (حجز، دخول، رفع، قراءة) مع مهلة انتظار قصيرة،
+# ونرفض القراءات منخفضة الأولوية بـ 503 قبل أن يتأثر الحجز، ونسقط مبكرًا أي طلب
+# لم يعد بإمكانه الانتهاء قبل المهلة التي أرسلها العميل.
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات القبول ----------------
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+# السعة الكلية للعامل (الطلبات الجارية من كل الفئات معًا)
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", os.getenv("THREADPOOL_SIZE", "64")))
+# مهلة العميل بالمللي ثانية، مثل: X-Request-Timeout-Ms: 800
+DEADLINE_HEADER = "x-request-timeout-ms"
+RETRY_AFTER_SECONDS = 1
+# مسارات لا تمر عبر القبول (بث طويل ومسارات الخدمة): البث يحجز خانة لدقائق ويرفع
+# متوسط زمن الفئة فتُرفض طلباتها القصيرة التي ترسل مهلة
+EXEMPT_PATHS = ("/appointments/doctor/stream", "/appointments/doctor/images.zip", "/docs", "/openapi.json", "/redoc", "/health")
+
+
+@dataclass
+class RouteClass:
+    name: str
+    priority: int              # 0 = الأهم
+    limit: int                 # أقصى عدد طلبات جارية لهذه الفئة
+    queue_timeout: float       # أقصى انتظار لمكان شاغر (ثوان)
+    shed_at: float             # تُرفض الفئة إذا تجاوز الحمل الكلي هذه النسبة من السعة
+    in_flight: int = 0
+    waiting: int = 0
+    admitted: int = 0
+    shed: int = 0
+    avg_seconds: float = 0.0   # متوسط متحرك لزمن الخدمة
+    semaphore: asyncio.Semaphore = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self.semaphore = asyncio.Semaphore(self.limit)
+
+    def record(self, seconds: float):
+        self.avg_seconds = seconds if not self.avg_seconds else 0.9 * self.avg_seconds + 0.1 * seconds
+
+
+def _route_class(name: str, priority: int, limit: int, queue_ms: int, shed_at: float) -> RouteClass:
+    prefix = f"ADMISSION_{name.upper()}"
+    return RouteClass(
+        name=name,
+        priority=priority,
+        limit=int(os.getenv(f"{prefix}_LIMIT", str(limit))),
+        queue_timeout=int(os.getenv(f"{prefix}_QUEUE_MS", str(queue_ms))) / 1000,
+        shed_at=float(os.getenv(f"{prefix}_SHED_AT", str(shed_at))),
+    )
+
+
+def classify(method: str, path: str) -> str:
+    """فئة المسار: booking / auth / uploads / listing."""
+    if path.startswith(("/patients/login", "/patients/register", "/doctors/login", "/doctors/register")):
+        return "auth"
+    if path.startswith("/images") and method != "GET" or path.startswith("/appointments/upload_file"):
+        return "uploads"
+    if path.startswith("/appointments") and method in ("POST", "PUT", "DELETE"):
+        return "booking"
+    return "listing"
+
+
+class AdmissionController:
+    def __init__(self, capacity: int = ADMISSION_CAPACITY):
+        self.capacity = capacity
+        self.classes = {
+            # الحجز والإلغاء: أعلى أولوية، ولا يُرفض إلا عند امتلاء حده الخاص
+            "booking": _route_class("booking", 0, limit=max(4, capacity // 2), queue_ms=2000, shed_at=1.0),
+            "auth": _route_class("auth", 1, limit=max(2, capacity // 4), queue_ms=1000, shed_at=0.95),
+            "uploads": _route_class("uploads", 2, limit=max(2, capacity // 8), queue_ms=500, shed_at=0.85),
+            "listing": _route_class("listing", 3, limit=max(2, capacity // 2), queue_ms=250, shed_at=0.7),
+        }
+
+    @property
+    def in_flight(self) -> int:
+        return sum(route.in_flight for route in self.classes.values())
+
+    def reject_reason(self, route: RouteClass, budget: Optional[float]) -> Optional[str]:
+        """سبب الرفض الفوري قبل الانتظار، أو None."""
+        if budget is not None and budget <= route.avg_seconds:
+            return "Request deadline cannot be met"
+        if route.shed_at < 1.0 and self.in_flight >= route.shed_at * self.capacity:
+            return "Server is busy, please retry"
+        return None
+
+    async def acquire(self, route: RouteClass, budget: Optional[float]) -> Optional[str]:
+        """يحجز مكانًا للطلب، ويرجع سبب الرفض إن لم يُقبل."""
+        reason = self.reject_reason(route, budget)
+        if reason:
+            return reason
+        timeout = route.queue_timeout
+        if budget is not None:
+            # لا ننتظر أكثر مما يتبقى للطلب بعد زمن الخدمة المتوقع
+            timeout = min(timeout, budget - route.avg_seconds)
+        route.waiting += 1
+        try:
+            await asyncio.wait_for(route.semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return "Server is busy, please retry"
+        finally:
+            route.waiting -= 1
+        route.in_flight += 1
+        route.admitted += 1
+        return None
+
+    def release(self, route: RouteClass, seconds: float):
+        route.in_flight -= 1
+        route.record(seconds)
+        route.semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "classes": {
+                name: {
+                    "priority": route.priority,
+                    "limit": route.limit,
+                    "in_flight": route.in_flight,
+                    "waiting": route.waiting,
+                    "admitted": route.admitted,
+                    "shed": route.shed,
+                    "avg_ms": round(route.avg_seconds * 1000, 1),
+                }
+                for name, route in self.classes.items()
+            },
+        }
+
+
+admission = AdmissionController()
+
+
+def _client_budget(headers) -> Optional[float]:
+    value = dict(headers or []).get(DEADLINE_HEADER.encode())
+    if not value:
+        return None
+    try:
+        return max(0.0, int(value) / 1000)
+    except ValueError:
+        return None
+
+
+class AdmissionMiddleware:
+    """يطبق حدود القبول على كل طلب HTTP ويرد بـ 503 + Retry-After عند الرفض."""
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if not ADMISSION_ENABLED or scope["type"] != "http" or scope["path"].startswith(EXEMPT_PATHS):
+            return await self.app(scope, receive, send)
+
+        route = self.controller.classes[classify(scope["method"], scope["path"])]
+        reason = await self.controller.acquire(route, _client_budget(scope.get("headers")))
+        if reason:
+            route.shed += 1
+            logger.warning("تم رفض طلب بسبب الحمل", extra={"route_class": route.name, "path": scope["path"]})
+            return await self._reject(send, reason)
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route, time.monotonic() - started)
+
+    @staticmethod
+    async def _reject(send, reason: str):
+        body = json.dumps({"detail": reason}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(RETRY_AFTER_SECONDS).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,77 @@
+# archive.py
+# ---------------- أرشيف ZIP متدفق ----------------
+# نبني الأرشيف أثناء الإرسال: لا ملفات مؤقتة ولا ملف كامل في الذاكرة. الصور مضغوطة
+# أصلًا فنخزنها بدون ضغط (ZIP_STORED)، وzipfile على مجرى غير قابل للتنقل يكتب الحجم
+# وCRC في واصف بيانات بعد كل ملف، فلا نحتاج معرفتهما مسبقًا.
+import io
+import logging
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ArchiveEntry:
+    name: str            # المسار داخل الأرشيف
+    key: str             # مفتاح الملف في التخزين
+    modified: datetime
+
+
+class _ChunkSink(io.RawIOBase):
+    """مجرى كتابة فقط يجمع ما يكتبه zipfile حتى نرسله (بدون tell/seek عمدًا)."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_info(entry: ArchiveEntry) -> zipfile.ZipInfo:
+    # صيغة ZIP لا تقبل تواريخ قبل 1980
+    modified = max(entry.modified, datetime(1980, 1, 1))
+    info = zipfile.ZipInfo(entry.name, date_time=modified.timetuple()[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    info.external_attr = 0o644 << 16
+    return info
+
+
+async def stream_zip(entries: Iterable[ArchiveEntry],
+                     read_chunks: Callable[[str], AsyncIterator[bytes]]) -> AsyncIterator[bytes]:
+    """
+    يولد بايتات الأرشيف ملفًا بعد ملف؛ الذاكرة المستخدمة دفعة قراءة واحدة مهما كان
+    عدد الملفات. الملف المفقود من التخزين يُتخطى قبل كتابة ترويسته.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for entry in entries:
+            chunks = read_chunks(entry.key)
+            try:
+                first = await chunks.__anext__()
+            except FileNotFoundError:
+                logger.warning("ملف مفقود من التخزين، تم تخطيه في الأرشيف", extra={"key": entry.key})
+                continue
+            except StopAsyncIteration:
+                first = b""
+
+            with archive.open(_zip_info(entry), "w") as dest:
+                dest.write(first)
+                async for chunk in chunks:
+                    yield sink.drain()
+                    dest.write(chunk)
+            # آخر دفعة + واصف البيانات (CRC والحجم)
+            yield sink.drain()
+    # الفهرس المركزي ونهاية الأرشيف (مع ZIP64 تلقائيًا إن تجاوز الحجم 4GB)
+    yield sink.drain()
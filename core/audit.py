@@ -0,0 +1,247 @@
+# audit.py
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import insert
+
+from database import engine
+from model.audit_model import AuditEvent
+
+try:
+    import fcntl
+except ImportError:      # Windows (تطوير بعملية واحدة): لا قفل بين العمليات
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات سجل التدقيق ----------------
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "20000"))
+AUDIT_FLUSH_EVENTS = int(os.getenv("AUDIT_FLUSH_EVENTS", "500"))
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "250"))
+# كل عملية تكتب في audit_spill.<pid>.jsonl بجوار هذا المسار، وأي عملية تعيد إدخال كل الملفات
+AUDIT_SPILL_PATH = Path(os.getenv("AUDIT_SPILL_PATH", "audit_spill.jsonl"))
+AUDIT_HIGH_WATER = 0.8           # نسبة امتلاء الطابور التي نبدأ عندها بالكتابة إلى الملف
+AUDIT_REPLAY_INTERVAL_SECONDS = 60
+
+
+class AuditLogWriter:
+    """
+    المعالجات تضع الأحداث في طابور محدود (put_nowait فقط)، وخيط مستقل يكتبها
+    لقاعدة البيانات دفعة واحدة كل N حدث أو M ميلي ثانية. عند الضغط أو تعطل
+    قاعدة البيانات تُكتب الدفعات في ملف محلي ثم يُعاد إدخالها لاحقًا.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = AUDIT_QUEUE_SIZE,
+        flush_events: int = AUDIT_FLUSH_EVENTS,
+        flush_interval_ms: int = AUDIT_FLUSH_INTERVAL_MS,
+        spill_path: Path = AUDIT_SPILL_PATH,
+    ):
+        self.flush_events = flush_events
+        self.flush_interval = flush_interval_ms / 1000
+        self.spill_path = spill_path
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._spill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_replay = 0.0
+        self.stats = {"written": 0, "spilled": 0, "replayed": 0}
+
+    # ---------------- من جهة المعالجات ----------------
+    def record(self, actor_type: str, actor_id: Optional[int], action: str, resource_type: str,
+               resource_id=None, patient_id: Optional[int] = None, ip_address: str = None, path: str = None,
+               details: Optional[dict] = None):
+        event = {
+            "occurred_at": datetime.utcnow(),
+            "actor_type": actor_type,
+            "actor_id": actor_id,
+            "action": action,
+            "resource_type": resource_type,
+            "resource_id": None if resource_id is None else str(resource_id),
+            "patient_id": patient_id,
+            "ip_address": ip_address,
+            "path": path,
+            "details": None if details is None else json.dumps(details, default=str),
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # الملاذ الأخير: لا نسقط أحداث التدقيق أبدًا
+            self._spill([event])
+
+    # ---------------- خيط الكتابة ----------------
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._collect_batch()
+            if batch:
+                self._write(batch)
+            elif time.monotonic() - self._last_replay > AUDIT_REPLAY_INTERVAL_SECONDS:
+                self._last_replay = time.monotonic()
+                if self._spill_files():
+                    self.replay_spill()
+
+    def _collect_batch(self) -> list[dict]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_events:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list[dict]):
+        if self._queue.qsize() >= self._queue.maxsize * AUDIT_HIGH_WATER:
+            # قاعدة البيانات لا تلحق بالطلبات: الكتابة للملف أسرع ونعيد الإدخال لاحقًا
+            self._spill(batch)
+            return
+        try:
+            self._insert(batch)
+            self.stats["written"] += len(batch)
+        except Exception as e:
+            logger.warning("فشل كتابة سجل التدقيق، تم حفظه في الملف: %s", e)
+            self._spill(batch)
+
+    def _insert(self, batch: list[dict]):
+        # عبارة INSERT متعددة الصفوف (insertmanyvalues) بدل صف لكل حدث
+        with engine.begin() as conn:
+            conn.execute(insert(AuditEvent), batch)
+
+    # ---------------- ملفات الفائض ----------------
+    # عمال gunicorn يتشاركون المجلد: كل عملية تلحق بملفها فقط (audit_spill.<pid>.jsonl)،
+    # والقفل flock على الملف نفسه يمنع عمليتين من إعادة إدخال نفس الملف.
+    def _own_spill_path(self) -> Path:
+        return self.spill_path.with_name(f"{self.spill_path.stem}.{os.getpid()}{self.spill_path.suffix}")
+
+    def _spill_files(self) -> list[Path]:
+        stem, suffix = self.spill_path.stem, self.spill_path.suffix
+        # الاسمان القديمان (ملف مشترك واحد) يُعاد إدخالهما أيضًا
+        legacy = [self.spill_path, self.spill_path.with_suffix(".replaying")]
+        return [path for path in legacy if path.exists()] + sorted(
+            [*self.spill_path.parent.glob(f"{stem}.*{suffix}"), *self.spill_path.parent.glob(f"{stem}.*.replaying")]
+        )
+
+    def _spill(self, events: list[dict]):
+        lines = "".join(json.dumps(event, default=str) + "\n" for event in events)
+        with self._spill_lock:
+            while True:
+                path = self._own_spill_path()
+                with open(path, "a", encoding="utf-8") as spill:
+                    # الملف مقفل أو نُقل: عملية أخرى تأخذه الآن لإعادة إدخاله، فنكتب في ملف جديد
+                    if _try_lock(spill) and _is_current(spill, path):
+                        spill.write(lines)
+                        break
+                time.sleep(0.01)
+        self.stats["spilled"] += len(events)
+
+    def replay_spill(self) -> int:
+        """يعيد إدخال ملفات الفائض (لكل العمليات) ويحذف كل ملف عند اكتماله."""
+        return sum(self._replay_file(path) for path in self._spill_files())
+
+    def _replay_file(self, path: Path) -> int:
+        try:
+            spill = open(path, "rb")
+        except FileNotFoundError:
+            return 0
+        with spill:
+            if not _try_lock(spill) or not _is_current(spill, path):
+                return 0    # عملية أخرى تعيد إدخاله الآن
+            if path.suffix != ".replaying":
+                # نأخذ الملف باسم جديد فيبدأ صاحبه ملفًا آخر بدل انتظار انتهاء الإدخال
+                claimed = path.with_name(f"{path.stem}.{uuid.uuid4().hex[:8]}.replaying")
+                os.replace(path, claimed)
+                path = claimed
+
+            # موضع آخر دفعة أُدخلت: إعادة المحاولة (أو بعد توقف العملية) تكمل منه فلا تتكرر الدفعات
+            progress = path.with_suffix(".offset")
+            spill.seek(_read_offset(progress))
+            replayed = 0
+            batch = []
+            try:
+                for line in iter(spill.readline, b""):
+                    if not line.endswith(b"\n"):
+                        # سطر ناقص من عملية توقفت أثناء الكتابة
+                        logger.warning("تم تجاهل سطر ناقص في %s", path)
+                        break
+                    event = json.loads(line)
+                    event["occurred_at"] = datetime.fromisoformat(event["occurred_at"])
+                    event.setdefault("details", None)   # أحداث حُفظت قبل إضافة العمود
+                    batch.append(event)
+                    if len(batch) >= self.flush_events:
+                        self._insert(batch)
+                        replayed += len(batch)
+                        _write_offset(progress, spill.tell())
+                        batch = []
+                if batch:
+                    self._insert(batch)
+                    replayed += len(batch)
+            except Exception as e:
+                # نترك الملف وموضع التقدم ونحاول لاحقًا من بعد آخر دفعة ناجحة
+                logger.warning("فشل إعادة إدخال سجل التدقيق: %s", e)
+                self.stats["replayed"] += replayed
+                return replayed
+            path.unlink()
+            progress.unlink(missing_ok=True)
+        self.stats["replayed"] += replayed
+        return replayed
+
+
+def _try_lock(file) -> bool:
+    """قفل حصري بين العمليات على الملف المفتوح (يُحرر عند إغلاقه)؛ False إن كان مقفلًا."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _is_current(file, path: Path) -> bool:
+    """هل ما زال المسار يشير إلى الملف المفتوح نفسه (لم يُنقل أو يُحذف)."""
+    try:
+        current = os.stat(path)
+    except FileNotFoundError:
+        return False
+    opened = os.fstat(file.fileno())
+    return (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino)
+
+
+def _read_offset(progress: Path) -> int:
+    try:
+        return int(progress.read_text())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _write_offset(progress: Path, offset: int):
+    pending = progress.with_name(progress.name + ".tmp")
+    pending.write_text(str(offset))
+    os.replace(pending, progress)
+
+
+audit_log = AuditLogWriter()
@@ -1,5 +1,7 @@
 # auth_utils.py
-from fastapi import HTTPException
+import hmac
+import os
+from fastapi import HTTPException, Header
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 
@@ -47,3 +49,14 @@ def get_doctor_id_from_token(token: str):
 #         return doctor_id
 #     except JWTError:
 #         raise HTTPException(status_code=401, detail="Invalid token")
+
+
+# ---------------- صلاحيات الإدارة ----------------
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def require_admin(x_admin_token: str = Header(..., alias="X-Admin-Token")):
+    """
+    يحمي نقاط النهاية الإدارية (لوحات التحكم، التشخيص...) بمفتاح ثابت من متغيرات البيئة.
+    """
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin access required")
@@ -0,0 +1,79 @@
+# circuit_breaker.py
+# ---------------- قاطع الدائرة ----------------
+# عند تعطل قاعدة البيانات ينتظر كل طلب مهلة الاتصال كاملة فتتكدس العمال.
+# بعد عدد من الإخفاقات المتتالية يفتح القاطع: نرفض فورًا لمدة محددة، ثم نسمح
+# بطلب تجريبي واحد (نصف مفتوح)؛ إن نجح يغلق القاطع وإلا يفتح من جديد.
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """القاطع مفتوح: لا نحاول الوصول إلى الخدمة الآن."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """يرفع CircuitOpenError إن كان يجب الرفض فورًا، وإلا يسمح بالمحاولة."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == OPEN and remaining <= 0:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                # طلب تجريبي واحد فقط؛ البقية يُرفضون حتى تظهر نتيجته
+                self._probing = True
+                return
+            raise CircuitOpenError(self.name, max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("أُغلق قاطع الدائرة", extra={"circuit": self.name})
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)[:500]
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.error("فُتح قاطع الدائرة", extra={"circuit": self.name, "failures": self.failures})
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "last_error": self.last_error,
+            }
@@ -0,0 +1,40 @@
+# constraints.py
+# ---------------- ربط أخطاء القيود برسائل المستخدم ----------------
+# بدل استعلام "هل القيمة موجودة؟" قبل كل إدخال (رحلتان لقاعدة البيانات وسباق بين
+# طلبين متزامنين) ندخل مباشرة ونترك الفهرس الفريد يقرر، ثم نحول اسم القيد المنتهك
+# إلى نفس رسالة الخطأ المعتادة.
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+
+def violated_constraint(error: IntegrityError) -> Optional[str]:
+    """اسم القيد/الفهرس الذي رفض الإدخال (psycopg2 يعطيه مباشرة، وغيره من نص الخطأ)."""
+    diag = getattr(error.orig, "diag", None)
+    name = getattr(diag, "constraint_name", None)
+    if name:
+        return name
+    return str(error.orig)
+
+
+def constraint_message(error: IntegrityError, messages: dict[str, str]) -> Optional[str]:
+    """يرجع رسالة أول قيد معروف يظهر في الخطأ، أو None إن كان الخطأ لسبب آخر."""
+    violated = violated_constraint(error) or ""
+    for constraint, message in messages.items():
+        if constraint in violated:
+            return message
+    return None
+
+
+def commit_unique(db: Session, messages: dict[str, str]):
+    """يحفظ التغييرات، ويحول انتهاك قيد فريد معروف إلى 400 بالرسالة المقابلة."""
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        detail = constraint_message(e, messages)
+        if detail is None:
+            raise
+        raise HTTPException(status_code=400, detail=detail)
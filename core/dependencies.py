@@ -1,13 +1,6 @@
 from typing import Annotated
 from sqlalchemy.orm import Session
 from fastapi import Depends
-from database import SessionLocal
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from database import get_db
 
 db_dependency = Annotated[Session, Depends(get_db)]
@@ -0,0 +1,196 @@
+# events.py
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Optional
+
+import psycopg2
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from database import engine, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات قناة الأحداث ----------------
+CHANNEL = "appointment_events"
+HISTORY_SIZE = 500          # عدد الأحداث المحفوظة لكل طبيب لاستعادة ما فات بعد إعادة الاتصال
+SUBSCRIBER_QUEUE_SIZE = 100
+RECONNECT_DELAY_SECONDS = 5
+
+
+class EventBroker:
+    """ناشر/مشترك داخل العملية يوزع أحداث المواعيد على اتصالات الأطباء."""
+
+    def __init__(self, history_size: int = HISTORY_SIZE, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.history_size = history_size
+        self.queue_size = queue_size
+        self.listening = False  # هل مستمع LISTEN/NOTIFY يعمل في هذه العملية
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+        self._history: dict[int, deque] = defaultdict(lambda: deque(maxlen=self.history_size))
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def dispatch(self, payload: dict):
+        """آمن للاستدعاء من أي خيط."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._deliver, payload)
+
+    def _deliver(self, payload: dict):
+        doctor_id = int(payload["doctor_id"])
+        self._history[doctor_id].append(payload)
+        for queue in list(self._subscribers.get(doctor_id, ())):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # المشترك بطيء جدًا: نطلب منه إعادة المزامنة بدل تضخم الذاكرة
+                self._request_resync(queue)
+
+    def _request_resync(self, queue: asyncio.Queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def resync_all(self):
+        """بعد انقطاع المستمع قد تكون أحداث قد فاتت، فنطلب من الجميع إعادة المزامنة."""
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._request_resync(queue)
+
+    def subscribe(self, doctor_id: int, last_event_id: Optional[str] = None):
+        """
+        يرجع (queue, missed). missed قائمة الأحداث التي فاتت منذ last_event_id،
+        أو None إذا لم يعد الحدث موجودًا في السجل ويجب إعادة المزامنة.
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[doctor_id].add(queue)
+
+        missed = []
+        if last_event_id:
+            history = list(self._history.get(doctor_id, ()))
+            ids = [item["id"] for item in history]
+            missed = history[ids.index(last_event_id) + 1:] if last_event_id in ids else None
+        return queue, missed
+
+    def unsubscribe(self, doctor_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(doctor_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[doctor_id]
+
+
+broker = EventBroker()
+
+
+# ---------------- نشر حدث عند تغيير موعد ----------------
+def publish_appointment_event(db: Session, kind: str, appointment):
+    """
+    يسجل حدثًا يُرسل بعد نجاح commit فقط: عبر NOTIFY في Postgres
+    (يصل لكل العمليات) ومباشرة داخل العملية إذا لم يكن المستمع يعمل.
+    """
+    payload = {
+        "id": uuid.uuid4().hex,
+        "type": kind,
+        "appointment_id": appointment.id,
+        "doctor_id": appointment.doctor_id,
+        "date_time": appointment.date_time.isoformat(),
+        "status": appointment.status,
+        "emitted_at": datetime.utcnow().isoformat(),
+    }
+    if db.get_bind() is not engine:
+        # جلسة على شارد آخر: المستمع لا يسمع NOTIFY منه، فنعيد النشر عبر القاعدة الرئيسية بعد commit
+        db.info.setdefault("relay_events", []).append(payload)
+        return
+    if engine.dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": json.dumps(payload)})
+    db.info.setdefault("pending_events", []).append(payload)
+
+
+def _relay_events(payloads: list[dict]):
+    if engine.dialect.name == "postgresql":
+        try:
+            with engine.begin() as conn:
+                for payload in payloads:
+                    conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": json.dumps(payload)})
+            return
+        except Exception as e:
+            logger.warning("فشل إعادة نشر أحداث الشارد: %s", e)
+    for payload in payloads:
+        broker.dispatch(payload)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_pending_events(session):
+    relay = session.info.pop("relay_events", None)
+    if relay:
+        _relay_events(relay)
+    pending = session.info.pop("pending_events", None)
+    if not pending or broker.listening:
+        return
+    for payload in pending:
+        broker.dispatch(payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_events(session):
+    session.info.pop("pending_events", None)
+    session.info.pop("relay_events", None)
+
+
+# ---------------- مستمع LISTEN/NOTIFY ----------------
+def _connect_listener():
+    conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {CHANNEL};")
+    return conn
+
+
+async def listen_for_notifications():
+    """
+    يستمع لقناة Postgres عبر add_reader على حلقة الأحداث (بدون خيط مستقل)
+    ويعيد الاتصال تلقائيًا عند الانقطاع.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            conn = await asyncio.to_thread(_connect_listener)
+        except psycopg2.OperationalError as e:
+            logger.warning("فشل الاتصال بقناة الأحداث: %s", e)
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            continue
+
+        lost = loop.create_future()
+
+        def on_readable():
+            try:
+                conn.poll()
+            except psycopg2.Error as e:
+                if not lost.done():
+                    lost.set_result(e)
+                return
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                broker._deliver(json.loads(notify.payload))
+
+        loop.add_reader(conn.fileno(), on_readable)
+        broker.listening = True
+        broker.resync_all()
+        try:
+            await lost
+        finally:
+            broker.listening = False
+            loop.remove_reader(conn.fileno())
+            conn.close()
+        await asyncio.sleep(RECONNECT_DELAY_SECONDS)
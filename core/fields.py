@@ -0,0 +1,101 @@
+# fields.py
+# ---------------- الحقول المختارة (?fields=) ----------------
+# العميل يطلب الحقول التي يحتاجها فقط (مثل ?fields=date_time,status)، فنبني SELECT
+# بالأعمدة المطلوبة والربط (JOIN) الذي تحتاجه فقط، ونرجع نفس الحقول في الاستجابة.
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Select, select
+
+from model.appointment_model import Appointment
+from model.doctor_model import Doctors
+from model.images_model import Images
+
+
+@dataclass(frozen=True)
+class Field:
+    column: Any
+    join: Optional[str] = None                      # اسم الربط المطلوب لهذا الحقل
+    render: Optional[Callable[[Any], Any]] = None   # تحويل القيمة قبل إرجاعها
+
+
+class FieldSet:
+    """قائمة الحقول المسموحة لنقطة نهاية، والحقل المعرف (id) يُرجع دائمًا."""
+
+    def __init__(self, base, key: str, fields: dict[str, Field], joins: dict[str, Callable[[Select], Select]] = None):
+        self.base = base
+        self.key = key
+        self.fields = fields
+        self.joins = joins or {}
+        self.statement = lru_cache(maxsize=64)(self._build)
+
+    def parse(self, fields: Optional[str]) -> tuple[str, ...]:
+        """يحول ?fields=a,b إلى قائمة مرتبة بعد التحقق منها (كل الحقول إن لم تُمرر)."""
+        if not fields:
+            return tuple(self.fields)
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested - self.fields.keys()
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(self.fields)}"
+            )
+        requested.add(self.key)
+        # ترتيب ثابت حتى يُعاد استخدام نفس العبارة المخزنة لنفس المجموعة
+        return tuple(name for name in self.fields if name in requested)
+
+    def _build(self, names: tuple[str, ...]) -> Select:
+        stmt = select(*[self.fields[name].column.label(name) for name in names]).select_from(self.base)
+        for join in dict.fromkeys(self.fields[name].join for name in names if self.fields[name].join):
+            stmt = self.joins[join](stmt)
+        return stmt
+
+    def render(self, names: tuple[str, ...], row) -> dict:
+        result = {}
+        for name in names:
+            value = getattr(row, name)
+            render = self.fields[name].render
+            result[name] = render(value) if render else value
+        return result
+
+
+# ---------------- الحقول المسموحة لكل قائمة ----------------
+APPOINTMENT_FIELDS = FieldSet(
+    Appointment,
+    key="appointment_id",
+    fields={
+        "appointment_id": Field(Appointment.id),
+        "doctor_name": Field(Doctors.name, join="doctor", render=lambda value: value or "Unknown"),
+        "date_time": Field(Appointment.date_time, render=lambda value: value.strftime("%Y-%m-%d %H:%M")),
+        "status": Field(Appointment.status),
+        "reason": Field(Appointment.reason, render=lambda value: value or "-"),
+        "image_url": Field(Images.url, join="image"),
+    },
+    joins={
+        "doctor": lambda stmt: stmt.outerjoin(Doctors, Doctors.id == Appointment.doctor_id),
+        "image": lambda stmt: stmt.outerjoin(Images, Images.id == Appointment.image_id),
+    },
+)
+
+IMAGE_FIELDS = FieldSet(
+    Images,
+    key="id",
+    fields={
+        "id": Field(Images.id),
+        "filename": Field(Images.filename),
+        "url": Field(Images.url),
+        "appointment_id": Field(Images.appointment_id),
+    },
+)
+
+DOCTOR_FIELDS = FieldSet(
+    Doctors,
+    key="id",
+    fields={
+        "id": Field(Doctors.id),
+        "name": Field(Doctors.name),
+        "specialty": Field(Doctors.specialty),
+    },
+)
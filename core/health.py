@@ -0,0 +1,107 @@
+# health.py
+# ---------------- حالة الخدمات التي يعتمد عليها الخادم ----------------
+# فحوص قاعدة البيانات ومجلد التخزين وخادم البريد تُنفذ في الخلفية كل بضع ثوان،
+# ونقاط /health/live و /health/ready ترجع آخر نتيجة محفوظة فقط، فاستطلاع موزع
+# الحمل المتكرر لا يفتح اتصالات ولا ينتظر أي مهلة.
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import text
+
+from database import engine, db_breaker
+from core.storage import LocalDiskStorage, S3Storage, storage
+from Controller.patient_controller import conf as mail_conf
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات الفحص ----------------
+HEALTH_REFRESH_SECONDS = float(os.getenv("HEALTH_REFRESH_SECONDS", "10"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "3"))
+# البريد لا يمنع الجاهزية: تعطله يؤخر الإشعارات فقط
+CRITICAL_CHECKS = ("database", "storage")
+
+
+def check_database():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def check_storage():
+    if isinstance(storage, LocalDiskStorage):
+        if not storage.root.is_dir() or not os.access(storage.root, os.W_OK):
+            raise RuntimeError(f"{storage.root} is not a writable directory")
+    elif isinstance(storage, S3Storage):
+        storage.client.head_bucket(Bucket=storage.bucket)
+
+
+def check_smtp():
+    with socket.create_connection((mail_conf.MAIL_SERVER, mail_conf.MAIL_PORT), timeout=HEALTH_CHECK_TIMEOUT):
+        pass
+
+
+CHECKS: dict[str, Callable[[], None]] = {
+    "database": check_database,
+    "storage": check_storage,
+    "smtp": check_smtp,
+}
+
+
+class HealthMonitor:
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.results: dict[str, dict] = {
+            name: {"ok": None, "error": "not checked yet"} for name in CHECKS
+        }
+        self.checked_at = None
+
+    async def _run(self, name: str, check: Callable[[], None]) -> dict:
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.to_thread(check), HEALTH_CHECK_TIMEOUT)
+        except Exception as e:
+            error = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)[:300]
+            if name == "database":
+                db_breaker.record_failure(e)
+            if self.results[name]["ok"] is not False:
+                logger.warning("فشل فحص الخدمة", extra={"check": name, "error": error})
+            return {"ok": False, "error": error, "latency_ms": round((time.monotonic() - started) * 1000, 1)}
+        if name == "database":
+            # نجاح الفحص يغلق القاطع دون انتظار طلب تجريبي من مستخدم
+            db_breaker.record_success()
+        return {"ok": True, "latency_ms": round((time.monotonic() - started) * 1000, 1)}
+
+    async def refresh(self):
+        names = list(CHECKS)
+        results = await asyncio.gather(*(self._run(name, CHECKS[name]) for name in names))
+        self.results = dict(zip(names, results))
+        self.checked_at = datetime.utcnow()
+
+    def liveness(self) -> dict:
+        return {"status": "alive", "uptime_seconds": round(time.monotonic() - self.started_at)}
+
+    def readiness(self) -> tuple[bool, dict]:
+        breaker = db_breaker.snapshot()
+        ready = breaker["state"] != "open" and all(self.results[name]["ok"] for name in CRITICAL_CHECKS)
+        return ready, {
+            "status": "ready" if ready else "unavailable",
+            "checked_at": self.checked_at,
+            "checks": self.results,
+            "database_circuit": breaker,
+        }
+
+
+monitor = HealthMonitor()
+
+
+async def health_refresh_loop(interval_seconds: float = HEALTH_REFRESH_SECONDS):
+    while True:
+        try:
+            await monitor.refresh()
+        except Exception:
+            logger.exception("فشل تحديث حالة الخدمات")
+        await asyncio.sleep(interval_seconds)
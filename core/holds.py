@@ -0,0 +1,172 @@
+# holds.py
+# ---------------- حجز مؤقت للموعد أثناء تعبئة نموذج الحجز ----------------
+# المفتاح (الطبيب, الوقت) يُحجز لمريض واحد لعدة دقائق في Redis (SET NX PX)،
+# وتنتهي صلاحيته تلقائيًا دون أي استعلام تنظيف. بدون REDIS_URL نستخدم ذاكرة العملية.
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات الحجز المؤقت ----------------
+REDIS_URL = os.getenv("REDIS_URL")
+HOLD_TTL_SECONDS = int(os.getenv("SLOT_HOLD_TTL_SECONDS", "300"))
+HOLD_KEY_PREFIX = "slot-hold"
+
+
+def hold_key(doctor_id: int, slot: datetime) -> str:
+    return f"{HOLD_KEY_PREFIX}:{doctor_id}:{slot.strftime('%Y%m%dT%H%M')}"
+
+
+class RedisHoldStore:
+    """
+    الحجز الجديد عبر SET NX PX، والتمديد والاستهلاك عبر WATCH/MULTI (مقارنة المالك ثم
+    التعديل بشكل ذري)، فتعمل مع عدة عمال وخوادم ومع fakeredis في الاختبارات.
+    """
+
+    def __init__(self, client, ttl_seconds: int = HOLD_TTL_SECONDS):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+
+    def _if_owner(self, key: str, user_id: int, action, when_free) -> bool:
+        from redis.exceptions import WatchError
+
+        mine = str(user_id).encode()
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    owner = pipe.get(key)
+                    if owner is None:
+                        pipe.unwatch()
+                        return when_free
+                    if owner != mine:
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    action(pipe)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    # تغير المفتاح بين القراءة والتعديل: نعيد المحاولة
+                    continue
+
+    def hold(self, doctor_id: int, slot: datetime, user_id: int) -> bool:
+        key = hold_key(doctor_id, slot)
+        ttl_ms = self.ttl_seconds * 1000
+        if self.client.set(key, str(user_id), nx=True, px=ttl_ms):
+            return True
+        # محجوز مسبقًا: نمدده إن كان لنفس المريض
+        return self._if_owner(key, user_id, lambda pipe: pipe.pexpire(key, ttl_ms), when_free=False) or \
+            bool(self.client.set(key, str(user_id), nx=True, px=ttl_ms))
+
+    def consume(self, doctor_id: int, slot: datetime, user_id: int) -> bool:
+        """يحذف حجز نفس المريض، ويسمح بالحجز إن لم يكن هناك حجز أصلًا."""
+        key = hold_key(doctor_id, slot)
+        return self._if_owner(key, user_id, lambda pipe: pipe.delete(key), when_free=True)
+
+    def release(self, doctor_id: int, slot: datetime, user_id: int):
+        # لا يحذف حجز مريض آخر
+        self.consume(doctor_id, slot, user_id)
+
+    def held_by_others(self, doctor_id: int, slots: Iterable[datetime], user_id: int) -> set[datetime]:
+        slots = list(slots)
+        if not slots:
+            return set()
+        owners = self.client.mget([hold_key(doctor_id, slot) for slot in slots])
+        mine = str(user_id).encode()
+        return {slot for slot, owner in zip(slots, owners) if owner is not None and owner != mine}
+
+
+class MemoryHoldStore:
+    """بديل داخل العملية (عامل واحد / تطوير): الصلاحية تُفحص عند القراءة فلا حاجة لتنظيف."""
+
+    def __init__(self, ttl_seconds: int = HOLD_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._holds: dict[str, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def _owner(self, key: str, now: float) -> Optional[int]:
+        entry = self._holds.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self._holds[key]
+            return None
+        return entry[0]
+
+    def hold(self, doctor_id: int, slot: datetime, user_id: int) -> bool:
+        key = hold_key(doctor_id, slot)
+        with self._lock:
+            now = time.monotonic()
+            owner = self._owner(key, now)
+            if owner is not None and owner != user_id:
+                return False
+            self._holds[key] = (user_id, now + self.ttl_seconds)
+            return True
+
+    def consume(self, doctor_id: int, slot: datetime, user_id: int) -> bool:
+        key = hold_key(doctor_id, slot)
+        with self._lock:
+            owner = self._owner(key, time.monotonic())
+            if owner is None:
+                return True
+            if owner == user_id:
+                del self._holds[key]
+                return True
+            return False
+
+    def release(self, doctor_id: int, slot: datetime, user_id: int):
+        self.consume(doctor_id, slot, user_id)
+
+    def held_by_others(self, doctor_id: int, slots: Iterable[datetime], user_id: int) -> set[datetime]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                slot for slot in slots
+                if (owner := self._owner(hold_key(doctor_id, slot), now)) is not None and owner != user_id
+            }
+
+
+class SlotHolds:
+    """
+    الواجهة التي تستخدمها نقاط النهاية. إذا تعطل Redis لا نوقف الحجز:
+    نتجاهل الحجوزات المؤقتة والفهرس الفريد في قاعدة البيانات يبقى الضمان النهائي.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.ttl_seconds = store.ttl_seconds
+
+    def _safe(self, operation: str, default, *args):
+        try:
+            return getattr(self.store, operation)(*args)
+        except Exception as e:
+            logger.warning("تعذر الوصول إلى مخزن الحجوزات المؤقتة (%s): %s", operation, e)
+            return default
+
+    def hold(self, doctor_id: int, slot: datetime, user_id: int) -> bool:
+        return self._safe("hold", True, doctor_id, slot, user_id)
+
+    def release(self, doctor_id: int, slot: datetime, user_id: int):
+        self._safe("release", None, doctor_id, slot, user_id)
+
+    def held_by_others(self, doctor_id: int, slots: Iterable[datetime], user_id: int) -> set[datetime]:
+        return self._safe("held_by_others", set(), doctor_id, slots, user_id)
+
+
+def create_hold_store(redis_url: Optional[str] = REDIS_URL, client=None) -> SlotHolds:
+    """client يسمح بتمرير fakeredis.FakeRedis() في الاختبارات."""
+    if client is None and redis_url:
+        import redis
+
+        client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    if client is not None:
+        return SlotHolds(RedisHoldStore(client))
+    return SlotHolds(MemoryHoldStore())
+
+
+holds = create_hold_store()
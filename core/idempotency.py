@@ -0,0 +1,183 @@
+# idempotency.py
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from core.leader import run_as_leader
+from model.idempotency_model import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات Idempotency ----------------
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL = timedelta(hours=int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+# أطول من مهلة العامل (WORKER_TIMEOUT) حتى لا يُتولى طلب ما زال يُنفذ
+IDEMPOTENCY_LEASE = timedelta(seconds=int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "120")))
+BEGIN_ATTEMPTS = 3
+CLEANUP_INTERVAL_SECONDS = 60 * 60
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """بصمة ثابتة لمحتوى الطلب لاكتشاف إعادة استخدام المفتاح مع طلب مختلف."""
+    raw = json.dumps(jsonable_encoder(parts), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """يخزن بصمة الطلب والاستجابة لكل (scope, key) لمدة محدودة."""
+
+    def __init__(self, session_factory=SessionLocal, ttl: timedelta = IDEMPOTENCY_TTL,
+                 lease: timedelta = IDEMPOTENCY_LEASE):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.lease = lease
+
+    def begin(self, key: str, scope: str, fingerprint: str) -> Optional[JSONResponse]:
+        """
+        يحجز المفتاح للطلب الحالي ويرجع None، أو يرجع الاستجابة المخزنة
+        إن كان الطلب نفسه قد نُفذ من قبل.
+        """
+        with self.session_factory() as db:
+            for _ in range(BEGIN_ATTEMPTS):
+                now = datetime.utcnow()
+                db.add(IdempotencyKey(
+                    key=key,
+                    scope=scope,
+                    fingerprint=fingerprint,
+                    status="in_progress",
+                    locked_until=now + self.lease,
+                    expires_at=now + self.ttl,
+                ))
+                try:
+                    db.commit()
+                    return None
+                except IntegrityError:
+                    db.rollback()
+
+                existing = db.query(IdempotencyKey).filter(
+                    IdempotencyKey.scope == scope,
+                    IdempotencyKey.key == key
+                ).first()
+                if existing is None or existing.expires_at <= now:
+                    # المفتاح انتهت صلاحيته (أو حُذف للتو): نحرره ونعيد المحاولة
+                    if existing is not None:
+                        db.delete(existing)
+                        db.commit()
+                    continue
+
+                if existing.fingerprint != fingerprint:
+                    raise HTTPException(status_code=422, detail="Idempotency-Key already used with a different request")
+                if existing.status == "completed":
+                    return JSONResponse(
+                        status_code=existing.status_code,
+                        content=json.loads(existing.response_body),
+                        headers={"Idempotent-Replayed": "true"}
+                    )
+                if self._take_over(db, existing.id, now):
+                    logger.warning("تولي مفتاح Idempotency انتهت مهلة حجزه", extra={"scope": scope})
+                    return None
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+        # المفتاح يُحذف ويُعاد إنشاؤه من طلبات متزامنة باستمرار
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    def _take_over(self, db, row_id: int, now: datetime) -> bool:
+        """
+        العامل الذي حجز المفتاح مات قبل complete/release: تحديث مشروط واحد حتى
+        لا يتولى طلبان متزامنان نفس الحجز.
+        """
+        taken = db.query(IdempotencyKey).filter(
+            IdempotencyKey.id == row_id,
+            IdempotencyKey.status == "in_progress",
+            or_(IdempotencyKey.locked_until.is_(None), IdempotencyKey.locked_until <= now),
+        ).update({IdempotencyKey.locked_until: now + self.lease}, synchronize_session=False)
+        db.commit()
+        return taken == 1
+
+    def complete(self, key: str, scope: str, status_code: int, body: Any):
+        with self.session_factory() as db:
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.scope == scope,
+                IdempotencyKey.key == key
+            ).update({
+                IdempotencyKey.status: "completed",
+                IdempotencyKey.status_code: status_code,
+                IdempotencyKey.response_body: json.dumps(jsonable_encoder(body)),
+            }, synchronize_session=False)
+            db.commit()
+
+    def release(self, key: str, scope: str):
+        """يحذف الحجز عند خطأ غير متوقع حتى يتمكن العميل من إعادة المحاولة."""
+        with self.session_factory() as db:
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.scope == scope,
+                IdempotencyKey.key == key,
+                IdempotencyKey.status == "in_progress"
+            ).delete(synchronize_session=False)
+            db.commit()
+
+    def purge_expired(self) -> int:
+        with self.session_factory() as db:
+            deleted = db.query(IdempotencyKey).filter(
+                IdempotencyKey.expires_at <= datetime.utcnow()
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+
+
+store = IdempotencyStore()
+
+
+# ---------------- تنفيذ معالج الطلب مرة واحدة فقط ----------------
+def run_idempotent(key: Optional[str], scope: str, fingerprint: str, handler: Callable[[], Any]):
+    if not key:
+        return handler()
+
+    replay = store.begin(key, scope, fingerprint)
+    if replay is not None:
+        return replay
+    try:
+        result = handler()
+    except HTTPException as e:
+        store.complete(key, scope, e.status_code, {"detail": e.detail})
+        raise
+    except Exception:
+        store.release(key, scope)
+        raise
+    store.complete(key, scope, 200, result)
+    return result
+
+
+async def run_idempotent_async(key: Optional[str], scope: str, fingerprint: str, handler: Callable[[], Awaitable[Any]]):
+    if not key:
+        return await handler()
+
+    replay = await run_in_threadpool(store.begin, key, scope, fingerprint)
+    if replay is not None:
+        return replay
+    try:
+        result = await handler()
+    except HTTPException as e:
+        await run_in_threadpool(store.complete, key, scope, e.status_code, {"detail": e.detail})
+        raise
+    except Exception:
+        await run_in_threadpool(store.release, key, scope)
+        raise
+    await run_in_threadpool(store.complete, key, scope, 200, result)
+    return result
+
+
+async def idempotency_cleanup_loop(interval_seconds: int = CLEANUP_INTERVAL_SECONDS):
+    await run_as_leader("idempotency-cleanup", store.purge_expired, interval_seconds,
+                        "فشل تنظيف مفاتيح Idempotency")
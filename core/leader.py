@@ -0,0 +1,111 @@
+# leader.py
+# ---------------- انتخاب عامل واحد للخدمات الدورية ----------------
+# مع gunicorn يبدأ كل عامل نفس الخدمات في startup، لكن الصيانة وتنظيف uploads
+# والمطابقة يجب أن تعمل في عملية واحدة فقط. العامل الذي يحصل على قفل Postgres
+# الاستشاري (على مستوى الجلسة) يصبح المنفذ ويحتفظ باتصاله، والباقون يحاولون دوريًا.
+# موت العامل يغلق اتصاله فيتحرر القفل تلقائيًا، فيتولى عامل آخر أثناء إعادة التشغيل التدريجية.
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات الانتخاب ----------------
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "60"))   # محاولة العمال الاحتياطيين
+
+
+def lock_key(name: str) -> int:
+    """مفتاح bigint ثابت لاسم الخدمة (نفس القيمة في كل العمال وكل إعادة تشغيل)."""
+    digest = hashlib.sha256(f"service:{name}".encode()).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+class LeaderLock:
+    def __init__(self, name: str, bind: Optional[Engine] = None):
+        self.name = name
+        self.key = lock_key(name)
+        self._bind = bind
+        self._conn: Optional[Connection] = None
+
+    @property
+    def engine(self) -> Engine:
+        if self._bind is None:
+            # استيراد متأخر: الوحدات التي تستخدم القفل تُستورد قبل إعداد database أحيانًا
+            from database import engine
+            self._bind = engine
+        return self._bind
+
+    @property
+    def held(self) -> bool:
+        return self._conn is not None
+
+    def acquire(self) -> bool:
+        """يرجع True إن كان هذا العامل هو المنفذ (ويتحقق أن اتصال القفل ما زال حيًا)."""
+        if self.engine.dialect.name != "postgresql":
+            # SQLite وغيرها: عملية واحدة في التطوير والاختبارات
+            return True
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT 1"))
+                return True
+            except Exception:
+                # انقطع الاتصال: القفل تحرر على الخادم وقد يكون عامل آخر أخذه
+                logger.warning("فقد العامل قفل الخدمة %s", self.name)
+                self._close()
+        # AUTOCOMMIT حتى لا يبقى الاتصال "idle in transaction" طوال مدة القيادة
+        conn = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            acquired = conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key})
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        self._conn = conn
+        logger.info("أصبح هذا العامل منفذ الخدمة %s", self.name, extra={"pid": os.getpid()})
+        return True
+
+    def release(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+        except Exception:
+            logger.warning("تعذر تحرير قفل الخدمة %s (سيتحرر بإغلاق الاتصال)", self.name)
+        self._close()
+
+    def _close(self):
+        conn, self._conn = self._conn, None
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+async def run_as_leader(name: str, job: Callable[[], object], interval_seconds: float,
+                        failure_message: str, retry_seconds: float = LEADER_RETRY_SECONDS,
+                        bind: Optional[Engine] = None):
+    """
+    حلقة خدمة دورية تنفذ job في عامل واحد فقط؛ العمال الآخرون ينتظرون ويعيدون
+    المحاولة كل retry_seconds حتى يتحرر القفل.
+    """
+    lock = LeaderLock(name, bind)
+    try:
+        while True:
+            leader = False
+            try:
+                leader = await asyncio.to_thread(lock.acquire)
+                if leader:
+                    await asyncio.to_thread(job)
+            except Exception:
+                logger.exception(failure_message)
+            await asyncio.sleep(interval_seconds if leader else min(interval_seconds, retry_seconds))
+    finally:
+        # الإيقاف التدريجي: تحرير القفل فورًا ليتولى عامل آخر دون انتظار
+        lock.release()
@@ -0,0 +1,177 @@
+# logging_config.py
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+# ---------------- إعدادات السجلات ----------------
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# مستويات خاصة لكل logger بصيغة: sqlalchemy.engine=INFO,core.audit=DEBUG
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FILE = os.getenv("LOG_FILE")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+REQUEST_ID_HEADER = "X-Request-ID"
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# خصائص LogRecord القياسية، وما عداها يُعتبر حقولًا إضافية (extra=...)
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    """يحول السجل إلى سطر JSON واحد."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    لا يقوم بالتنسيق في خيط المتصل (التنسيق والكتابة في خيط المستمع)،
+    ولا ينتظر أبدًا: إذا امتلأ الطابور يُسقط السجل ويزيد العداد.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_pid: Optional[int] = None
+_outputs: list[logging.Handler] = []
+
+
+def _parse_levels(spec: str) -> dict[str, str]:
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _start_listener():
+    global _listener, _listener_pid
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(log_queue, *_outputs, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+    logging.getLogger().handlers[:] = [NonBlockingQueueHandler(log_queue)]
+
+
+def setup_logging():
+    """يربط كل السجلات (بما فيها uvicorn و SQLAlchemy) بطابور يفرغه خيط مستقل."""
+    if _outputs:
+        return
+
+    formatter = JsonFormatter()
+    _outputs.append(logging.StreamHandler(sys.stdout))
+    if LOG_FILE:
+        _outputs.append(logging.handlers.WatchedFileHandler(LOG_FILE, encoding="utf-8"))
+    for handler in _outputs:
+        handler.setFormatter(formatter)
+
+    _start_listener()
+    atexit.register(stop_log_listener)
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL.upper())
+
+    # uvicorn يضيف معالجاته الخاصة التي تكتب مباشرة إلى stdout
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+
+def start_log_listener():
+    """
+    يشغل مستمع السجلات في العملية الحالية إن لم يكن يعمل فيها. مع preload_app يُستورد
+    التطبيق في عملية gunicorn الرئيسية، والعامل بعد fork لا يرث خيط المستمع، وقد يرث
+    قفل الطابور محجوزًا، فننشئ له طابورًا ومستمعًا جديدين (post_fork وبدء التطبيق).
+    """
+    if _outputs and _listener_pid != os.getpid():
+        _start_listener()
+
+
+def stop_log_listener():
+    """يفرغ الطابور ويوقف المستمع عند إيقاف العامل؛ ما يُسجل بعدها يُكتب مباشرة."""
+    global _listener
+    if _listener is None or _listener_pid != os.getpid():
+        return
+    _listener.stop()
+    _listener = None
+    logging.getLogger().handlers[:] = list(_outputs)
+
+
+# ---------------- تغيير المستويات أثناء التشغيل ----------------
+def get_logger_levels() -> dict[str, str]:
+    levels = {"root": logging.getLevelName(logging.getLogger().level)}
+    for name, logger in sorted(logging.root.manager.loggerDict.items()):
+        if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET:
+            levels[name] = logging.getLevelName(logger.level)
+    return levels
+
+
+def set_logger_level(name: str, level: str):
+    level = level.upper()
+    if not isinstance(logging.getLevelName(level), int):
+        raise ValueError(f"Unknown log level: {level}")
+    logger = logging.getLogger() if name in ("", "root") else logging.getLogger(name)
+    logger.setLevel(level)
+
+
+# ---------------- معرف الطلب ----------------
+class RequestIdMiddleware:
+    """يضع معرفًا لكل طلب (أو يستخدم X-Request-ID القادم) ليظهر في كل السجلات."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        incoming = dict(scope.get("headers") or []).get(REQUEST_ID_HEADER.lower().encode())
+        request_id = incoming.decode("latin-1")[:128] if incoming else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(REQUEST_ID_HEADER.lower().encode(), request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,174 @@
+# memory.py
+# ---------------- تشخيص استهلاك الذاكرة لكل عامل ----------------
+# RSS يُقرأ من /proc كل دقيقة ويُحفظ في حلقة ثابتة الحجم (كلفة شبه معدومة)، أما
+# tracemalloc فلا يعمل إلا عند تشغيله من لوحة الإدارة وبإطار واحد افتراضيًا.
+# كل عامل عملية مستقلة: النتائج تخص العامل الذي استقبل الطلب فقط.
+import asyncio
+import gc
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات التشخيص ----------------
+MEMORY_SAMPLE_SECONDS = float(os.getenv("MEMORY_SAMPLE_SECONDS", "60"))
+MEMORY_SAMPLES_KEPT = int(os.getenv("MEMORY_SAMPLES_KEPT", "1440"))   # يوم كامل بعينة كل دقيقة
+MAX_TRACE_FRAMES = 25
+# مواقع تخصيص لا تفيد في البحث عن التسرب
+_IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>")
+
+
+def current_rss() -> Optional[int]:
+    """الذاكرة المقيمة الحالية بالبايت، أو None إن تعذر قراءتها على هذا النظام."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # أقصى RSS وليس الحالي (kB على لينكس، بايت على macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _filtered(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    return snapshot.filter_traces([tracemalloc.Filter(False, pattern) for pattern in _IGNORED_FILES])
+
+
+def _format_stat(stat) -> dict:
+    entry = {
+        "site": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if isinstance(stat, tracemalloc.StatisticDiff):
+        entry["size_diff_bytes"] = stat.size_diff
+        entry["count_diff"] = stat.count_diff
+    return entry
+
+
+class MemoryProfiler:
+    def __init__(self, samples_kept: int = MEMORY_SAMPLES_KEPT):
+        self.samples: deque = deque(maxlen=samples_kept)
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.baseline_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    # ---------------- RSS ----------------
+    def sample(self) -> Optional[int]:
+        rss = current_rss()
+        if rss is not None:
+            self.samples.append((datetime.utcnow(), rss))
+        return rss
+
+    def rss_report(self) -> dict:
+        rss = current_rss()
+        samples = list(self.samples)
+        report = {"pid": os.getpid(), "rss_bytes": rss, "samples": len(samples)}
+        if samples:
+            first_at, first_rss = samples[0]
+            report.update({
+                "first_sample_at": first_at,
+                "first_rss_bytes": first_rss,
+                "peak_rss_bytes": max(value for _, value in samples),
+                "growth_bytes": (rss or samples[-1][1]) - first_rss,
+            })
+        return report
+
+    # ---------------- tracemalloc ----------------
+    def start(self, frames: int = 1) -> dict:
+        if not 1 <= frames <= MAX_TRACE_FRAMES:
+            raise ValueError(f"frames must be between 1 and {MAX_TRACE_FRAMES}")
+        with self._lock:
+            if tracemalloc.is_tracing():
+                if tracemalloc.get_traceback_limit() == frames:
+                    return self.tracing_status()
+                # تغيير عدد الإطارات يتطلب إعادة التشغيل، واللقطة القديمة لم تعد قابلة للمقارنة
+                tracemalloc.stop()
+                self.baseline = self.baseline_at = None
+            tracemalloc.start(frames)
+        logger.info("بدأ تتبع تخصيصات الذاكرة", extra={"frames": frames})
+        return self.tracing_status()
+
+    def stop(self) -> dict:
+        with self._lock:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+                logger.info("توقف تتبع تخصيصات الذاكرة")
+            self.baseline = self.baseline_at = None
+        return self.tracing_status()
+
+    def tracing_status(self) -> dict:
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": True,
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": traced,
+            "peak_traced_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "baseline_at": self.baseline_at,
+        }
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running, start it first")
+        return _filtered(tracemalloc.take_snapshot())
+
+    def top(self, limit: int = 20, group_by: str = "lineno") -> list[dict]:
+        stats = self._snapshot().statistics(group_by)
+        return [_format_stat(stat) for stat in stats[:limit]]
+
+    def take_baseline(self) -> dict:
+        snapshot = self._snapshot()
+        with self._lock:
+            self.baseline = snapshot
+            self.baseline_at = datetime.utcnow()
+        return self.tracing_status()
+
+    def diff(self, limit: int = 20, group_by: str = "lineno") -> list[dict]:
+        """أكبر مواقع النمو منذ اللقطة المرجعية."""
+        if self.baseline is None:
+            raise RuntimeError("No baseline snapshot, take one first")
+        stats = self._snapshot().compare_to(self.baseline, group_by)
+        return [_format_stat(stat) for stat in stats[:limit]]
+
+    # ---------------- جامع القمامة ----------------
+    def gc_report(self) -> dict:
+        return {
+            "enabled": gc.isenabled(),
+            "thresholds": gc.get_threshold(),
+            "counts": gc.get_count(),
+            "generations": gc.get_stats(),
+            "uncollectable": len(gc.garbage),
+            "tracked_objects": len(gc.get_objects()),
+        }
+
+    def object_counts(self, limit: int = 30) -> list[dict]:
+        """عدد الكائنات التي يتتبعها gc حسب النوع (مرور كامل على الكائنات: للاستخدام عند الطلب)."""
+        counts = Counter(type(obj).__qualname__ for obj in gc.get_objects())
+        return [{"type": name, "count": count} for name, count in counts.most_common(limit)]
+
+
+profiler = MemoryProfiler()
+
+
+async def memory_sample_loop(interval_seconds: float = MEMORY_SAMPLE_SECONDS):
+    while True:
+        try:
+            rss = profiler.sample()
+            if rss is not None:
+                logger.debug("عينة الذاكرة", extra={"rss_bytes": rss})
+        except Exception:
+            logger.exception("فشل أخذ عينة الذاكرة")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,141 @@
+# partitioning.py
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import PrimaryKeyConstraint, delete, insert, literal, select, text
+from sqlalchemy.ext.compiler import compiles
+
+from database import engine
+from core.leader import run_as_leader
+from model.appointment_model import Appointment, AppointmentArchive
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات التقسيم والأرشفة ----------------
+PARTITION_MONTHS_AHEAD = int(os.getenv("APPOINTMENT_PARTITION_MONTHS_AHEAD", "3"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("APPOINTMENT_ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("APPOINTMENT_ARCHIVE_BATCH_SIZE", "5000"))
+ARCHIVE_STATUSES = ("Cancelled", "Completed")
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("APPOINTMENT_MAINTENANCE_INTERVAL", str(6 * 60 * 60)))
+
+
+# ---------------- المفتاح الأساسي للجداول المقسّمة ----------------
+@compiles(PrimaryKeyConstraint, "postgresql")
+def _partitioned_primary_key(constraint, compiler, **kw):
+    """
+    Postgres يشترط أن يحتوي المفتاح الأساسي للجدول المقسّم على عمود التقسيم،
+    بينما يبقى id وحده هو المفتاح الأساسي من جهة الـ ORM.
+    """
+    ddl = compiler.visit_primary_key_constraint(constraint, **kw)
+    partition_key = constraint.table.info.get("partition_key")
+    if partition_key and partition_key not in constraint.columns and ddl.endswith(")"):
+        ddl = f"{ddl[:-1]}, {compiler.preparer.quote(partition_key)})"
+    return ddl
+
+
+def _month_floor(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.month - 1 + months
+    return date(day.year + index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month_start: date) -> str:
+    return f"appointments_y{month_start:%Y}m{month_start:%m}"
+
+
+# ---------------- إنشاء الأقسام الشهرية القادمة ----------------
+def ensure_future_partitions(months_ahead: int = PARTITION_MONTHS_AHEAD) -> list[str]:
+    """ينشئ أقسام الشهر الحالي والأشهر القادمة إن لم تكن موجودة ويرجع أسماء ما أُنشئ."""
+    if engine.dialect.name != "postgresql":
+        return []
+
+    created = []
+    current = _month_floor(date.today())
+    for offset in range(months_ahead + 1):
+        lower = _add_months(current, offset)
+        upper = _add_months(current, offset + 1)
+        name = partition_name(lower)
+        with engine.begin() as conn:
+            if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+                continue
+            # ننقل أي صفوف سقطت في القسم الافتراضي لهذا الشهر قبل ربط القسم الجديد
+            conn.execute(text(f"CREATE TABLE {name} (LIKE appointments INCLUDING DEFAULTS)"))
+            conn.execute(text(
+                f"WITH moved AS ("
+                f"  DELETE FROM appointments_default"
+                f"  WHERE date_time >= '{lower}' AND date_time < '{upper}' RETURNING *"
+                f") INSERT INTO {name} SELECT * FROM moved"
+            ))
+            conn.execute(text(
+                f"ALTER TABLE appointments ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+            ))
+        created.append(name)
+    return created
+
+
+# ---------------- أرشفة المواعيد القديمة ----------------
+def archive_old_appointments(older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    ينقل المواعيد الملغاة والمكتملة الأقدم من الأفق المحدد إلى appointments_archive
+    على دفعات، ويرجع عدد الصفوف المنقولة.
+    """
+    live = Appointment.__table__
+    cold = AppointmentArchive.__table__
+    columns = [column.name for column in live.columns]
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+
+    moved_total = 0
+    while True:
+        batch_ids = (
+            select(live.c.id)
+            .where(live.c.status.in_(ARCHIVE_STATUSES), live.c.date_time < cutoff)
+            .limit(batch_size)
+        )
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                # عبارة واحدة: DELETE ... RETURNING داخل INSERT ... SELECT
+                moved = (
+                    delete(live)
+                    .where(live.c.id.in_(batch_ids.scalar_subquery()), live.c.date_time < cutoff)
+                    .returning(*live.c)
+                    .cte("moved")
+                )
+                result = conn.execute(
+                    insert(cold).from_select(
+                        columns + ["archived_at"],
+                        select(*[moved.c[name] for name in columns], literal(datetime.now())),
+                    )
+                )
+                count = result.rowcount
+            else:
+                ids = [row[0] for row in conn.execute(batch_ids)]
+                if ids:
+                    conn.execute(
+                        insert(cold).from_select(
+                            columns + ["archived_at"],
+                            select(*live.c, literal(datetime.now())).where(live.c.id.in_(ids)),
+                        )
+                    )
+                    conn.execute(delete(live).where(live.c.id.in_(ids)))
+                count = len(ids)
+        moved_total += count
+        if count < batch_size:
+            return moved_total
+
+
+# ---------------- مهمة الصيانة الدورية ----------------
+def run_maintenance() -> dict:
+    created = ensure_future_partitions()
+    archived = archive_old_appointments()
+    return {"partitions_created": created, "archived": archived}
+
+
+async def partition_maintenance_loop(interval_seconds: int = MAINTENANCE_INTERVAL_SECONDS):
+    # عامل واحد فقط ينشئ الأقسام ويؤرشف (CREATE TABLE ... PARTITION OF المتزامن يتعارض)
+    await run_as_leader("partition-maintenance", run_maintenance, interval_seconds,
+                        "فشل صيانة أقسام المواعيد")
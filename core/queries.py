@@ -0,0 +1,33 @@
+# queries.py
+# ---------------- الاستعلامات المتكررة في كل طلب ----------------
+# تُبنى مرة واحدة عند الاستيراد بدل إعادة بناء سلسلة db.query(...).filter(...)
+# في كل طلب. مفتاح التخزين المؤقت محفوظ داخل الكائن نفسه، فيُعاد استخدام
+# الصيغة المترجمة من compiled cache مباشرة، وتمرر القيم عبر bindparam فقط.
+from sqlalchemy import bindparam, select
+
+from model.appointment_model import Appointment
+from model.doctor_model import Doctors
+from model.images_model import Images
+
+DOCTOR_BY_ID = (
+    select(Doctors)
+    .where(Doctors.id == bindparam("doctor_id"))
+    .limit(1)
+)
+
+ACTIVE_APPOINTMENT_AT_SLOT = (
+    select(Appointment.id)
+    .where(
+        Appointment.doctor_id == bindparam("doctor_id"),
+        Appointment.date_time == bindparam("date_time"),
+        Appointment.status != "Cancelled"
+    )
+    .limit(1)
+)
+
+LAST_IMAGE_BY_USER = (
+    select(Images)
+    .where(Images.user_id == bindparam("user_id"))
+    .order_by(Images.id.desc())
+    .limit(1)
+)
@@ -0,0 +1,361 @@
+# sharding.py
+# ---------------- توزيع مواعيد العيادات على عدة قواعد بيانات ----------------
+# القاعدة الرئيسية (database.py) تبقى مصدر الحقيقة للمرضى والأطباء والصور ودليل
+# العيادات. مواعيد كل عيادة (وعداداتها) تُخزن في الشارد المسجل لها في clinic_shards،
+# ويُنسخ إليه صف المريض والطبيب والصورة بنفس المعرف حتى تتحقق المفاتيح الأجنبية.
+import argparse
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, delete, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from database import Base, SessionLocal, engine
+from model.analytics_model import AppointmentRollup
+from model.appointment_model import Appointment
+from model.clinic_model import ClinicShard
+from model.doctor_model import Doctors
+from model.images_model import Images
+from model.patient_model import Users
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# ---------------- إعدادات الشاردات ----------------
+PRIMARY_SHARD = "primary"
+# الشاردات الإضافية بصيغة: east=postgresql+psycopg2://...,west=postgresql+psycopg2://...
+# الترتيب مهم (يحدد إزاحة المعرفات) فلا تغيره بعد التشغيل، وأضف الجديدة في النهاية فقط
+DB_SHARDS = os.getenv("DB_SHARDS", "")
+DIRECTORY_CACHE_SECONDS = int(os.getenv("SHARD_DIRECTORY_CACHE_SECONDS", "60"))
+# المعرفات متشابكة بين الشاردات (الشارد k يولد k, k+STRIDE, ...) لتبقى فريدة عند الجمع والنقل
+SHARD_ID_STRIDE = int(os.getenv("SHARD_ID_STRIDE", "16"))
+SCATTER_WORKERS = int(os.getenv("SHARD_SCATTER_WORKERS", "16"))
+MOVE_BATCH_SIZE = int(os.getenv("SHARD_MOVE_BATCH_SIZE", "1000"))
+
+
+def _parse_shards(spec: str) -> dict[str, str]:
+    shards = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, url = item.partition("=")
+        shards[name.strip()] = url.strip()
+    return shards
+
+
+class ShardRegistry:
+    """يحول رقم العيادة إلى محرك قاعدة البيانات المناسب، وينفذ القراءات الموزعة."""
+
+    def __init__(self, urls: dict[str, str]):
+        if PRIMARY_SHARD in urls:
+            raise ValueError(f"'{PRIMARY_SHARD}' is reserved for the main database")
+        if len(urls) + 1 > SHARD_ID_STRIDE:
+            raise ValueError("More shards than SHARD_ID_STRIDE allows")
+        self.urls = urls
+        self._engines = {PRIMARY_SHARD: engine}
+        self._sessions = {PRIMARY_SHARD: SessionLocal}
+        self._clinics: dict[int, tuple[str, bool, float]] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def sharded(self) -> bool:
+        return bool(self.urls)
+
+    def names(self) -> list[str]:
+        return [PRIMARY_SHARD, *self.urls]
+
+    # ---------------- المحركات والجلسات ----------------
+    def engine(self, name: str):
+        with self._lock:
+            if name not in self._engines:
+                if name not in self.urls:
+                    raise KeyError(f"Unknown shard: {name}")
+                shard_engine = create_engine(self.urls[name], pool_pre_ping=True)
+                self._engines[name] = shard_engine
+                self._sessions[name] = sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+            return self._engines[name]
+
+    def session(self, name: str) -> Session:
+        self.engine(name)
+        return self._sessions[name]()
+
+    @contextmanager
+    def session_for(self, name: str, primary_db: Session) -> Iterator[Session]:
+        """يعيد جلسة الطلب نفسها للقاعدة الرئيسية، أو جلسة جديدة للشارد."""
+        if name == PRIMARY_SHARD:
+            yield primary_db
+            return
+        with self.session(name) as shard_db:
+            yield shard_db
+
+    def dispose(self):
+        # بعد fork في gunicorn: لا نشارك اتصالات الشاردات مع العملية الأم
+        with self._lock:
+            for name, shard_engine in self._engines.items():
+                if name != PRIMARY_SHARD:
+                    shard_engine.dispose(close=False)
+
+    # ---------------- دليل العيادات ----------------
+    def locate_clinic(self, clinic_id: Optional[int]) -> tuple[str, bool]:
+        """يرجع (اسم الشارد, هل العيادة قيد النقل) مع تخزين مؤقت قصير."""
+        if clinic_id is None or not self.sharded:
+            return PRIMARY_SHARD, False
+        now = time.monotonic()
+        cached = self._clinics.get(clinic_id)
+        if cached and cached[2] > now:
+            return cached[0], cached[1]
+
+        with SessionLocal() as db:
+            entry = db.get(ClinicShard, clinic_id)
+            found = (entry.shard, entry.moving) if entry else (PRIMARY_SHARD, False)
+        self._clinics[clinic_id] = (*found, now + DIRECTORY_CACHE_SECONDS)
+        return found
+
+    def forget(self, clinic_id: Optional[int] = None):
+        if clinic_id is None:
+            self._clinics.clear()
+        else:
+            self._clinics.pop(clinic_id, None)
+
+    def route(self, clinic_id: Optional[int]) -> str:
+        """الشارد الذي تُكتب فيه مواعيد العيادة (503 أثناء نقلها)."""
+        shard, moving = self.locate_clinic(clinic_id)
+        if moving:
+            raise HTTPException(status_code=503, detail="Clinic is being moved, please retry shortly")
+        return shard
+
+    # ---------------- القراءة الموزعة ----------------
+    def scatter_gather(self, fn: Callable[[Session], T], primary_db: Optional[Session] = None) -> list[T]:
+        """ينفذ fn على كل الشاردات بالتوازي ويرجع النتائج بترتيب names()."""
+        if not self.sharded:
+            if primary_db is not None:
+                return [fn(primary_db)]
+            with SessionLocal() as db:
+                return [fn(db)]
+
+        def run(name: str) -> T:
+            with self.session(name) as db:
+                return fn(db)
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=SCATTER_WORKERS, thread_name_prefix="shard-scatter")
+        try:
+            # جلسة الطلب ليست آمنة بين الخيوط: القاعدة الرئيسية تُقرأ بها في خيط المتصل
+            # بينما تعمل بقية الشاردات بجلسات خاصة بها في مجموعة الخيوط
+            remote = [name for name in self.names() if name != PRIMARY_SHARD or primary_db is None]
+            futures = {name: self._pool.submit(run, name) for name in remote}
+            results = {}
+            if primary_db is not None:
+                results[PRIMARY_SHARD] = fn(primary_db)
+            for name, future in futures.items():
+                results[name] = future.result()
+            return [results[name] for name in self.names()]
+        except OperationalError as e:
+            logger.error("تعذر الوصول إلى أحد الشاردات: %s", e)
+            raise HTTPException(status_code=503, detail="A database shard is unavailable")
+
+    def locate_appointment(self, db: Session, appointment_id: int, user_id: int) -> Optional[str]:
+        """
+        يجد الشارد الحالي لموعد المريض. أثناء النقل قد يوجد الصف في شاردين،
+        لذلك نعتمد على دليل العيادة لا على أول نتيجة.
+        """
+        if not self.sharded:
+            return PRIMARY_SHARD
+        hits = self.scatter_gather(
+            lambda session: session.execute(
+                select(Appointment.doctor_id).where(Appointment.id == appointment_id, Appointment.user_id == user_id)
+            ).scalar(),
+            db,
+        )
+        doctor_id = next((hit for hit in hits if hit is not None), None)
+        if doctor_id is None:
+            return None
+        clinic_id = db.execute(select(Doctors.clinic_id).where(Doctors.id == doctor_id)).scalar()
+        return self.route(clinic_id)
+
+
+shards = ShardRegistry(_parse_shards(DB_SHARDS))
+
+
+# ---------------- نسخ الصفوف المرجعية إلى الشارد ----------------
+def copy_reference_rows(shard_db: Session, primary_db: Session, patient_id: int, doctor_id: int, image_id: Optional[int] = None):
+    """ينسخ صف المريض والطبيب والصورة بنفس المعرف (أو يحدثها) داخل معاملة الشارد الحالية."""
+    for model, row_id in ((Users, patient_id), (Doctors, doctor_id), (Images, image_id)):
+        if row_id is None:
+            continue
+        row = primary_db.get(model, row_id)
+        if row is None:
+            continue
+        values = {attr.key: getattr(row, attr.key) for attr in model.__mapper__.column_attrs}
+        shard_db.merge(model(**values))
+    shard_db.flush()
+
+
+def _insert_ignore(bind, table):
+    upsert = pg_insert if bind.dialect.name == "postgresql" else sqlite_insert
+    return upsert(table).on_conflict_do_nothing()
+
+
+# ---------------- تهيئة الشاردات ----------------
+def _align_sequence(conn, offset: int, floor: int):
+    """يجعل تسلسل appointments.id يولد offset + n * STRIDE بعد أكبر معرف موجود."""
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence('appointments', 'id')")).scalar()
+    if not sequence:
+        return
+    start = (floor // SHARD_ID_STRIDE + 1) * SHARD_ID_STRIDE + offset
+    conn.execute(text(f"ALTER SEQUENCE {sequence} INCREMENT BY {SHARD_ID_STRIDE} RESTART WITH {start}"))
+
+
+def prepare_shards() -> dict:
+    """ينشئ الجداول في كل شارد ويوزع تسلسلات المعرفات بينها. آمن للتكرار بعد إضافة شارد."""
+    for name in shards.names()[1:]:
+        Base.metadata.create_all(bind=shards.engine(name))
+
+    floor = max(shards.scatter_gather(
+        lambda session: session.execute(select(func.coalesce(func.max(Appointment.id), 0))).scalar()
+    ))
+    aligned = []
+    for offset, name in enumerate(shards.names()):
+        shard_engine = shards.engine(name)
+        if shard_engine.dialect.name != "postgresql":
+            # SQLite لا يدعم تسلسلات بخطوة: مناسب للتطوير فقط
+            continue
+        with shard_engine.begin() as conn:
+            _align_sequence(conn, offset, floor)
+        aligned.append(name)
+    return {"shards": shards.names(), "sequences_aligned": aligned, "id_floor": floor}
+
+
+def assign_clinic(clinic_id: int, shard: str):
+    """يسجل عيادة جديدة (بدون مواعيد بعد) في شارد محدد."""
+    shards.engine(shard)
+    with SessionLocal() as db:
+        if db.get(ClinicShard, clinic_id) is not None:
+            raise ValueError(f"Clinic {clinic_id} is already assigned, use 'move' instead")
+        db.add(ClinicShard(clinic_id=clinic_id, shard=shard))
+        db.commit()
+    shards.forget(clinic_id)
+
+
+# ---------------- نقل عيادة بين الشاردات ----------------
+def _copy_rows(source: str, target: str, table, doctor_ids: list[int], order_by, batch_size: int) -> int:
+    source_engine, target_engine = shards.engine(source), shards.engine(target)
+    copied = 0
+    offset = 0
+    while True:
+        with source_engine.connect() as conn:
+            rows = conn.execute(
+                select(table)
+                .where(table.c.doctor_id.in_(doctor_ids))
+                .order_by(*order_by)
+                .offset(offset)
+                .limit(batch_size)
+            ).mappings().all()
+        if not rows:
+            return copied
+
+        if table is Appointment.__table__ and target != PRIMARY_SHARD:
+            references = {(row["user_id"], row["doctor_id"], row["image_id"]) for row in rows}
+            with SessionLocal() as primary_db, shards.session(target) as shard_db:
+                for patient_id, doctor_id, image_id in references:
+                    copy_reference_rows(shard_db, primary_db, patient_id, doctor_id, image_id)
+                shard_db.commit()
+
+        with target_engine.begin() as conn:
+            conn.execute(_insert_ignore(target_engine, table), [dict(row) for row in rows])
+        copied += len(rows)
+        offset += len(rows)
+
+
+def _delete_rows(name: str, table, doctor_ids: list[int]):
+    with shards.engine(name).begin() as conn:
+        conn.execute(delete(table).where(table.c.doctor_id.in_(doctor_ids)))
+
+
+def move_clinic(clinic_id: int, target: str, batch_size: int = MOVE_BATCH_SIZE,
+                settle_seconds: float = DIRECTORY_CACHE_SECONDS) -> dict:
+    """
+    1) يعلّم العيادة "قيد النقل" فترفض الحجوزات والإلغاءات الجديدة (503)،
+    2) ينتظر انتهاء صلاحية الدليل المخزن في العمال، 3) ينسخ المواعيد والعدادات على دفعات،
+    4) يحول الدليل للشارد الجديد، 5) يحذف النسخة القديمة.
+    """
+    shards.engine(target)
+    appointments, rollups = Appointment.__table__, AppointmentRollup.__table__
+
+    with SessionLocal() as db:
+        entry = db.get(ClinicShard, clinic_id)
+        if entry is None:
+            entry = ClinicShard(clinic_id=clinic_id, shard=PRIMARY_SHARD)
+            db.add(entry)
+        source = entry.shard
+        if source == target:
+            return {"clinic_id": clinic_id, "shard": target, "appointments": 0, "rollups": 0}
+        entry.moving = True
+        db.commit()
+        doctor_ids = list(db.execute(select(Doctors.id).where(Doctors.clinic_id == clinic_id)).scalars())
+
+    try:
+        time.sleep(settle_seconds)
+        moved = _copy_rows(source, target, appointments, doctor_ids, [appointments.c.id], batch_size)
+        moved_rollups = _copy_rows(
+            source, target, rollups, doctor_ids,
+            [rollups.c.doctor_id, rollups.c.period, rollups.c.period_start], batch_size
+        )
+        with SessionLocal() as db:
+            db.execute(update(ClinicShard).where(ClinicShard.clinic_id == clinic_id).values(shard=target, moving=False))
+            db.commit()
+    except Exception:
+        with SessionLocal() as db:
+            db.execute(update(ClinicShard).where(ClinicShard.clinic_id == clinic_id).values(moving=False))
+            db.commit()
+        raise
+    finally:
+        shards.forget(clinic_id)
+
+    # الدليل يشير الآن إلى الشارد الجديد، فالنسخة القديمة لم تعد تُقرأ
+    _delete_rows(source, appointments, doctor_ids)
+    _delete_rows(source, rollups, doctor_ids)
+    logger.info("تم نقل العيادة", extra={"clinic_id": clinic_id, "source": source, "target": target,
+                                         "appointments": moved, "rollups": moved_rollups})
+    return {"clinic_id": clinic_id, "shard": target, "appointments": moved, "rollups": moved_rollups}
+
+
+# ---------------- سطر الأوامر ----------------
+# python -m core.sharding init
+# python -m core.sharding assign 7 east
+# python -m core.sharding move 7 west --batch-size 500
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m core.sharding")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("init", help="create tables on every shard and align id sequences")
+    assign = commands.add_parser("assign", help="register a new clinic on a shard")
+    assign.add_argument("clinic_id", type=int)
+    assign.add_argument("shard")
+    move = commands.add_parser("move", help="move a clinic's appointments to another shard")
+    move.add_argument("clinic_id", type=int)
+    move.add_argument("shard")
+    move.add_argument("--batch-size", type=int, default=MOVE_BATCH_SIZE)
+    move.add_argument("--settle-seconds", type=float, default=DIRECTORY_CACHE_SECONDS)
+    args = parser.parse_args(argv)
+
+    if args.command == "init":
+        print(prepare_shards())
+    elif args.command == "assign":
+        assign_clinic(args.clinic_id, args.shard)
+        print({"clinic_id": args.clinic_id, "shard": args.shard})
+    else:
+        print(move_clinic(args.clinic_id, args.shard, args.batch_size, args.settle_seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+# storage.py
+# ---------------- تخزين ملفات الصور (قرص محلي أو S3) ----------------
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Iterator, Optional
+from urllib.parse import quote
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from jose import jwt, JWTError
+
+from core.auth_utils import SECRET_KEY, ALGORITHM
+
+# ---------------- إعدادات التخزين ----------------
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")  # local أو s3
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+S3_BUCKET = os.getenv("S3_BUCKET", "clinic-images")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")        # MinIO مثلًا: http://localhost:9000
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PUBLIC_BASE_URL = os.getenv("S3_PUBLIC_BASE_URL")  # CDN أو رابط عام للـ bucket
+PRESIGN_EXPIRES_SECONDS = int(os.getenv("STORAGE_PRESIGN_EXPIRES", "900"))
+CHUNK_SIZE = 1024 * 1024
+QUARANTINE_PREFIX = ".quarantine"
+MULTIPART_PREFIX = ".multipart"
+# الملفات حتى هذا الحجم تبقى في الذاكرة عند تنزيلها للتحقق، والأكبر تذهب لملف مؤقت
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+
+class StorageBackend:
+    """الواجهة المشتركة: المفتاح (key) هو نفسه Images.filename."""
+
+    async def save(self, key: str, file: UploadFile):
+        raise NotImplementedError
+
+    def open(self, key: str) -> BinaryIO:
+        raise NotImplementedError
+
+    def read_chunks(self, key: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """يقرأ الملف على دفعات دون تحميله كاملًا؛ يرفع FileNotFoundError إن لم يوجد."""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Optional[tuple[int, float]]:
+        """(الحجم بالبايت, وقت التعديل) أو None إن لم يوجد."""
+        raise NotImplementedError
+
+    def iter_keys(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def quarantine(self, key: str):
+        raise NotImplementedError
+
+    def purge_quarantine(self, cutoff: float) -> tuple[int, int]:
+        raise NotImplementedError
+
+    def public_url(self, key: str) -> str:
+        raise NotImplementedError
+
+    # ---------------- الرفع المباشر من العميل ----------------
+    def presign_put(self, key: str, content_type: str, expires: int = PRESIGN_EXPIRES_SECONDS) -> dict:
+        raise NotImplementedError
+
+    def create_multipart(self, key: str, content_type: str) -> str:
+        raise NotImplementedError
+
+    def presign_part(self, key: str, upload_id: str, part_number: int, expires: int = PRESIGN_EXPIRES_SECONDS) -> dict:
+        raise NotImplementedError
+
+    def complete_multipart(self, key: str, upload_id: str, parts: list[tuple[int, str]]):
+        raise NotImplementedError
+
+    def abort_multipart(self, key: str, upload_id: str):
+        raise NotImplementedError
+
+
+def check_parts(parts: list[tuple[int, str]]) -> list[tuple[int, str]]:
+    """الأجزاء يجب أن تكون 1..n بالترتيب بلا فجوات ولا تكرار، وإلا يُجمع ملف ناقص أو مشوه."""
+    if not parts:
+        raise HTTPException(status_code=400, detail="parts are required to complete a multipart upload")
+    for expected, (part_number, _) in enumerate(parts, start=1):
+        if part_number != expected:
+            raise HTTPException(status_code=400, detail=f"Expected part {expected}, got part {part_number}")
+    return parts
+
+
+# ---------------- روابط موقعة للقرص المحلي ----------------
+def sign_local_url(key: str, upload_id: Optional[str] = None, part_number: Optional[int] = None,
+                   expires: int = PRESIGN_EXPIRES_SECONDS) -> str:
+    payload = {
+        "purpose": "storage-put",
+        "key": key,
+        "upload_id": upload_id,
+        "part": part_number,
+        "exp": datetime.utcnow() + timedelta(seconds=expires),
+    }
+    token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+    # المفتاح جزء واحد من المسار: أي / أو ? أو # أو مسافة فيه تُرمّز
+    return f"/images/direct/{quote(key, safe='')}?token={token}"
+
+
+def verify_local_url(key: str, token: str) -> dict:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=403, detail="Invalid or expired upload URL")
+    if payload.get("purpose") != "storage-put" or payload.get("key") != key:
+        raise HTTPException(status_code=403, detail="Invalid or expired upload URL")
+    return payload
+
+
+class LocalDiskStorage(StorageBackend):
+    """مجلد uploads على نفس الخادم (عقدة واحدة)."""
+
+    def __init__(self, root: Path = UPLOAD_DIR):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.quarantine_dir = root / QUARANTINE_PREFIX
+        self.multipart_dir = root / MULTIPART_PREFIX
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    async def save(self, key: str, file: UploadFile):
+        # ينسخ الملف على دفعات بدل قراءته كاملًا في الذاكرة
+        async with aiofiles.open(self.path(key), "wb") as out_file:
+            while chunk := await file.read(CHUNK_SIZE):
+                await out_file.write(chunk)
+
+    async def receive(self, path: Path, stream: AsyncIterator[bytes], max_bytes: int) -> str:
+        """يكتب جسم طلب PUT المباشر ويرجع md5 (ETag) أو يرفض الملف الأكبر من الحد."""
+        digest = hashlib.md5()
+        written = 0
+        try:
+            async with aiofiles.open(path, "wb") as out_file:
+                async for chunk in stream:
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise HTTPException(status_code=413, detail="File too large")
+                    digest.update(chunk)
+                    await out_file.write(chunk)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        return digest.hexdigest()
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+    async def read_chunks(self, key: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        async with aiofiles.open(self.path(key), "rb") as in_file:
+            while chunk := await in_file.read(chunk_size):
+                yield chunk
+
+    def delete(self, key: str):
+        self.path(key).unlink(missing_ok=True)
+
+    def stat(self, key: str) -> Optional[tuple[int, float]]:
+        try:
+            stat = self.path(key).stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def iter_keys(self) -> Iterator[str]:
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    yield entry.name
+
+    def quarantine(self, key: str):
+        self.quarantine_dir.mkdir(parents=True, exist_ok=True)
+        dest = self.quarantine_dir / key
+        shutil.move(str(self.path(key)), str(dest))
+        # move يحتفظ بـ mtime الأصلي؛ مدة الحجر تُحسب من لحظة الحجر وإلا حُذف الملف القديم في نفس الدورة
+        os.utime(dest)
+
+    def purge_quarantine(self, cutoff: float) -> tuple[int, int]:
+        removed = reclaimed = 0
+        if self.quarantine_dir.exists():
+            with os.scandir(self.quarantine_dir) as entries:
+                for entry in entries:
+                    stat = entry.stat(follow_symlinks=False)
+                    if entry.is_file(follow_symlinks=False) and stat.st_mtime < cutoff:
+                        os.unlink(entry.path)
+                        removed += 1
+                        reclaimed += stat.st_size
+        # أجزاء رفع متعدد لم يكتمل
+        if self.multipart_dir.exists():
+            with os.scandir(self.multipart_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+        return removed, reclaimed
+
+    def public_url(self, key: str) -> str:
+        return f"/uploads/{key}"
+
+    def presign_put(self, key: str, content_type: str, expires: int = PRESIGN_EXPIRES_SECONDS) -> dict:
+        return {"method": "PUT", "url": sign_local_url(key, expires=expires), "headers": {"Content-Type": content_type}}
+
+    def part_path(self, upload_id: str, part_number: int) -> Path:
+        return self.multipart_dir / upload_id / f"{part_number:05d}"
+
+    def create_multipart(self, key: str, content_type: str) -> str:
+        upload_id = uuid.uuid4().hex
+        (self.multipart_dir / upload_id).mkdir(parents=True)
+        return upload_id
+
+    def presign_part(self, key: str, upload_id: str, part_number: int, expires: int = PRESIGN_EXPIRES_SECONDS) -> dict:
+        return {"method": "PUT", "url": sign_local_url(key, upload_id, part_number, expires)}
+
+    def complete_multipart(self, key: str, upload_id: str, parts: list[tuple[int, str]]):
+        upload_dir = self.multipart_dir / upload_id
+        if not upload_dir.is_dir():
+            raise HTTPException(status_code=404, detail="Upload not found")
+        check_parts(parts)
+        target = self.path(key)
+        try:
+            with open(target, "wb") as out_file:
+                for part_number, etag in parts:
+                    part = self.part_path(upload_id, part_number)
+                    digest = hashlib.md5()
+                    try:
+                        with open(part, "rb") as part_file:
+                            while chunk := part_file.read(CHUNK_SIZE):
+                                digest.update(chunk)
+                                out_file.write(chunk)
+                    except FileNotFoundError:
+                        raise HTTPException(status_code=400, detail=f"Part {part_number} was not uploaded")
+                    if digest.hexdigest() != etag.strip('"'):
+                        raise HTTPException(status_code=400, detail=f"ETag mismatch for part {part_number}")
+        except BaseException:
+            # لا نترك ملفًا مجمعًا جزئيًا باسم المفتاح؛ الأجزاء تبقى ليعيد العميل المحاولة
+            target.unlink(missing_ok=True)
+            raise
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+    def abort_multipart(self, key: str, upload_id: str):
+        shutil.rmtree(self.multipart_dir / upload_id, ignore_errors=True)
+
+
+class S3Storage(StorageBackend):
+    """أي تخزين متوافق مع S3 (AWS أو MinIO). الرفع المباشر يتجاوز عامل الـ API تمامًا."""
+
+    def __init__(self, bucket: str = S3_BUCKET, endpoint_url: Optional[str] = S3_ENDPOINT_URL,
+                 region: str = S3_REGION, public_base_url: Optional[str] = S3_PUBLIC_BASE_URL, client=None):
+        if client is None:
+            try:
+                import boto3
+                from botocore.config import Config
+            except ImportError:
+                raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+            client = boto3.client(
+                "s3", endpoint_url=endpoint_url, region_name=region,
+                config=Config(signature_version="s3v4")
+            )
+        self.client = client
+        self.bucket = bucket
+        if public_base_url:
+            self.base_url = public_base_url.rstrip("/")
+        elif endpoint_url:
+            self.base_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.base_url = f"https://{bucket}.s3.{region}.amazonaws.com"
+
+    def _missing(self, error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    async def save(self, key: str, file: UploadFile):
+        # upload_fileobj يقسم الملفات الكبيرة إلى أجزاء تلقائيًا
+        await run_in_threadpool(self.client.upload_fileobj, file.file, self.bucket, key)
+
+    def open(self, key: str) -> BinaryIO:
+        buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        self.client.download_fileobj(self.bucket, key, buffer)
+        buffer.seek(0)
+        return buffer
+
+    async def read_chunks(self, key: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        from botocore.exceptions import ClientError
+        try:
+            response = await run_in_threadpool(self.client.get_object, Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(key)
+            raise
+        body = response["Body"]
+        try:
+            while chunk := await run_in_threadpool(body.read, chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def stat(self, key: str) -> Optional[tuple[int, float]]:
+        from botocore.exceptions import ClientError
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if self._missing(e):
+                return None
+            raise
+        return head["ContentLength"], head["LastModified"].timestamp()
+
+    def _list(self, prefix: str = "") -> Iterator[dict]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            yield from page.get("Contents", [])
+
+    def iter_keys(self) -> Iterator[str]:
+        for item in self._list():
+            if "/" not in item["Key"]:
+                yield item["Key"]
+
+    def quarantine(self, key: str):
+        self.client.copy_object(
+            Bucket=self.bucket, Key=f"{QUARANTINE_PREFIX}/{key}",
+            CopySource={"Bucket": self.bucket, "Key": key}
+        )
+        self.delete(key)
+
+    def purge_quarantine(self, cutoff: float) -> tuple[int, int]:
+        # الرفع المتعدد غير المكتمل يُنظف بقاعدة lifecycle على الـ bucket (AbortIncompleteMultipartUpload)
+        removed = reclaimed = 0
+        for item in self._list(f"{QUARANTINE_PREFIX}/"):
+            if item["LastModified"].timestamp() < cutoff:
+                self.client.delete_object(Bucket=self.bucket, Key=item["Key"])
+                removed += 1
+                reclaimed += item["Size"]
+        return removed, reclaimed
+
+    def public_url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def presign_put(self, key: str, content_type: str, expires: int = PRESIGN_EXPIRES_SECONDS) -> dict:
+        url = self.client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=expires,
+        )
+        return {"method": "PUT", "url": url, "headers": {"Content-Type": content_type}}
+
+    def create_multipart(self, key: str, content_type: str) -> str:
+        upload = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, ContentType=content_type)
+        return upload["UploadId"]
+
+    def presign_part(self, key: str, upload_id: str, part_number: int, expires: int = PRESIGN_EXPIRES_SECONDS) -> dict:
+        url = self.client.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": self.bucket, "Key": key, "UploadId": upload_id, "PartNumber": part_number},
+            ExpiresIn=expires,
+        )
+        return {"method": "PUT", "url": url}
+
+    def complete_multipart(self, key: str, upload_id: str, parts: list[tuple[int, str]]):
+        from botocore.exceptions import ClientError
+        check_parts(parts)
+        try:
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": number, "ETag": etag} for number, etag in parts]},
+            )
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code == "NoSuchUpload":
+                raise HTTPException(status_code=404, detail="Upload not found")
+            if code in ("InvalidPart", "InvalidPartOrder", "EntityTooSmall"):
+                raise HTTPException(status_code=400, detail=f"Invalid parts: {code}")
+            raise
+
+    def abort_multipart(self, key: str, upload_id: str):
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> StorageBackend:
+    if backend == "local":
+        return LocalDiskStorage()
+    if backend == "s3":
+        return S3Storage()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+storage = create_storage()
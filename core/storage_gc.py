@@ -0,0 +1,183 @@
+# storage_gc.py
+import heapq
+import logging
+import os
+import tempfile
+import time
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import select
+
+from database import SessionLocal
+from model.images_model import Images
+from core.storage import storage
+from core.leader import LeaderLock, run_as_leader
+
+logger = logging.getLogger(__name__)
+
+# ---------------- إعدادات تنظيف مجلد الرفع (أو الـ bucket) ----------------
+GC_GRACE_SECONDS = int(os.getenv("UPLOADS_GC_GRACE_HOURS", "24")) * 60 * 60
+GC_MODE = os.getenv("UPLOADS_GC_MODE", "quarantine")  # quarantine أو delete
+QUARANTINE_RETENTION_SECONDS = int(os.getenv("UPLOADS_QUARANTINE_DAYS", "7")) * 24 * 60 * 60
+GC_INTERVAL_SECONDS = int(os.getenv("UPLOADS_GC_INTERVAL", str(24 * 60 * 60)))
+SORT_RUN_SIZE = 100_000      # عدد الأسماء في الذاكرة أثناء الفرز الخارجي
+DB_BATCH_SIZE = 10_000
+MAX_REPORTED_MISSING = 100
+
+
+# ---------------- قراءة أسماء الملفات مرتبة بذاكرة ثابتة ----------------
+def _write_run(names: list[str]) -> str:
+    names.sort()
+    handle, path = tempfile.mkstemp(prefix="uploads-gc-", suffix=".txt")
+    with os.fdopen(handle, "w", encoding="utf-8") as run:
+        run.writelines(f"{name}\n" for name in names)
+    return path
+
+
+def _read_run(path: str) -> Iterator[str]:
+    with open(path, encoding="utf-8") as run:
+        for line in run:
+            yield line[:-1]
+
+
+def sorted_file_names(keys: Optional[Iterable[str]] = None) -> Iterator[str]:
+    """
+    يمر على مفاتيح التخزين (scandir محليًا أو list_objects في S3) ويرتبها بفرز خارجي
+    (دفعات مرتبة في ملفات مؤقتة ثم heapq.merge)، فلا يتجاوز ما في الذاكرة SORT_RUN_SIZE اسمًا.
+    """
+    runs, names = [], []
+    try:
+        for name in storage.iter_keys() if keys is None else keys:
+            if "\n" in name:
+                continue
+            names.append(name)
+            if len(names) >= SORT_RUN_SIZE:
+                runs.append(_write_run(names))
+                names = []
+
+        if not runs:
+            names.sort()
+            yield from names
+            return
+
+        if names:
+            runs.append(_write_run(names))
+        yield from heapq.merge(*(_read_run(path) for path in runs))
+    finally:
+        for path in runs:
+            os.unlink(path)
+
+
+def _sorted_image_rows(db) -> Iterator:
+    """صفوف الصور مرتبة بنفس ترتيب بايتات بايثون (collation C) وعلى دفعات من مؤشر الخادم."""
+    order = Images.filename
+    if db.get_bind().dialect.name == "postgresql":
+        order = Images.filename.collate("C")
+    stmt = (
+        select(Images.id, Images.filename)
+        .order_by(order)
+        .execution_options(yield_per=DB_BATCH_SIZE)
+    )
+    yield from db.execute(stmt)
+
+
+# ---------------- معالجة الملف اليتيم ----------------
+def _dispose_orphan(name: str, mode: str):
+    if mode == "delete":
+        storage.delete(name)
+    else:
+        storage.quarantine(name)
+
+
+def purge_quarantine(retention_seconds: int = QUARANTINE_RETENTION_SECONDS) -> tuple[int, int]:
+    """يحذف نهائيًا ما بقي في الحجر أكثر من المدة المحددة ويرجع (عدد الملفات, البايتات)."""
+    return storage.purge_quarantine(time.time() - retention_seconds)
+
+
+# ---------------- المطابقة بين المجلد وجدول الصور ----------------
+def reconcile_uploads(grace_seconds: int = GC_GRACE_SECONDS, mode: str = GC_MODE, dry_run: bool = False) -> dict:
+    """
+    دمج (merge-join) بين قائمتين مرتبتين: ملفات uploads وصفوف images.
+    الملف بلا صف وأقدم من مهلة السماح يُحجر أو يُحذف، والصف بلا ملف يُذكر في التقرير.
+    دورة واحدة فقط في كل الخوادم: دورتان متزامنتان تنقلان نفس الملفات وتضاعفان التقرير.
+    """
+    lock = LeaderLock("uploads-gc-pass")
+    if not lock.acquire():
+        logger.info("دورة تنظيف uploads جارية في عملية أخرى، تم التخطي")
+        return {"mode": "dry_run" if dry_run else mode, "skipped": True}
+    try:
+        return _reconcile(grace_seconds, mode, dry_run)
+    finally:
+        lock.release()
+
+
+def _reconcile(grace_seconds: int, mode: str, dry_run: bool) -> dict:
+    cutoff = time.time() - grace_seconds
+    report = {
+        "mode": "dry_run" if dry_run else mode,
+        "scanned_files": 0,
+        "orphan_files": 0,
+        "orphan_bytes": 0,
+        "skipped_recent": 0,
+        "missing_files": 0,
+        "missing_image_ids": [],
+        "quarantine_purged": 0,
+        "reclaimed_bytes": 0,
+    }
+
+    def handle_orphan(name: str):
+        stat = storage.stat(name)
+        if stat is None:
+            return
+        size, modified = stat
+        if modified > cutoff:
+            # قد يكون الرفع ما زال قبل commit (أو رفع مباشر لم يُستدع complete له بعد)
+            report["skipped_recent"] += 1
+            return
+        report["orphan_files"] += 1
+        report["orphan_bytes"] += size
+        if not dry_run:
+            _dispose_orphan(name, mode)
+            if mode == "delete":
+                report["reclaimed_bytes"] += size
+
+    def handle_missing(row):
+        report["missing_files"] += 1
+        if len(report["missing_image_ids"]) < MAX_REPORTED_MISSING:
+            report["missing_image_ids"].append(row.id)
+
+    with SessionLocal() as db:
+        files = sorted_file_names()
+        rows = _sorted_image_rows(db)
+        name = next(files, None)
+        row = next(rows, None)
+        while name is not None or row is not None:
+            if row is None or (name is not None and name < row.filename):
+                report["scanned_files"] += 1
+                handle_orphan(name)
+                name = next(files, None)
+            elif name is None or row.filename < name:
+                handle_missing(row)
+                row = next(rows, None)
+            else:
+                report["scanned_files"] += 1
+                matched = name
+                name = next(files, None)
+                while row is not None and row.filename == matched:
+                    row = next(rows, None)
+
+    if not dry_run:
+        purged, purged_bytes = purge_quarantine()
+        report["quarantine_purged"] = purged
+        report["reclaimed_bytes"] += purged_bytes
+    return report
+
+
+def _gc_pass():
+    report = reconcile_uploads()
+    logger.info("تنظيف uploads", extra={"gc_report": report})
+
+
+async def uploads_gc_loop(interval_seconds: int = GC_INTERVAL_SECONDS):
+    # عامل واحد يجدول الدورات، وقفل الدورة نفسها يمنع أي تشغيل يدوي متزامن معها
+    await run_as_leader("uploads-gc", _gc_pass, interval_seconds, "فشل تنظيف مجلد الرفع")
@@ -0,0 +1,64 @@
+# tasks.py
+import asyncio
+import logging
+from typing import Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTaskRegistry:
+    """
+    يحتفظ بمراجع قوية لكل المهام الخلفية (إشعارات البريد...) حتى لا تُفقد
+    أثناء إيقاف العامل، ويفرق بين مهام قصيرة تُنتظر عند الإيقاف وخدمات دائمة تُلغى.
+    """
+
+    def __init__(self):
+        self._tasks: set[asyncio.Task] = set()
+        self._services: set[asyncio.Task] = set()
+
+    def spawn(self, coro: Coroutine, name: Optional[str] = None) -> asyncio.Task:
+        """مهمة قصيرة تُنتظر حتى تنتهي عند إيقاف الخادم."""
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+        return task
+
+    def start_service(self, coro: Coroutine, name: Optional[str] = None) -> asyncio.Task:
+        """حلقة دائمة (صيانة، مستمع أحداث...) تُلغى عند إيقاف الخادم."""
+        task = asyncio.create_task(coro, name=name)
+        self._services.add(task)
+        task.add_done_callback(self._services.discard)
+        return task
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("فشلت المهمة الخلفية %s", task.get_name(), exc_info=task.exception())
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def drain(self, timeout: float) -> int:
+        """ينتظر المهام القصيرة (بما فيها ما يُنشأ أثناء الانتظار) ويرجع عدد ما أُلغي بعد المهلة."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._tasks:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.wait(set(self._tasks), timeout=remaining)
+
+        abandoned = list(self._tasks)
+        for task in abandoned:
+            task.cancel()
+        return len(abandoned)
+
+    async def stop_services(self):
+        services = list(self._services)
+        for task in services:
+            task.cancel()
+        await asyncio.gather(*services, return_exceptions=True)
+
+
+registry = BackgroundTaskRegistry()
@@ -1,7 +1,14 @@
-from sqlalchemy import create_engine
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import psycopg2
+import logging
+import os
+
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
 
 # ---------------- إعداد بيانات الاتصال ----------------
 DB_USER = "postgres"        
@@ -10,38 +17,73 @@ DB_PORT = "5432"
 DB_NAME = "progect"        
 DB_HOST="localhost"
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# psycopg (الإصدار 3) يدعم prepared statements على الخادم، بينما psycopg2 لا يدعمها
+DB_DRIVER = os.getenv("DB_DRIVER", "psycopg2")
+PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "5"))  # عدد مرات التنفيذ قبل تحضير الاستعلام
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))       # ثوانٍ قبل اعتبار الاتصال فاشلًا
+DB_BREAKER_FAILURES = int(os.getenv("DB_BREAKER_FAILURES", "5"))     # إخفاقات متتالية قبل فتح القاطع
+DB_BREAKER_RESET_SECONDS = float(os.getenv("DB_BREAKER_RESET_SECONDS", "10"))
+
+DATABASE_URL = f"postgresql+{DB_DRIVER}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 # ---------------- إعداد SQLAlchemy ----------------
-engine = create_engine(DATABASE_URL, echo=True)  # echo=True لطباعة كل الاستعلامات
+connect_args = {"connect_timeout": DB_CONNECT_TIMEOUT}
+if DB_DRIVER == "psycopg":
+    connect_args["prepare_threshold"] = PREPARE_THRESHOLD
+engine = create_engine(DATABASE_URL, connect_args=connect_args)
+# SQL_ECHO=1 لتسجيل كل الاستعلامات (عبر logger sqlalchemy.engine بدل الطباعة المباشرة)
+if os.getenv("SQL_ECHO") == "1":
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-# ---------------- اختبار psycopg2 ----------------
-try:
-    conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
-    print("✅ Connected with psycopg2!")
-    conn.close()
-except psycopg2.OperationalError as e:
-    print("❌ psycopg2 connection failed:", e)
-
-# ---------------- اختبار SQLAlchemy ----------------
-try:
-    with engine.connect() as connection:
-        print("✅ Connected with SQLAlchemy!")
-except Exception as e:
-    print("❌ SQLAlchemy connection failed:", e)
+# ---------------- قاطع الدائرة لقاعدة البيانات ----------------
+# حالة الاتصال تظهر في /health/ready (core/health.py) بدل اختبار عند الاستيراد
+db_breaker = CircuitBreaker("database", DB_BREAKER_FAILURES, DB_BREAKER_RESET_SECONDS)
+
+
+# SQLSTATE لأخطاء الاتصال نفسه: الفئة 08 وإيقاف الخادم (57P01-57P03). أما الجمود وفشل
+# التسلسل ومهلة الاستعلام أو القفل فهي OperationalError أيضًا لكنها تعني ضغطًا لا تعطلًا
+CONNECTION_SQLSTATES = ("08", "57P01", "57P02", "57P03")
+
+
+def _is_connection_error(error) -> bool:
+    # psycopg (3) يعطي sqlstate و psycopg2 يعطي pgcode
+    code = getattr(error, "sqlstate", None) or getattr(error, "pgcode", None)
+    return bool(code) and code.startswith(CONNECTION_SQLSTATES)
+
+
+@event.listens_for(engine, "handle_error")
+def _count_query_failures(context):
+    # انقطاع أثناء استعلام (بعد نجاح الاتصال) يُحسب أيضًا؛ أخطاء الاتصال تُحسب في get_db
+    if context.connection is not None and (
+        context.is_disconnect or _is_connection_error(context.original_exception)
+    ):
+        db_breaker.record_failure(context.original_exception)
+
 
 # ---------------- دالة get_db لاستخدامها مع FastAPI ----------------
 def get_db():
+    """
+    يحجز الاتصال مباشرة عبر القاطع: إذا كانت القاعدة معطلة نرد 503 فورًا
+    بدل انتظار مهلة الاتصال في كل طلب.
+    """
+    try:
+        db_breaker.before_call()
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Database is unavailable, please retry shortly",
+            headers={"Retry-After": str(int(e.retry_after))},
+        )
     db = SessionLocal()
     try:
+        try:
+            db.connection()
+        except DBAPIError as e:
+            db_breaker.record_failure(e)
+            raise HTTPException(status_code=503, detail="Database is unavailable, please retry shortly")
+        db_breaker.record_success()
         yield db
     finally:
         db.close()
@@ -0,0 +1,39 @@
+# gunicorn_conf.py
+# ---------------- تشغيل الإنتاج ----------------
+# gunicorn -c gunicorn_conf.py main:app   (أو: python server.py)
+import multiprocessing
+import os
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+# كل عامل async يخدم طلبات كثيرة، لذلك عامل لكل نواة يكفي افتراضيًا
+workers = int(os.getenv("WEB_CONCURRENCY", str(cpu_count)))
+
+# تحميل التطبيق مرة واحدة في العملية الرئيسية ومشاركة الذاكرة مع العمال (copy-on-write)
+preload_app = True
+
+# الإيقاف التدريجي: التوقف عن قبول الاتصالات ثم انتظار الطلبات والمهام الخلفية
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# إعادة تشغيل العمال تدريجيًا بعد عدد من الطلبات للحد من تضخم الذاكرة
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+
+def post_fork(server, worker):
+    # خيط مستمع السجلات لا ينتقل مع fork: مستمع وطابور جديدان لكل عامل
+    from core.logging_config import start_log_listener
+    start_log_listener()
+
+    # اتصالات قاعدة البيانات التي فتحها preload لا يجب مشاركتها بين العمليات
+    from database import engine
+    from Controller import patient_controller, doctor_controller
+    from core.sharding import shards
+
+    for shared_engine in (engine, patient_controller.engine, doctor_controller.engine):
+        shared_engine.dispose(close=False)
+    shards.dispose()
@@ -1,17 +1,92 @@
 from fastapi import FastAPI
+from core.logging_config import setup_logging, start_log_listener, stop_log_listener, RequestIdMiddleware
+from core.admission import AdmissionMiddleware
+# يجب تهيئة السجلات قبل استيراد database حتى تمر رسائل الاتصال عبر الطابور
+setup_logging()
 from database import *
 from routers import patient_router 
 from routers import dector_router 
 from routers import appointment_router 
 from routers import images
+from routers import analytics_router
+from routers import admin_router
+from routers import sync_router
+from routers import schedule_router
+from routers import export_router
+from routers import import_router
+from routers import health_router
+from core import partitioning
+from core import idempotency
+from core import events
+from core import storage_gc
+from core import health
+from core import memory
+from Controller import analytics_controller
+from Controller import export_controller
+from core.tasks import registry
+from core.audit import audit_log
+import asyncio
+import logging
+import os
+import anyio
 Base.metadata.create_all(bind=engine)
 app = FastAPI()
+# القبول داخل RequestIdMiddleware حتى تحمل ردود 503 معرف الطلب أيضًا
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(RequestIdMiddleware)
+logger = logging.getLogger(__name__)
+
+# حجم مجموعة الخيوط التي تنفذ نقاط النهاية المتزامنة (def) مشتق من عدد الأنوية
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", str(min(64, (os.cpu_count() or 1) * 8))))
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20"))
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    # مستمع السجلات لهذا العامل (لا يفعل شيئًا إن كان post_fork قد شغله)
+    start_log_listener()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # خيط كتابة سجل التدقيق على دفعات
+    audit_log.start()
+    # الصيانة والتنظيف والمطابقة تعمل في عامل واحد فقط عبر قفل استشاري (core/leader.py)
+    # إنشاء الأقسام الشهرية القادمة وأرشفة المواعيد القديمة بشكل دوري
+    registry.start_service(partitioning.partition_maintenance_loop(), name="partition-maintenance")
+    # حذف مفاتيح Idempotency المنتهية
+    registry.start_service(idempotency.idempotency_cleanup_loop(), name="idempotency-cleanup")
+    # قناة أحداث المواعيد للأطباء (LISTEN/NOTIFY مع بديل داخل العملية)
+    events.broker.bind(asyncio.get_running_loop())
+    registry.start_service(events.listen_for_notifications(), name="appointment-events")
+    # مطابقة إحصائيات المواعيد مع الجدول الأصلي
+    registry.start_service(analytics_controller.rollup_reconcile_loop(), name="rollup-reconcile")
+    # حجر/حذف الملفات اليتيمة في uploads
+    registry.start_service(storage_gc.uploads_gc_loop(), name="uploads-gc")
+    # تنفيذ مهام تصدير المواعيد (CSV / Parquet)
+    registry.start_service(export_controller.export_worker_loop(), name="export-worker")
+    # فحص قاعدة البيانات والتخزين والبريد في الخلفية لـ /health/ready
+    registry.start_service(health.health_refresh_loop(), name="health-monitor")
+    # عينات RSS الدورية لتتبع نمو ذاكرة العامل (/admin/memory)
+    registry.start_service(memory.memory_sample_loop(), name="memory-sampler")
+
+
+@app.on_event("shutdown")
+async def drain_background_jobs():
+    # انتظار الإشعارات الجارية قبل خروج العامل ثم إيقاف الحلقات الدورية
+    abandoned = await registry.drain(SHUTDOWN_DRAIN_SECONDS)
+    if abandoned:
+        logger.warning("تم إلغاء %s مهمة خلفية بعد انتهاء مهلة الإيقاف", abandoned)
+    await registry.stop_services()
+    await asyncio.to_thread(audit_log.stop)
+    stop_log_listener()
 
 @app.get("/")
 def read_root():
     return {"message": "🚀 Server is running with auto-reload!"}
 
 
+# health (موزع الحمل)
+app.include_router(health_router.router)
+
+
 # patient
 app.include_router(patient_router.router)
 
@@ -25,6 +100,19 @@ app.include_router(dector_router.router)
 # appointments
 app.include_router(appointment_router.router)
 app.include_router(images.router)
+app.include_router(schedule_router.router)
+
+# mobile sync
+app.include_router(sync_router.router)
+
+# analytics
+app.include_router(analytics_router.router)
+app.include_router(export_router.router)
+
+# admin
+app.include_router(admin_router.router)
+app.include_router(import_router.router)
 
 
-# uvicorn main:app --reload
\ No newline at end of file
+# uvicorn main:app --reload
+# الإنتاج: python server.py  (gunicorn -c gunicorn_conf.py main:app)
\ No newline at end of file
@@ -0,0 +1,23 @@
+# model/analytics_model.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Date, DateTime, Index
+from database import Base
+
+
+class AppointmentRollup(Base):
+    """عدادات المواعيد مجمعة لكل طبيب في كل يوم/أسبوع (تُحدّث مع كل حجز وإلغاء)."""
+    __tablename__ = "appointment_rollups"
+    __table_args__ = (
+        Index("ix_appointment_rollups_specialty", "period", "period_start", "specialty"),
+    )
+
+    period = Column(String(5), primary_key=True)  # day / week
+    period_start = Column(Date, primary_key=True)
+    doctor_id = Column(Integer, primary_key=True)
+    specialty = Column(String, nullable=True)
+
+    scheduled = Column(Integer, default=0, nullable=False)
+    cancelled = Column(Integer, default=0, nullable=False)
+    completed = Column(Integer, default=0, nullable=False)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
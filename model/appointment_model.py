@@ -1,22 +1,63 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, String
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, String, Index, DDL, event, text
+from datetime import datetime
 from sqlalchemy.orm import relationship
 from database import Base
 from model.patient_model import Users
 from model.doctor_model import Doctors
 from model.images_model import Images
 
-class Appointment(Base):
-    __tablename__ = "appointments"
 
+# ---------------- الأعمدة المشتركة بين الجدول الحي والأرشيف ----------------
+class AppointmentColumns:
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
     doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False)
     date_time = Column(DateTime, nullable=False)
     status = Column(String, default="Scheduled", nullable=False)
+    reason = Column(String, nullable=True)
 
     image_id = Column(Integer, ForeignKey("images.id"), nullable=True)
 
+    # المواعيد المتكررة (أسبوعية...) تحمل نفس المعرف فتُعرض وتُلغى معًا
+    series_id = Column(String(32), nullable=True)
+
+    # آخر تعديل (إنشاء / تغيير الحالة / إلغاء) لمزامنة تطبيق الجوال بالفروقات فقط
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class Appointment(AppointmentColumns, Base):
+    __tablename__ = "appointments"
+    # في Postgres الجدول مقسّم شهريًا حسب date_time (انظر core/partitioning.py)
+    __table_args__ = (
+        Index("ix_appointments_doctor_date", "doctor_id", "date_time"),
+        Index("ix_appointments_user_date", "user_id", "date_time"),
+        Index("ix_appointments_user_updated", "user_id", "updated_at", "id"),
+        Index("ix_appointments_series", "series_id", "user_id"),
+        # موعد نشط واحد فقط لكل طبيب في نفس الوقت (يمنع الحجز المزدوج عند التزامن)
+        Index(
+            "uq_appointments_doctor_slot", "doctor_id", "date_time",
+            unique=True,
+            postgresql_where=text("status <> 'Cancelled'"),
+            sqlite_where=text("status <> 'Cancelled'"),
+        ),
+        {"postgresql_partition_by": "RANGE (date_time)", "info": {"partition_key": "date_time"}},
+    )
 
     patient = relationship("Users", back_populates="appointments")
     doctor = relationship("Doctors", back_populates="appointments")
-    image = relationship("Images", back_populates="appointment")
\ No newline at end of file
+    image = relationship("Images")
+
+
+# ---------------- أرشيف المواعيد القديمة (ملغاة / مكتملة) ----------------
+class AppointmentArchive(AppointmentColumns, Base):
+    __tablename__ = "appointments_archive"
+
+    archived_at = Column(DateTime, nullable=True)
+
+
+# القسم الافتراضي يلتقط أي موعد لا يوجد له قسم شهري بعد
+event.listen(
+    Appointment.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS appointments_default PARTITION OF appointments DEFAULT").execute_if(dialect="postgresql"),
+)
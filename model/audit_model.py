@@ -0,0 +1,26 @@
+# model/audit_model.py
+from sqlalchemy import Column, BigInteger, Integer, String, Text, DateTime, Index
+from database import Base
+
+
+class AuditEvent(Base):
+    """سجل إلحاقي فقط للوصول إلى بيانات المرضى (لا تعديل ولا حذف)."""
+    __tablename__ = "audit_events"
+    __table_args__ = (
+        Index("ix_audit_events_patient_time", "patient_id", "occurred_at"),
+        Index("ix_audit_events_actor_time", "actor_type", "actor_id", "occurred_at"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    occurred_at = Column(DateTime, nullable=False)
+
+    actor_type = Column(String(20), nullable=False)   # doctor / patient / admin
+    actor_id = Column(Integer, nullable=True)
+    action = Column(String(50), nullable=False)       # مثال: appointments.list
+    resource_type = Column(String(50), nullable=False)
+    resource_id = Column(String(100), nullable=True)
+    patient_id = Column(Integer, nullable=True)
+
+    ip_address = Column(String(64), nullable=True)
+    path = Column(String(255), nullable=True)
+    details = Column(Text, nullable=True)             # JSON (أعداد الاستيراد...)
@@ -0,0 +1,15 @@
+# model/clinic_model.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from database import Base
+
+
+class ClinicShard(Base):
+    """دليل الشاردات: في أي قاعدة بيانات تُخزن مواعيد كل عيادة (يبقى في القاعدة الرئيسية)."""
+    __tablename__ = "clinic_shards"
+
+    clinic_id = Column(Integer, primary_key=True)
+    shard = Column(String(50), nullable=False, default="primary")
+    # أثناء نقل العيادة بين الشاردات نرفض الحجوزات الجديدة لها مؤقتًا
+    moving = Column(Boolean, default=False, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
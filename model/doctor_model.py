@@ -1,7 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from database import Base
-from appointment_model import Appointment
 
 class Doctors(Base):
     __tablename__ = "doctors"  
@@ -12,5 +11,12 @@ class Doctors(Base):
     phone = Column(String)
     hashed_password = Column(String, nullable=False)  # لتسجيل الدخول
 
+    # العيادة التي يتبع لها الطبيب (تحدد الشارد الذي تُخزن فيه مواعيده)
+    clinic_id = Column(Integer, nullable=True, index=True)
+
     # العلاقة مع المواعيد
     appointments = relationship("Appointment", back_populates="doctor")
+
+
+# البريد فريد بدون تمييز حالة الأحرف (نفس فهرس Controller/doctor_controller.py)
+Index("uq_doctors_email_lower", func.lower(Doctors.email), unique=True)
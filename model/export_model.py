@@ -0,0 +1,31 @@
+# model/export_model.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from database import Base
+
+
+class ExportJob(Base):
+    """مهمة تصدير سجل المواعيد إلى ملف CSV أو Parquet تُنفذ في الخلفية."""
+    __tablename__ = "export_jobs"
+    __table_args__ = (
+        # البحث عن نتيجة سابقة لنفس الطلب (نفس الفلتر والصيغة) خلال مدة الصلاحية
+        Index("ix_export_jobs_fingerprint", "fingerprint", "expires_at"),
+        Index("ix_export_jobs_queue", "status", "created_at"),
+    )
+
+    id = Column(String(32), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    format = Column(String(10), nullable=False)       # csv / parquet
+    filters = Column(Text, nullable=False)            # JSON
+    status = Column(String(20), default="queued", nullable=False)  # queued / running / done / failed
+
+    rows_written = Column(Integer, default=0, nullable=False)
+    total_rows = Column(Integer, nullable=True)
+    file_name = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)    # آخر تقدم من العامل المنفذ
+    finished_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
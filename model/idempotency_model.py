@@ -0,0 +1,25 @@
+# model/idempotency_model.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint
+from database import Base
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("scope", "key", name="uq_idempotency_scope_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(255), nullable=False)
+    scope = Column(String(100), nullable=False)  # اسم العملية + المستخدم
+    fingerprint = Column(String(64), nullable=False)  # بصمة محتوى الطلب
+    status = Column(String(20), default="in_progress", nullable=False)
+
+    # الاستجابة المخزنة لإعادة إرسالها عند تكرار الطلب
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+
+    # مهلة حجز in_progress: بعدها يستطيع طلب لاحق بنفس المفتاح تولي التنفيذ (العامل مات)
+    locked_until = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
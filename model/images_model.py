@@ -1,10 +1,14 @@
 # model/images_model.py
-from sqlalchemy import Column, Integer, String, ForeignKey
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
 class Images(Base):
     __tablename__ = "images"
+    __table_args__ = (
+        Index("ix_images_user_updated", "user_id", "updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
@@ -15,5 +19,13 @@ class Images(Base):
     user = relationship("Users", back_populates="images")
 
     # ربط بالموعد (اختياري)
-    appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=True)
-    appointment = relationship("Appointment", back_populates="images")
+    # بدون مفتاح أجنبي: جدول المواعيد مقسّم في Postgres ولا يملك فهرسًا فريدًا على id وحده
+    appointment_id = Column(Integer, nullable=True, index=True)
+    appointment = relationship(
+        "Appointment",
+        primaryjoin="foreign(Images.appointment_id) == Appointment.id",
+        viewonly=True,
+    )
+
+    # آخر تعديل لمزامنة تطبيق الجوال بالفروقات فقط
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
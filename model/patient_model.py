@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index, func
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -23,4 +23,8 @@ class Users(Base):
     
     appointments = relationship("Appointment", back_populates="patient")
     images = relationship("Images", back_populates="user")
-    
+
+
+# التفرد وتسجيل الدخول بدون تمييز حالة الأحرف (نفس فهارس Controller/patient_controller.py)
+Index("uq_patients_username_lower", func.lower(Users.username), unique=True)
+Index("uq_patients_email_lower", func.lower(Users.email), unique=True)
@@ -0,0 +1,44 @@
+# model/schedule_model.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Boolean, Date, Time, DateTime, ForeignKey, Index
+from database import Base
+
+
+class DoctorScheduleWindow(Base):
+    """
+    فترة عمل أسبوعية للطبيب. عدة فترات لنفس اليوم تعني استراحة بينها
+    (مثل 09:00-12:00 ثم 13:00-17:00). الطبيب بدون فترات يستخدم الجدول الافتراضي.
+    """
+    __tablename__ = "doctor_schedule_windows"
+    __table_args__ = (
+        Index("ix_doctor_schedule_windows_doctor", "doctor_id", "weekday"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False)
+    weekday = Column(Integer, nullable=False)          # 0 = الاثنين ... 6 = الأحد (مثل datetime.weekday)
+    start_time = Column(Time, nullable=False)          # بداية أول موعد
+    end_time = Column(Time, nullable=False)            # نهاية آخر موعد
+    slot_minutes = Column(Integer, default=30, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class DoctorScheduleException(Base):
+    """
+    استثناء ليوم محدد: إجازة (closed) أو ساعات مختلفة عن الجدول الأسبوعي
+    (عدة صفوف لنفس اليوم = عدة فترات).
+    """
+    __tablename__ = "doctor_schedule_exceptions"
+    __table_args__ = (
+        Index("ix_doctor_schedule_exceptions_doctor_day", "doctor_id", "day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    closed = Column(Boolean, default=False, nullable=False)
+    start_time = Column(Time, nullable=True)
+    end_time = Column(Time, nullable=True)
+    slot_minutes = Column(Integer, nullable=True)
+    note = Column(String(255), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
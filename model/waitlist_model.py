@@ -0,0 +1,29 @@
+# model/waitlist_model.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Index, text
+from database import Base
+
+
+class WaitlistEntry(Base):
+    __tablename__ = "waitlist"
+    __table_args__ = (
+        # يغطي استعلام "أقدم مريض منتظر" لطبيب في يوم معين (بحث B-tree)
+        Index("ix_waitlist_queue", "doctor_id", "day", "status", "created_at", "id"),
+        # المريض ينتظر مرة واحدة فقط لنفس الطبيب في نفس اليوم
+        Index(
+            "uq_waitlist_active_entry", "user_id", "doctor_id", "day",
+            unique=True,
+            postgresql_where=text("status = 'Waiting'"),
+            sqlite_where=text("status = 'Waiting'"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    status = Column(String(20), default="Waiting", nullable=False)  # Waiting / Booked / Left
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # الموعد الذي حُجز تلقائيًا عند تحرر مكان
+    appointment_id = Column(Integer, nullable=True)
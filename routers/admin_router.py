@@ -0,0 +1,135 @@
+import asyncio
+import gc
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from core.admission import admission
+from core.auth_utils import require_admin
+from core.logging_config import NonBlockingQueueHandler, get_logger_levels, set_logger_level
+from core.memory import profiler, current_rss
+from core.tasks import registry
+from Controller import doctor_controller, patient_controller
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+
+class LoggerLevel(BaseModel):
+    logger: str = "root"
+    level: str
+
+
+class TracingRequest(BaseModel):
+    frames: int = 1          # إطار واحد يكفي لمعرفة السطر وبأقل كلفة
+
+
+GroupBy = Literal["lineno", "filename", "traceback"]
+
+
+def _profiling(action):
+    try:
+        return action()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+# -------------------------------
+# 1️⃣ عرض مستويات السجلات الحالية
+# -------------------------------
+@router.get("/logging")
+def logging_levels():
+    return {"levels": get_logger_levels(), "dropped": NonBlockingQueueHandler.dropped}
+
+# -------------------------------
+# 2️⃣ تغيير مستوى logger أثناء التشغيل
+# (يطبق على العامل الذي استقبل الطلب فقط؛ استخدم LOG_LEVELS لكل العمال)
+# -------------------------------
+@router.put("/logging")
+def update_logging_level(data: LoggerLevel):
+    try:
+        set_logger_level(data.logger, data.level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"levels": get_logger_levels()}
+
+# -------------------------------
+# 3️⃣ حالة التحكم بالقبول (الطلبات الجارية والمرفوضة لكل فئة، لهذا العامل)
+# -------------------------------
+@router.get("/admission")
+def admission_status():
+    return admission.snapshot()
+
+# -------------------------------
+# 4️⃣ تشخيص الذاكرة (للعامل الذي استقبل الطلب فقط)
+# -------------------------------
+def _suspects() -> dict:
+    # هياكل تنمو مع عمر العامل ولا تُفرغ تلقائيًا
+    return {
+        "patient_blacklisted_tokens": len(patient_controller.blacklisted_tokens),
+        "doctor_blacklisted_tokens": len(doctor_controller.blacklisted_tokens),
+        "pending_background_tasks": registry.pending,
+        "asyncio_tasks": len(asyncio.all_tasks()),
+    }
+
+
+@router.get("/memory")
+async def memory_overview():
+    return {
+        **profiler.rss_report(),
+        "tracemalloc": profiler.tracing_status(),
+        "gc_counts": gc.get_count(),
+        "suspects": _suspects(),
+    }
+
+
+@router.post("/memory/tracing")
+def start_tracing(data: TracingRequest):
+    return _profiling(lambda: profiler.start(data.frames))
+
+
+@router.delete("/memory/tracing")
+def stop_tracing():
+    return profiler.stop()
+
+
+@router.get("/memory/top")
+def top_allocations(limit: int = Query(20, ge=1, le=200), group_by: GroupBy = "lineno"):
+    return {"allocations": _profiling(lambda: profiler.top(limit, group_by))}
+
+
+@router.post("/memory/baseline")
+def take_memory_baseline():
+    return _profiling(profiler.take_baseline)
+
+
+@router.get("/memory/diff")
+def allocation_diff(limit: int = Query(20, ge=1, le=200), group_by: GroupBy = "lineno"):
+    return {"baseline_at": profiler.baseline_at, "allocations": _profiling(lambda: profiler.diff(limit, group_by))}
+
+
+@router.get("/memory/gc")
+def gc_stats():
+    return profiler.gc_report()
+
+
+@router.get("/memory/objects")
+def object_counts(limit: int = Query(30, ge=1, le=500)):
+    return {"objects": profiler.object_counts(limit)}
+
+# -------------------------------
+# 5️⃣ مقاييس العامل بصيغة Prometheus
+# -------------------------------
+@router.get("/metrics", response_class=PlainTextResponse)
+async def worker_metrics():
+    metrics = {
+        "process_resident_memory_bytes": current_rss(),
+        "python_tracemalloc_traced_bytes": profiler.tracing_status().get("traced_bytes"),
+        **{f"python_gc_objects_pending_gen{generation}": count
+           for generation, count in enumerate(gc.get_count())},
+        **{f"app_{name}": value for name, value in _suspects().items()},
+    }
+    return "".join(f"{name} {value}\n" for name, value in metrics.items() if value is not None)
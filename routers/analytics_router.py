@@ -0,0 +1,34 @@
+from datetime import date
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from database import get_db
+from core.auth_utils import require_admin
+from Controller.analytics_controller import get_doctor_rollups, get_specialty_rollups
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"], dependencies=[Depends(require_admin)])
+
+# -------------------------------
+# 1️⃣ إحصائيات المواعيد لكل طبيب
+# -------------------------------
+@router.get("/doctors")
+def doctor_stats(
+    start: date,
+    end: date,
+    period: str = "day",
+    doctor_id: int | None = None,
+    db: Session = Depends(get_db)
+):
+    return get_doctor_rollups(db, period, start, end, doctor_id)
+
+# -------------------------------
+# 2️⃣ إحصائيات المواعيد لكل تخصص
+# -------------------------------
+@router.get("/specialties")
+def specialty_stats(
+    start: date,
+    end: date,
+    period: str = "day",
+    db: Session = Depends(get_db)
+):
+    return get_specialty_rollups(db, period, start, end)
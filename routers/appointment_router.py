@@ -1,6 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Header, BackgroundTasks, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from datetime import datetime, time
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, time, date, timedelta
+import asyncio
+import json
 
 from database import get_db
 from model.appointment_model import Appointment
@@ -8,6 +14,23 @@ from model.doctor_model import Doctors
 from model.patient_model import Users
 from model.images_model import Images
 from Controller.patient_controller import get_current_patient
+from Controller import doctor_controller
+from Controller.doctor_controller import get_current_doctor
+from core.queries import DOCTOR_BY_ID, ACTIVE_APPOINTMENT_AT_SLOT
+from Controller.images_controller import get_last_user_image, save_image, register_image, doctor_day_archive_entries
+from core.idempotency import run_idempotent, request_fingerprint
+from core.auth_utils import oauth2_scheme
+from core.events import broker, publish_appointment_event
+from Controller.analytics_controller import record_booking, record_cancellation
+from Controller.waitlist_controller import join_waitlist, leave_waitlist, get_user_waitlist, backfill_freed_slot
+from core.sharding import shards, copy_reference_rows
+from core.fields import APPOINTMENT_FIELDS, DOCTOR_FIELDS
+from core.holds import holds
+from core.archive import stream_zip
+from core.audit import audit_log
+from core.storage import storage
+from Controller.schedule_controller import validate_booking_slot, bookable_slots
+from Controller.series_controller import SeriesRequest, book_series, get_series, cancel_series
 
 router = APIRouter(prefix="/appointments", tags=["Appointments"])
 
@@ -15,14 +38,9 @@ router = APIRouter(prefix="/appointments", tags=["Appointments"])
 # 0️⃣ جلب كل الدكاترة
 # -------------------------------
 @router.get("/doctors")
-def get_all_doctors(db: Session = Depends(get_db)):
-    doctors = db.query(Doctors).all()
-    return {
-        "doctors": [
-            {"id": doctor.id, "name": doctor.name, "specialty": doctor.specialty}
-            for doctor in doctors
-        ]
-    }
+def get_all_doctors(fields: str | None = None, db: Session = Depends(get_db)):
+    names = DOCTOR_FIELDS.parse(fields)
+    return {"doctors": [DOCTOR_FIELDS.render(names, row) for row in db.execute(DOCTOR_FIELDS.statement(names))]}
 
 # -------------------------------
 # 1️⃣ رفع صورة
@@ -33,25 +51,9 @@ async def upload_file(
     db: Session = Depends(get_db),
     user: Users = Depends(get_current_patient)
 ):
-    # حفظ الصورة محليًا
-    import uuid, aiofiles, os
-    UPLOAD_DIR = "uploads"
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    filename = f"{uuid.uuid4().hex}_{file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    async with aiofiles.open(file_path, "wb") as out_file:
-        content = await file.read()
-        await out_file.write(content)
-
-    # تسجيل الصورة في قاعدة البيانات
-    new_image = Images(
-        user_id=user.id,
-        filename=filename,
-        url=file_path
-    )
-    db.add(new_image)
-    db.commit()
-    db.refresh(new_image)
+    # حفظ الصورة في التخزين المهيأ (محلي أو S3) ثم تسجيلها في قاعدة البيانات
+    filename = await save_image(file)
+    new_image = register_image(db, user.id, filename)
     return {"message": "File uploaded successfully", "image_id": new_image.id}
 
 # -------------------------------
@@ -63,72 +65,232 @@ def create_appointment(
     date_time: datetime,
     reason: str = None,
     db: Session = Depends(get_db),
-    user: Users = Depends(get_current_patient)
+    user: Users = Depends(get_current_patient),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key")
 ):
-    doctor = db.query(Doctors).filter(Doctors.id == doctor_id).first()
+    return run_idempotent(
+        idempotency_key,
+        f"appointments.book:{user.id}",
+        request_fingerprint(doctor_id, date_time, reason),
+        lambda: _book_appointment(db, user, doctor_id, date_time, reason)
+    )
+
+
+def _current_doctor_id(token: str) -> int:
+    """
+    الطبيب صاحب التوكن عبر get_current_doctor (جدول الأطباء + التوكنات الملغاة)، بجلسة
+    قصيرة: نقاط البث تبقى مفتوحة طويلًا فلا نحجز لها اتصالًا بقاعدة البيانات.
+    """
+    with doctor_controller.SessionLocal() as db:
+        return get_current_doctor(token, db).id
+
+
+def _get_doctor(db: Session, doctor_id: int) -> Doctors:
+    doctor = db.execute(DOCTOR_BY_ID, {"doctor_id": doctor_id}).scalars().first()
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
+    return doctor
 
-    now = datetime.now()
-    if date_time <= now:
-        raise HTTPException(status_code=400, detail="Cannot book an appointment in the past")
 
-    if date_time.time() < time(10, 0) or date_time.time() > time(16, 0):
-        raise HTTPException(status_code=400, detail="Appointment must be within working hours (10:00-16:00)")
+def _book_appointment(db: Session, user: Users, doctor_id: int, date_time: datetime, reason: str = None):
+    doctor = _get_doctor(db, doctor_id)
+    # ساعات العمل والاستراحات والإجازات ومدة الموعد حسب جدول الطبيب (من الذاكرة)
+    validate_booking_slot(db, doctor.id, date_time)
 
-    if date_time.weekday() > 4:
-        raise HTTPException(status_code=400, detail="Appointments are only allowed from Sunday to Thursday")
+    # يرفض إن كان الموعد محجوزًا مؤقتًا لغيره؛ حجز المريض نفسه لا يُحذف إلا بعد commit
+    # حتى يبقى له إن فشل الإدخال ويعيد المحاولة
+    if holds.held_by_others(doctor.id, [date_time], user.id):
+        raise HTTPException(status_code=409, detail="Slot is held by another patient")
 
-    if date_time.minute not in (0, 30):
-        raise HTTPException(status_code=400, detail="Appointments must start at 00 or 30 minutes")
+    # جلب آخر صورة رفعها المستخدم (الصور في القاعدة الرئيسية)
+    last_image = get_last_user_image(db, user.id)
+    image_id = last_image.id if last_image else None
 
-    conflict = db.query(Appointment).filter(
-        Appointment.doctor_id == doctor_id,
-        Appointment.date_time == date_time,
-        Appointment.status != "Cancelled"
-    ).first()
-    if conflict:
-        raise HTTPException(status_code=400, detail="Doctor already has an appointment at this time")
+    # مواعيد العيادة تُكتب في الشارد الخاص بها
+    with shards.session_for(shards.route(doctor.clinic_id), db) as shard_db:
+        if shard_db is not db:
+            copy_reference_rows(shard_db, db, user.id, doctor.id, image_id)
 
-    # جلب آخر صورة رفعها المستخدم
-    last_image = db.query(Images).filter(Images.user_id == user.id).order_by(Images.id.desc()).first()
-    image_id = last_image.id if last_image else None
+        conflict = shard_db.execute(
+            ACTIVE_APPOINTMENT_AT_SLOT, {"doctor_id": doctor_id, "date_time": date_time}
+        ).first()
+        if conflict:
+            raise HTTPException(status_code=400, detail="Doctor already has an appointment at this time")
 
-    new_app = Appointment(
-        user_id=user.id,
-        doctor_id=doctor.id,
-        date_time=date_time,
-        reason=reason,
-        status="Scheduled",
-        image_id=image_id
-    )
-    db.add(new_app)
-    db.commit()
-    db.refresh(new_app)
-    return {"message": "Appointment booked successfully", "appointment_id": new_app.id}
+        new_app = Appointment(
+            user_id=user.id,
+            doctor_id=doctor.id,
+            date_time=date_time,
+            reason=reason,
+            status="Scheduled",
+            image_id=image_id
+        )
+        shard_db.add(new_app)
+        try:
+            shard_db.flush()
+        except IntegrityError:
+            shard_db.rollback()
+            raise HTTPException(status_code=400, detail="Doctor already has an appointment at this time")
+        record_booking(shard_db, doctor.id, doctor.specialty, date_time)
+        publish_appointment_event(shard_db, "booked", new_app)
+        shard_db.commit()
+        appointment_id = new_app.id
+    holds.release(doctor.id, date_time, user.id)
+    return {"message": "Appointment booked successfully", "appointment_id": appointment_id}
+
+# -------------------------------
+# 2️⃣-أ حجز مؤقت للموعد أثناء تعبئة نموذج الحجز
+# -------------------------------
+@router.post("/hold")
+def hold_slot(
+    doctor_id: int,
+    date_time: datetime,
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_patient)
+):
+    doctor = _get_doctor(db, doctor_id)
+    validate_booking_slot(db, doctor.id, date_time)
+
+    with shards.session_for(shards.route(doctor.clinic_id), db) as shard_db:
+        booked = shard_db.execute(
+            ACTIVE_APPOINTMENT_AT_SLOT, {"doctor_id": doctor.id, "date_time": date_time}
+        ).first()
+    if booked:
+        raise HTTPException(status_code=409, detail="Doctor already has an appointment at this time")
+
+    if not holds.hold(doctor.id, date_time, user.id):
+        raise HTTPException(status_code=409, detail="Slot is held by another patient")
+
+    # الحجز ينتهي تلقائيًا بعد المدة، ويُستهلك عند تأكيد /book
+    return {
+        "message": "Slot held",
+        "doctor_id": doctor.id,
+        "date_time": date_time,
+        "ttl_seconds": holds.ttl_seconds,
+        "expires_at": datetime.utcnow() + timedelta(seconds=holds.ttl_seconds)
+    }
+
+
+@router.delete("/hold")
+def release_slot(
+    doctor_id: int,
+    date_time: datetime,
+    user: Users = Depends(get_current_patient)
+):
+    holds.release(doctor_id, date_time, user.id)
+    return {"message": "Hold released"}
+
+
+# -------------------------------
+# 2️⃣-ب المواعيد المتاحة لطبيب في يوم
+# -------------------------------
+@router.get("/availability")
+def get_availability(
+    doctor_id: int,
+    day: date,
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_patient)
+):
+    doctor = _get_doctor(db, doctor_id)
+    start = datetime.combine(day, time())
+    slots = bookable_slots(db, doctor.id, day)
+
+    if slots:
+        with shards.session_for(shards.route(doctor.clinic_id), db) as shard_db:
+            booked = set(shard_db.scalars(select(Appointment.date_time).where(
+                Appointment.doctor_id == doctor.id,
+                Appointment.date_time >= start,
+                Appointment.date_time < start + timedelta(days=1),
+                Appointment.status != "Cancelled"
+            )))
+        slots = [slot for slot in slots if slot not in booked]
+        # المواعيد المحجوزة مؤقتًا لمرضى آخرين لا تظهر (حجز المريض نفسه يبقى ظاهرًا له)
+        held = holds.held_by_others(doctor.id, slots, user.id)
+        slots = [slot for slot in slots if slot not in held]
+
+    return {
+        "doctor_id": doctor.id,
+        "day": day,
+        "slots": [slot.strftime("%Y-%m-%d %H:%M") for slot in slots]
+    }
 
 # -------------------------------
 # 3️⃣ عرض مواعيد المريض
 # -------------------------------
 @router.get("/my-appointments")
 def get_user_appointments(
+    fields: str | None = None,
     db: Session = Depends(get_db),
     user: Users = Depends(get_current_patient)
 ):
-    appointments = db.query(Appointment).filter(Appointment.user_id == user.id).all()
-    result = []
-    for app in appointments:
-        doctor_name = app.doctor.name if app.doctor else "Unknown"
-        image_url = app.image.url if app.image else None
-        result.append({
-            "appointment_id": app.id,
-            "doctor_name": doctor_name,
-            "date_time": app.date_time.strftime("%Y-%m-%d %H:%M"),
-            "status": app.status,
-            "reason": app.reason or "-",
-            "image_url": image_url
-        })
-    return {"appointments": result}
+    # ?fields=date_time,status يحمل الأعمدة المطلوبة فقط (ودون JOIN إن لم يُطلب الطبيب أو الصورة)
+    names = APPOINTMENT_FIELDS.parse(fields)
+    stmt = APPOINTMENT_FIELDS.statement(names).where(Appointment.user_id == user.id)
+
+    def collect(session: Session):
+        return [APPOINTMENT_FIELDS.render(names, row) for row in session.execute(stmt)]
+
+    # مواعيد المريض قد تكون في عدة شاردات (عيادات مختلفة). لا نفترض أن المعرفات فريدة
+    # بينها (SQLite أو قبل "init")، فنضم النتائج كما هي بدل دمجها حسب المعرف
+    return {"appointments": [row for rows in shards.scatter_gather(collect, db) for row in rows]}
+
+# -------------------------------
+# 3️⃣-أ عرض مواعيد الطبيب (وصول لسجلات المرضى: يُدقق)
+# -------------------------------
+@router.get("/doctor")
+def get_doctor_appointments(
+    request: Request,
+    day: date | None = Query(None, alias="date"),
+    db: Session = Depends(get_db),
+    current_doctor=Depends(get_current_doctor)
+):
+    doctor = _get_doctor(db, current_doctor.id)
+    stmt = select(
+        Appointment.id, Appointment.user_id, Appointment.date_time,
+        Appointment.status, Appointment.reason, Appointment.image_id
+    ).where(Appointment.doctor_id == doctor.id).order_by(Appointment.date_time, Appointment.id)
+    if day is not None:
+        start = datetime.combine(day, time())
+        stmt = stmt.where(Appointment.date_time >= start, Appointment.date_time < start + timedelta(days=1))
+
+    with shards.session_for(shards.route(doctor.clinic_id), db) as shard_db:
+        appointments = shard_db.execute(stmt).all()
+
+    # المرضى والصور في القاعدة الرئيسية: استعلام واحد لكل منهما
+    patient_ids = {appointment.user_id for appointment in appointments}
+    image_ids = {appointment.image_id for appointment in appointments if appointment.image_id}
+    patients = {
+        row.id: f"{row.first_name} {row.last_name}"
+        for row in db.execute(select(Users.id, Users.first_name, Users.last_name).where(Users.id.in_(patient_ids)))
+    } if patient_ids else {}
+    images = {
+        row.id: row.url
+        for row in db.execute(select(Images.id, Images.url).where(Images.id.in_(image_ids)))
+    } if image_ids else {}
+
+    # حدث لكل مريض ظهر في القائمة، وحدث منفصل لكل مريض ظهرت صورته (غير متزامن، لا يبطئ الطلب)
+    client_host = request.client.host if request.client else None
+    for patient_id in patient_ids:
+        audit_log.record("doctor", doctor.id, "appointments.list", "appointment",
+                         patient_id=patient_id, ip_address=client_host, path=request.url.path)
+    for appointment in appointments:
+        if appointment.image_id in images:
+            audit_log.record("doctor", doctor.id, "images.view", "image", resource_id=appointment.image_id,
+                             patient_id=appointment.user_id, ip_address=client_host, path=request.url.path)
+
+    return {
+        "appointments": [
+            {
+                "appointment_id": appointment.id,
+                "patient_name": patients.get(appointment.user_id, "Unknown"),
+                "date_time": appointment.date_time.isoformat(),
+                "status": appointment.status,
+                "reason": appointment.reason,
+                "image_url": images.get(appointment.image_id),
+            }
+            for appointment in appointments
+        ]
+    }
 
 # -------------------------------
 # 4️⃣ إلغاء موعد
@@ -136,23 +298,204 @@ def get_user_appointments(
 @router.delete("/cancel/{appointment_id}")
 def cancel_appointment(
     appointment_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    user: Users = Depends(get_current_patient)
+    user: Users = Depends(get_current_patient),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key")
 ):
-    appointment = db.query(Appointment).filter(
-        Appointment.id == appointment_id,
-        Appointment.user_id == user.id
-    ).first()
-    if not appointment:
+    return run_idempotent(
+        idempotency_key,
+        f"appointments.cancel:{user.id}",
+        request_fingerprint(appointment_id),
+        lambda: _cancel_appointment(db, user, appointment_id, background_tasks)
+    )
+
+
+def _cancel_appointment(db: Session, user: Users, appointment_id: int, background_tasks: BackgroundTasks):
+    shard = shards.locate_appointment(db, appointment_id, user.id)
+    if shard is None:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
-    if appointment.status == "Cancelled":
-        raise HTTPException(status_code=400, detail="Appointment already cancelled")
+    with shards.session_for(shard, db) as shard_db:
+        appointment = shard_db.query(Appointment).filter(
+            Appointment.id == appointment_id,
+            Appointment.user_id == user.id
+        ).first()
+        if not appointment:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+
+        if appointment.status == "Cancelled":
+            raise HTTPException(status_code=400, detail="Appointment already cancelled")
+
+        if appointment.date_time < datetime.now():
+            raise HTTPException(status_code=400, detail="Cannot cancel a past appointment")
+
+        appointment.status = "Cancelled"
+        record_cancellation(shard_db, appointment.doctor_id, appointment.doctor.specialty, appointment.date_time)
+        publish_appointment_event(shard_db, "cancelled", appointment)
+        shard_db.commit()
+        shard_db.refresh(appointment)
+        doctor_id, date_time = appointment.doctor_id, appointment.date_time
+
+    # ملء الموعد المتحرر من قائمة الانتظار بعد إرسال الاستجابة (في شارد عيادة الطبيب)
+    background_tasks.add_task(backfill_freed_slot, doctor_id, date_time)
+    return {"message": "Appointment cancelled successfully", "appointment_id": appointment_id}
+
+
+# -------------------------------
+# 4️⃣-أ المواعيد المتكررة (أسبوعيًا / كل أسبوعين)
+# -------------------------------
+@router.post("/series")
+def create_appointment_series(
+    data: SeriesRequest,
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_patient),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key")
+):
+    return run_idempotent(
+        idempotency_key,
+        f"appointments.series:{user.id}",
+        request_fingerprint(data.model_dump(mode="json")),
+        lambda: book_series(db, user, data)
+    )
+
+
+@router.get("/series/{series_id}")
+def get_appointment_series(
+    series_id: str,
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_patient)
+):
+    return get_series(db, user, series_id)
 
-    if appointment.date_time < datetime.now():
-        raise HTTPException(status_code=400, detail="Cannot cancel a past appointment")
 
-    appointment.status = "Cancelled"
-    db.commit()
-    db.refresh(appointment)
-    return {"message": "Appointment cancelled successfully", "appointment_id": appointment.id}
+@router.delete("/series/{series_id}")
+def cancel_appointment_series(
+    series_id: str,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_patient)
+):
+    _, cancelled = cancel_series(db, user, series_id)
+    for appointment in cancelled:
+        background_tasks.add_task(backfill_freed_slot, appointment.doctor_id, appointment.date_time)
+    return {
+        "message": "Appointment series cancelled successfully",
+        "series_id": series_id,
+        "cancelled": [appointment.id for appointment in cancelled]
+    }
+
+
+# -------------------------------
+# 5️⃣ قائمة الانتظار
+# -------------------------------
+@router.post("/waitlist")
+def join_doctor_waitlist(
+    doctor_id: int,
+    day: date,
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_patient)
+):
+    return join_waitlist(db, user, doctor_id, day)
+
+
+@router.get("/waitlist")
+def get_my_waitlist(
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_patient)
+):
+    return get_user_waitlist(db, user)
+
+
+@router.delete("/waitlist/{waitlist_id}")
+def leave_doctor_waitlist(
+    waitlist_id: int,
+    db: Session = Depends(get_db),
+    user: Users = Depends(get_current_patient)
+):
+    return leave_waitlist(db, user, waitlist_id)
+
+
+# -------------------------------
+# 6️⃣ بث تغييرات جدول الطبيب لحظيًا (Server-Sent Events)
+# -------------------------------
+SSE_HEARTBEAT_SECONDS = 15
+
+
+@router.get("/doctor/stream")
+async def stream_doctor_schedule(
+    token: str = Depends(oauth2_scheme),
+    last_event_id: str | None = Header(None, alias="Last-Event-ID")
+):
+    """
+    يبث أحداث الحجز والإلغاء الخاصة بالطبيب الحالي. عند إعادة الاتصال يرسل
+    المتصفح Last-Event-ID فنعيد إرسال ما فات، أو حدث resync إن تعذر ذلك.
+    لا يحجز الاتصال أي جلسة قاعدة بيانات.
+    """
+    # استعلام الطبيب متزامن: في خيط منفصل حتى لا يوقف كل اتصال/إعادة اتصال حلقة الأحداث
+    doctor_id = await run_in_threadpool(_current_doctor_id, token)
+    queue, missed = broker.subscribe(doctor_id, last_event_id)
+
+    def format_event(payload):
+        if payload is None:
+            return "event: resync\ndata: {}\n\n"
+        return f"id: {payload['id']}\nevent: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            for payload in ([None] if missed is None else missed):
+                yield format_event(payload)
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield format_event(payload)
+        finally:
+            broker.unsubscribe(doctor_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# -------------------------------
+# 7️⃣ تنزيل صور مواعيد الطبيب في يوم كأرشيف ZIP متدفق
+# -------------------------------
+@router.get("/doctor/images.zip")
+def download_doctor_day_images(
+    request: Request,
+    day: date = Query(..., alias="date"),
+    start: int = Query(0, ge=0),
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    """
+    يبني الأرشيف أثناء الإرسال من التخزين مباشرة. ترتيب الملفات ثابت، فإن انقطع
+    التنزيل يطلب العميل ?start=<عدد الملفات المستلمة كاملة> ليكمل بأرشيف للباقي.
+    """
+    doctor = _get_doctor(db, _current_doctor_id(token))
+    entries, patient_ids, total = doctor_day_archive_entries(db, doctor, day, start)
+    # البث قد يستمر دقائق: نعيد اتصال الطلب للمجموعة قبل إرسال أول بايت
+    db.close()
+    if not total:
+        raise HTTPException(status_code=404, detail="No images for this day")
+
+    client_host = request.client.host if request.client else None
+    for patient_id in patient_ids:
+        audit_log.record("doctor", doctor.id, "images.archive", "image",
+                         patient_id=patient_id, ip_address=client_host, path=request.url.path)
+
+    filename = f"images_{day.isoformat()}" + (f"_from_{start}" if start else "") + ".zip"
+    return StreamingResponse(
+        stream_zip(entries, storage.read_chunks),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Archive-Entries": str(total),
+            "X-Archive-Start": str(start),
+        }
+    )
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from database import get_db
+from core.auth_utils import require_admin
+from core.audit import audit_log
+from Controller.export_controller import ExportRequest, submit_export, get_export, get_export_file
+
+router = APIRouter(prefix="/exports", tags=["Exports"], dependencies=[Depends(require_admin)])
+
+
+def _audit(request: Request, action: str, job_id: str):
+    audit_log.record("admin", None, action, "export", resource_id=job_id,
+                     ip_address=request.client.host if request.client else None, path=request.url.path)
+
+
+# -------------------------------
+# 1️⃣ طلب تصدير سجل المواعيد (CSV / Parquet)
+# -------------------------------
+@router.post("/appointments")
+def export_appointments(data: ExportRequest, request: Request, db: Session = Depends(get_db)):
+    """
+    يرجع job_id فورًا ويُنفذ التصدير في الخلفية. نفس الطلب خلال مدة الصلاحية
+    يرجع نفس المهمة (cached=true) بدل إعادة التصدير
+    """
+    job = submit_export(db, data)
+    _audit(request, "appointments.export", job["job_id"])
+    return job
+
+# -------------------------------
+# 2️⃣ حالة المهمة ونسبة التقدم
+# -------------------------------
+@router.get("/{job_id}")
+def export_status(job_id: str, db: Session = Depends(get_db)):
+    return get_export(db, job_id)
+
+# -------------------------------
+# 3️⃣ تنزيل الملف الناتج
+# -------------------------------
+@router.get("/{job_id}/download")
+def download_export(job_id: str, request: Request, db: Session = Depends(get_db)):
+    path, media_type, filename = get_export_file(db, job_id)
+    _audit(request, "appointments.export.download", job_id)
+    return FileResponse(path, media_type=media_type, filename=filename)
@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+
+from core.health import monitor
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+# -------------------------------
+# 1️⃣ العملية تعمل (لا تفحص أي خدمة خارجية)
+# -------------------------------
+@router.get("/live")
+async def live():
+    return monitor.liveness()
+
+# -------------------------------
+# 2️⃣ جاهز لاستقبال الطلبات (آخر نتيجة فحص محفوظة، 503 إن تعطلت خدمة أساسية)
+# -------------------------------
+@router.get("/ready")
+async def ready():
+    is_ready, body = monitor.readiness()
+    return JSONResponse(status_code=200 if is_ready else 503, content=jsonable_encoder(body))
@@ -1,10 +1,16 @@
 
 
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Header, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from database import get_db
 from Controller.patient_controller import get_current_patient
-from Controller.images_controller import upload_to_local, get_user_images
+from Controller.images_controller import (
+    upload_to_local, upload_batch, get_user_images, file_digest,
+    CompleteUploadRequest, create_direct_upload, create_multipart_upload,
+    abort_multipart_upload, complete_direct_upload, receive_direct_put
+)
+from core.idempotency import run_idempotent_async, request_fingerprint
 
 router = APIRouter(prefix="/images", tags=["Images"])
 
@@ -14,21 +20,99 @@ async def upload_file(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     user = Depends(get_current_patient),
-    appointment_id: int | None = None
+    appointment_id: int | None = None,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key")
 ):
     """
     يرفع صورة جديدة للمستخدم الحالي، ويمكن ربطها مباشرة بموعد إن تم تمرير appointment_id
     """
-    return upload_to_local(file, user.id, db, appointment_id)
+    fingerprint = None
+    if idempotency_key:
+        fingerprint = request_fingerprint(file.filename, await file_digest(file), appointment_id)
+    return await run_idempotent_async(
+        idempotency_key,
+        f"images.upload:{user.id}",
+        fingerprint,
+        lambda: upload_to_local(file, user.id, db, appointment_id)
+    )
+
+
+# ---------------- رفع عدة صور في طلب واحد ----------------
+@router.post("/upload/batch")
+async def upload_files(
+    files: list[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    user = Depends(get_current_patient),
+    appointment_id: int | None = None
+):
+    """
+    يرفع عدة صور دفعة واحدة ويرجع حالة كل ملف على حدة
+    """
+    return await upload_batch(files, user.id, db, appointment_id)
 
 
 # ---------------- استرجاع كل صور المستخدم ----------------
 @router.get("/me")
 def get_my_images(
+    fields: str | None = None,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_patient)
+):
+    """
+    يعيد جميع الصور التي رفعها المستخدم الحالي (?fields=id,url لحقول محددة)
+    """
+    return get_user_images(db, user.id, fields)
+
+
+# ---------------- الرفع المباشر إلى التخزين ----------------
+@router.post("/uploads/presign")
+def presign_upload(
+    filename: str,
+    user = Depends(get_current_patient)
+):
+    """
+    يرجع رابط PUT موقعًا يرفع إليه التطبيق الصورة مباشرة (دون المرور بعامل الـ API
+    عند استخدام S3)، ثم يستدعي /images/uploads/complete بنفس upload_token
+    """
+    return create_direct_upload(user.id, filename)
+
+
+@router.post("/uploads/multipart")
+def start_multipart_upload(
+    filename: str,
+    size: int,
+    user = Depends(get_current_patient)
+):
+    """
+    للصور الكبيرة (الأشعة): رابط موقع لكل جزء، ويحتفظ التطبيق بـ ETag كل جزء لإرساله عند الإكمال
+    """
+    return create_multipart_upload(user.id, filename, size)
+
+
+@router.delete("/uploads/multipart")
+def cancel_multipart_upload(
+    upload_token: str,
+    user = Depends(get_current_patient)
+):
+    return abort_multipart_upload(user.id, upload_token)
+
+
+@router.post("/uploads/complete")
+def complete_upload(
+    data: CompleteUploadRequest,
     db: Session = Depends(get_db),
     user = Depends(get_current_patient)
 ):
     """
-    يعيد جميع الصور التي رفعها المستخدم الحالي
+    يتحقق من الملف المرفوع ويسجله في جدول الصور
+    """
+    return complete_direct_upload(db, user.id, data)
+
+
+@router.put("/direct/{key}")
+async def direct_put(key: str, token: str, request: Request):
+    """
+    يستقبل الرفع عبر الروابط الموقعة عندما يكون التخزين قرصًا محليًا (STORAGE_BACKEND=local)
     """
-    return get_user_images(db, user.id)
+    result = await receive_direct_put(key, token, request.stream())
+    return JSONResponse(result, headers={"ETag": result["etag"]})
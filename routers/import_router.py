@@ -0,0 +1,28 @@
+import io
+
+from fastapi import APIRouter, Depends, File, Request, UploadFile
+from sqlalchemy.orm import Session
+
+from database import get_db
+from core.auth_utils import require_admin
+from core.audit import audit_log
+from Controller.import_controller import import_accounts
+
+router = APIRouter(prefix="/imports", tags=["Imports"], dependencies=[Depends(require_admin)])
+
+# -------------------------------
+# 1️⃣ استيراد أطباء / مرضى عيادة جديدة من ملف CSV
+# -------------------------------
+@router.post("/{kind}")
+def import_csv(kind: str, request: Request, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+    kind = patients أو doctors. الملف يُقرأ كتدفق على دفعات (لا يُحمّل كاملًا في الذاكرة)،
+    والنتيجة تقرير بعدد الصفوف المضافة والموجودة مسبقًا والأخطاء وسرعة الاستيراد
+    """
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    report = import_accounts(db, kind, stream)
+    counts = {key: report[key] for key in ("rows_read", "inserted", "already_existing", "invalid")}
+    audit_log.record("admin", None, f"{kind}.import", kind, resource_id=(file.filename or "")[:100] or None,
+                     ip_address=request.client.host if request.client else None, path=request.url.path,
+                     details=counts)
+    return report
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from database import get_db
+from core.auth_utils import require_admin
+from Controller.schedule_controller import (
+    ScheduleWindowRequest,
+    ScheduleExceptionRequest,
+    get_doctor_schedule,
+    replace_weekly_schedule,
+    add_schedule_exception,
+    delete_schedule_exception,
+)
+
+router = APIRouter(prefix="/schedules", tags=["Schedules"])
+
+# -------------------------------
+# 1️⃣ عرض جدول عمل الطبيب
+# -------------------------------
+@router.get("/{doctor_id}")
+def doctor_schedule(doctor_id: int, db: Session = Depends(get_db)):
+    return get_doctor_schedule(db, doctor_id)
+
+# -------------------------------
+# 2️⃣ استبدال الجدول الأسبوعي (قائمة فارغة = الجدول الافتراضي)
+# -------------------------------
+@router.put("/{doctor_id}/weekly", dependencies=[Depends(require_admin)])
+def update_weekly_schedule(doctor_id: int, windows: list[ScheduleWindowRequest], db: Session = Depends(get_db)):
+    return replace_weekly_schedule(db, doctor_id, windows)
+
+# -------------------------------
+# 3️⃣ إجازة أو ساعات خاصة ليوم محدد
+# -------------------------------
+@router.post("/{doctor_id}/exceptions", dependencies=[Depends(require_admin)])
+def create_schedule_exception(doctor_id: int, data: ScheduleExceptionRequest, db: Session = Depends(get_db)):
+    return add_schedule_exception(db, doctor_id, data)
+
+
+@router.delete("/{doctor_id}/exceptions/{exception_id}", dependencies=[Depends(require_admin)])
+def remove_schedule_exception(doctor_id: int, exception_id: int, db: Session = Depends(get_db)):
+    return delete_schedule_exception(db, doctor_id, exception_id)
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from database import get_db
+from Controller.patient_controller import get_current_patient
+from Controller.sync_controller import get_changes
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+# -------------------------------
+# 1️⃣ التغييرات منذ آخر مزامنة (مواعيد + صور)
+# -------------------------------
+@router.get("")
+def sync_changes(
+    since: str | None = None,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_patient)
+):
+    """
+    بدون since يرجع كل البيانات (المزامنة الأولى)، وبعدها يرسل التطبيق المؤشر
+    الذي استلمه ليحصل على ما تغير فقط. إن كانت has_more صحيحة يعيد الطلب فورًا.
+    """
+    return get_changes(db, user.id, since)
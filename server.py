@@ -0,0 +1,32 @@
+# server.py
+# ---------------- نقطة تشغيل الإنتاج ----------------
+# python server.py
+import os
+import sys
+
+from gunicorn_conf import bind, workers, graceful_timeout
+
+
+def run():
+    try:
+        from gunicorn.app.wsgiapp import run as gunicorn_run
+    except ImportError:
+        # gunicorn غير متوفر على Windows: عدة عمليات عبر uvicorn بدون preload
+        import uvicorn
+
+        host, port = bind.rsplit(":", 1)
+        uvicorn.run(
+            "main:app",
+            host=host,
+            port=int(port),
+            workers=workers,
+            timeout_graceful_shutdown=graceful_timeout,
+        )
+        return
+
+    sys.argv = ["gunicorn", "-c", os.path.join(os.path.dirname(__file__), "gunicorn_conf.py"), "main:app"]
+    gunicorn_run()
+
+
+if __name__ == "__main__":
+    run()
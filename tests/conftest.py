@@ -0,0 +1,87 @@
+# conftest.py
+# الاختبارات تُشغل من جذر المستودع: python -m pytest -q
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+
+# ---------------- ثلاث قواعد SQLite (رئيسية + شاردان) مشتركة بين الاختبارات ----------------
+class ClusterSeed(NamedTuple):
+    """الصفوف المزروعة في القاعدة الرئيسية: عيادة على الرئيسية وأخرى على east."""
+    primary_clinic: int = 1
+    east_clinic: int = 2
+    primary_doctor: int = 10
+    east_doctor: int = 20
+    patient: int = 1
+
+
+@pytest.fixture
+def seed() -> ClusterSeed:
+    return ClusterSeed()
+
+
+@pytest.fixture
+def cluster(tmp_path, monkeypatch, seed):
+    # استيراد متأخر: وحدات التطبيق تحتاج جذر المستودع في sys.path أولًا
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    from core import sharding
+    from Controller import analytics_controller
+    from model.doctor_model import Doctors
+    from model.patient_model import Users
+
+    primary_engine = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(sharding, "engine", primary_engine)
+    monkeypatch.setattr(sharding, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=primary_engine))
+    registry = sharding.ShardRegistry({
+        "east": f"sqlite:///{tmp_path / 'east.db'}",
+        "west": f"sqlite:///{tmp_path / 'west.db'}",
+    })
+    for module in (sharding, analytics_controller):
+        monkeypatch.setattr(module, "shards", registry)
+
+    Base.metadata.create_all(bind=primary_engine)
+    sharding.prepare_shards()
+    with sharding.SessionLocal() as db:
+        db.add(Users(id=seed.patient, email="p@example.com", username="patient", first_name="P", last_name="Q",
+                     hashed_password="x"))
+        db.add(Doctors(id=seed.primary_doctor, name="Dr Primary", email="a@example.com", hashed_password="x",
+                       specialty="cardiology", clinic_id=seed.primary_clinic))
+        db.add(Doctors(id=seed.east_doctor, name="Dr East", email="b@example.com", hashed_password="x",
+                       specialty="cardiology", clinic_id=seed.east_clinic))
+        db.commit()
+    sharding.assign_clinic(seed.east_clinic, "east")
+    yield registry
+    for name in registry.names():
+        registry.engine(name).dispose()
+
+
+@pytest.fixture
+def book(cluster, seed):
+    from core import sharding
+    from Controller import analytics_controller
+    from model.appointment_model import Appointment
+
+    def book(doctor_id: int, clinic_id: int, when: datetime, patient_id: int = seed.patient) -> int:
+        """يحجز كما يفعل المسار: الصفوف المرجعية ثم الموعد والعدادات في شارد العيادة."""
+        with sharding.SessionLocal() as primary_db:
+            with cluster.session_for(cluster.route(clinic_id), primary_db) as shard_db:
+                if shard_db is not primary_db:
+                    sharding.copy_reference_rows(shard_db, primary_db, patient_id, doctor_id)
+                appointment = Appointment(user_id=patient_id, doctor_id=doctor_id, date_time=when, status="Scheduled")
+                shard_db.add(appointment)
+                shard_db.flush()
+                analytics_controller.record_booking(shard_db, doctor_id, "cardiology", when)
+                shard_db.commit()
+                return appointment.id
+
+    return book
@@ -0,0 +1,114 @@
+# test_audit.py
+# ملفات فائض سجل التدقيق: ملف لكل عملية، وإعادة إدخال لا تكرر ولا تفقد الأحداث
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from core import audit
+from database import Base
+from model.audit_model import AuditEvent
+
+PROCESSES = 3
+EVENTS_PER_PROCESS = 300
+
+
+@pytest.fixture
+def audit_db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'audit.db'}")
+    Base.metadata.create_all(engine, tables=[AuditEvent.__table__])
+    monkeypatch.setattr(audit, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def _spill_events(spill_dir: str, process: int):
+    """عامل gunicorn آخر: طابوره ممتلئ فيكتب كل حدث في ملف الفائض."""
+    writer = audit.AuditLogWriter(queue_size=1, spill_path=Path(spill_dir) / "audit_spill.jsonl")
+    for n in range(EVENTS_PER_PROCESS):
+        writer._spill([_event(f"{process}-{n}")])
+
+
+def _event(resource_id: str) -> dict:
+    return {
+        "occurred_at": datetime.utcnow(), "actor_type": "patient", "actor_id": 1, "action": "test.spill",
+        "resource_type": "test", "resource_id": resource_id, "patient_id": 1, "ip_address": None, "path": None,
+        "details": None,
+    }
+
+
+def _resource_ids(engine) -> list[str]:
+    with engine.connect() as conn:
+        return list(conn.execute(select(AuditEvent.resource_id)).scalars())
+
+
+def test_processes_spill_to_their_own_files_while_replaying(tmp_path, audit_db):
+    writer = audit.AuditLogWriter(flush_events=50, spill_path=tmp_path / "audit_spill.jsonl")
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_spill_events, args=(str(tmp_path), n)) for n in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    # إعادة الإدخال تعمل في نفس الوقت الذي تكتب فيه العمليات الأخرى
+    while any(worker.is_alive() for worker in workers):
+        writer.replay_spill()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    writer.replay_spill()
+
+    ids = _resource_ids(audit_db)
+    assert len(ids) == PROCESSES * EVENTS_PER_PROCESS
+    assert set(ids) == {f"{p}-{n}" for p in range(PROCESSES) for n in range(EVENTS_PER_PROCESS)}
+    assert writer._spill_files() == []
+
+
+def test_failed_replay_resumes_after_the_last_committed_batch(tmp_path, audit_db, monkeypatch):
+    writer = audit.AuditLogWriter(flush_events=10, spill_path=tmp_path / "audit_spill.jsonl")
+    writer._spill([_event(str(n)) for n in range(35)])
+
+    insert = writer._insert
+    calls = []
+
+    def flaky_insert(batch):
+        calls.append(len(batch))
+        if len(calls) == 3:
+            raise RuntimeError("database went away")
+        insert(batch)
+
+    monkeypatch.setattr(writer, "_insert", flaky_insert)
+    assert writer.replay_spill() == 20
+    assert len(writer._spill_files()) == 1
+
+    monkeypatch.setattr(writer, "_insert", insert)
+    assert writer.replay_spill() == 15
+    assert sorted(_resource_ids(audit_db), key=int) == [str(n) for n in range(35)]
+    assert list(tmp_path.glob("audit_spill*")) == []
+
+
+def test_replay_skips_a_file_locked_by_another_replayer(tmp_path, audit_db):
+    if audit.fcntl is None:
+        pytest.skip("fcntl is not available")
+    writer = audit.AuditLogWriter(spill_path=tmp_path / "audit_spill.jsonl")
+    writer._spill([_event("1")])
+    [path] = writer._spill_files()
+    with open(path, "rb") as held:
+        # عملية أخرى أخذت الملف (قفل ثم نقل) وما زالت تعيد إدخاله
+        audit.fcntl.flock(held.fileno(), audit.fcntl.LOCK_EX)
+        path.rename(tmp_path / "audit_spill.other.replaying")
+        assert writer.replay_spill() == 0
+        # صاحب الملف لا ينتظر انتهاءها: يكتب في ملف جديد
+        writer._spill([_event("2")])
+        assert len(writer._spill_files()) == 2
+    assert writer.replay_spill() == 2
+    assert sorted(_resource_ids(audit_db)) == ["1", "2"]
+
+
+def test_legacy_shared_spill_file_is_replayed(tmp_path, audit_db):
+    writer = audit.AuditLogWriter(spill_path=tmp_path / "audit_spill.jsonl")
+    writer._spill([_event("old")])
+    [own] = writer._spill_files()
+    own.rename(tmp_path / "audit_spill.jsonl")
+    assert writer.replay_spill() == 1
+    assert _resource_ids(audit_db) == ["old"]
@@ -0,0 +1,61 @@
+# test_circuit_breaker.py
+# قاطع قاعدة البيانات يعد انقطاع الاتصال فقط، لا مهلات الاستعلام والأقفال والجمود
+import os
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+import database
+from core.circuit_breaker import CircuitBreaker
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker("test-database", failure_threshold=1)
+    monkeypatch.setattr(database, "db_breaker", breaker)
+    return breaker
+
+
+@pytest.fixture
+def pg_engine():
+    engine = create_engine(POSTGRES_URL)
+    event.listen(engine, "handle_error", database._count_query_failures)
+    yield engine
+    engine.dispose()
+
+
+def test_statement_timeout_does_not_count(breaker, pg_engine):
+    with pg_engine.connect() as conn:
+        conn.execute(text("SET statement_timeout = 50"))
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT pg_sleep(1)"))
+    assert breaker.snapshot()["consecutive_failures"] == 0
+
+
+def test_lock_timeout_does_not_count(breaker, pg_engine):
+    with pg_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS breaker_probe (id int)"))
+    try:
+        with pg_engine.connect() as holder, pg_engine.connect() as waiter:
+            holder.execute(text("LOCK TABLE breaker_probe IN ACCESS EXCLUSIVE MODE"))
+            waiter.execute(text("SET lock_timeout = 50"))
+            with pytest.raises(OperationalError):
+                waiter.execute(text("SELECT * FROM breaker_probe"))
+    finally:
+        with pg_engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS breaker_probe"))
+    assert breaker.snapshot()["consecutive_failures"] == 0
+    assert breaker.snapshot()["state"] == "closed"
+
+
+def test_dropped_connection_counts(breaker, pg_engine):
+    with pg_engine.connect() as conn, pg_engine.connect() as admin:
+        pid = conn.execute(text("SELECT pg_backend_pid()")).scalar()
+        admin.execute(text("SELECT pg_terminate_backend(:pid)"), {"pid": pid})
+        with pytest.raises(DBAPIError):
+            conn.execute(text("SELECT 1"))
+    assert breaker.snapshot()["state"] == "open"
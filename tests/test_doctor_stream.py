@@ -0,0 +1,27 @@
+# test_doctor_stream.py
+# بث أحداث جدول الطبيب (SSE): التحقق من التوكن لا يعمل على حلقة الأحداث
+import asyncio
+import threading
+
+from routers import appointment_router
+
+DOCTOR_ID = 20
+
+
+def test_stream_resolves_the_doctor_off_the_event_loop(monkeypatch):
+    lookups = []
+
+    def current_doctor_id(token):
+        lookups.append(threading.current_thread())
+        return DOCTOR_ID
+
+    monkeypatch.setattr(appointment_router, "_current_doctor_id", current_doctor_id)
+
+    async def connect():
+        response = await appointment_router.stream_doctor_schedule(token="token", last_event_id=None)
+        first = await response.body_iterator.__anext__()
+        await response.body_iterator.aclose()
+        return first
+
+    assert asyncio.run(connect()) == "retry: 3000\n\n"
+    assert len(lookups) == 1 and lookups[0] is not threading.main_thread()
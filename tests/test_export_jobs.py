@@ -0,0 +1,57 @@
+# test_export_jobs.py
+# حجز مهام التصدير: المهمة الجارية لا تُستعاد ما دام عاملها يرسل نبضًا
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from Controller import export_controller
+from model.export_model import ExportJob
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'exports.db'}")
+    ExportJob.__table__.create(engine)
+    monkeypatch.setattr(export_controller, "SessionLocal", sessionmaker(bind=engine))
+    yield export_controller.SessionLocal
+    engine.dispose()
+
+
+def _running_job(session_factory, started_ago: timedelta, heartbeat_ago: timedelta) -> str:
+    now = datetime.utcnow()
+    with session_factory() as db:
+        db.add(ExportJob(
+            id="job1", fingerprint="f" * 64, format="csv", filters="{}", status="running",
+            created_at=now - started_ago, started_at=now - started_ago,
+            heartbeat_at=now - heartbeat_ago, expires_at=now + timedelta(days=1),
+        ))
+        db.commit()
+    return "job1"
+
+
+def test_long_running_job_with_heartbeat_is_not_reclaimed(jobs):
+    # بدأت قبل ساعتين (أطول من مهلة التعطل) لكن العامل ما زال يحدّث التقدم
+    _running_job(jobs, timedelta(hours=2), timedelta(seconds=1))
+    assert export_controller._claim_next_job() is None
+
+
+def test_progress_update_bumps_heartbeat(jobs):
+    job_id = _running_job(jobs, timedelta(hours=2), timedelta(hours=1))
+    export_controller._update_job(job_id, rows_written=10)
+    with jobs() as db:
+        job = db.get(ExportJob, job_id)
+        assert job.rows_written == 10
+        assert datetime.utcnow() - job.heartbeat_at < timedelta(seconds=5)
+    assert export_controller._claim_next_job() is None
+
+
+def test_job_without_heartbeat_is_reclaimed(jobs):
+    stale = timedelta(seconds=export_controller.EXPORT_STALE_SECONDS + 60)
+    job_id = _running_job(jobs, stale, stale)
+    assert export_controller._claim_next_job() == job_id
+    with jobs() as db:
+        job = db.get(ExportJob, job_id)
+        assert job.status == "running"
+        assert datetime.utcnow() - job.heartbeat_at < timedelta(seconds=5)
@@ -0,0 +1,91 @@
+# test_holds.py
+# الحجوزات المؤقتة على Redis (fakeredis) وتسلسلها مع الحجز الفعلي
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from core import holds as holds_module
+from core import sharding
+from model.appointment_model import Appointment
+from model.patient_model import Users
+from routers import appointment_router
+
+fakeredis = pytest.importorskip("fakeredis")
+
+DOCTOR, PATIENT, OTHER_PATIENT = 20, 1, 2
+SLOT = (datetime.now() + timedelta(days=2)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def redis_holds():
+    return holds_module.create_hold_store(client=fakeredis.FakeRedis())
+
+
+def test_hold_is_exclusive_and_extendable(redis_holds):
+    assert redis_holds.hold(DOCTOR, SLOT, PATIENT)
+    assert redis_holds.hold(DOCTOR, SLOT, PATIENT)          # تمديد لنفس المريض
+    assert not redis_holds.hold(DOCTOR, SLOT, OTHER_PATIENT)
+    assert redis_holds.held_by_others(DOCTOR, [SLOT], OTHER_PATIENT) == {SLOT}
+    assert redis_holds.held_by_others(DOCTOR, [SLOT], PATIENT) == set()
+
+
+def test_release_keeps_other_patients_hold(redis_holds):
+    redis_holds.hold(DOCTOR, SLOT, PATIENT)
+    redis_holds.release(DOCTOR, SLOT, OTHER_PATIENT)
+    assert redis_holds.held_by_others(DOCTOR, [SLOT], OTHER_PATIENT) == {SLOT}
+    redis_holds.release(DOCTOR, SLOT, PATIENT)
+    assert redis_holds.hold(DOCTOR, SLOT, OTHER_PATIENT)
+
+
+def test_hold_expires_without_cleanup():
+    store = holds_module.SlotHolds(holds_module.RedisHoldStore(fakeredis.FakeRedis(), ttl_seconds=1))
+    assert store.hold(DOCTOR, SLOT, PATIENT)
+    time.sleep(1.1)
+    assert store.hold(DOCTOR, SLOT, OTHER_PATIENT)
+
+
+def test_redis_outage_does_not_block_booking():
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    client.connection_pool.connection_kwargs["server"].connected = False
+    store = holds_module.create_hold_store(client=client)
+    assert store.hold(DOCTOR, SLOT, PATIENT)
+    assert store.held_by_others(DOCTOR, [SLOT], OTHER_PATIENT) == set()
+
+
+@pytest.fixture
+def booking(cluster, seed, redis_holds, monkeypatch):
+    monkeypatch.setattr(appointment_router, "shards", cluster)
+    monkeypatch.setattr(appointment_router, "holds", redis_holds)
+    monkeypatch.setattr(appointment_router, "validate_booking_slot", lambda db, doctor_id, date_time: None)
+    with sharding.SessionLocal() as db:
+        yield db, db.get(Users, seed.patient), redis_holds
+
+
+def test_hold_survives_failed_booking_and_is_released_after_commit(booking, cluster, seed, book):
+    db, patient, store = booking
+    store.hold(seed.east_doctor, SLOT, seed.patient)
+
+    # الموعد محجوز فعليًا في الشارد: الإدخال يفشل والحجز المؤقت يبقى للمريض
+    taken = book(seed.east_doctor, seed.east_clinic, SLOT)
+    with pytest.raises(HTTPException) as error:
+        appointment_router._book_appointment(db, patient, seed.east_doctor, SLOT)
+    assert error.value.status_code == 400
+    assert store.held_by_others(seed.east_doctor, [SLOT], OTHER_PATIENT) == {SLOT}
+
+    with cluster.session("east") as shard_db:
+        shard_db.get(Appointment, taken).status = "Cancelled"
+        shard_db.commit()
+    result = appointment_router._book_appointment(db, patient, seed.east_doctor, SLOT)
+    assert result["appointment_id"] != taken
+    assert store.held_by_others(seed.east_doctor, [SLOT], OTHER_PATIENT) == set()
+
+
+def test_booking_rejected_while_another_patient_holds(booking, seed):
+    db, patient, store = booking
+    store.hold(seed.east_doctor, SLOT, OTHER_PATIENT)
+    with pytest.raises(HTTPException) as error:
+        appointment_router._book_appointment(db, patient, seed.east_doctor, SLOT)
+    assert error.value.status_code == 409
+    assert store.held_by_others(seed.east_doctor, [SLOT], seed.patient) == {SLOT}
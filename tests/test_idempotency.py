@@ -0,0 +1,71 @@
+# test_idempotency.py
+# حجز مفاتيح Idempotency ومهلة in_progress على SQLite
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.idempotency import IdempotencyStore
+from model.idempotency_model import IdempotencyKey
+
+KEY, SCOPE, FINGERPRINT = "key-1", "appointments.book:1", "f" * 64
+
+
+@pytest.fixture
+def store(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'idempotency.db'}")
+    IdempotencyKey.__table__.create(engine)
+    yield IdempotencyStore(sessionmaker(bind=engine), lease=timedelta(seconds=30))
+    engine.dispose()
+
+
+def _shift(store, **columns):
+    """يحرك أعمدة الوقت للماضي بدل الانتظار."""
+    with store.session_factory() as db:
+        db.query(IdempotencyKey).update(columns, synchronize_session=False)
+        db.commit()
+
+
+def test_completed_request_is_replayed(store):
+    assert store.begin(KEY, SCOPE, FINGERPRINT) is None
+    store.complete(KEY, SCOPE, 200, {"id": 7})
+    replay = store.begin(KEY, SCOPE, FINGERPRINT)
+    assert replay.status_code == 200
+    assert replay.body == b'{"id":7}'
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+
+def test_different_request_with_same_key_is_rejected(store):
+    store.begin(KEY, SCOPE, FINGERPRINT)
+    with pytest.raises(HTTPException) as error:
+        store.begin(KEY, SCOPE, "0" * 64)
+    assert error.value.status_code == 422
+
+
+def test_in_progress_key_conflicts_until_lease_expires(store):
+    assert store.begin(KEY, SCOPE, FINGERPRINT) is None
+    with pytest.raises(HTTPException) as error:
+        store.begin(KEY, SCOPE, FINGERPRINT)
+    assert error.value.status_code == 409
+
+    # العامل الأول مات دون complete/release: بعد المهلة يتولى طلب واحد فقط
+    _shift(store, locked_until=datetime.utcnow() - timedelta(seconds=1))
+    assert store.begin(KEY, SCOPE, FINGERPRINT) is None
+    with pytest.raises(HTTPException) as error:
+        store.begin(KEY, SCOPE, FINGERPRINT)
+    assert error.value.status_code == 409
+
+    store.complete(KEY, SCOPE, 201, {"ok": True})
+    assert store.begin(KEY, SCOPE, FINGERPRINT).status_code == 201
+
+
+def test_expired_key_is_reserved_again(store):
+    store.begin(KEY, SCOPE, FINGERPRINT)
+    store.complete(KEY, SCOPE, 200, {"id": 1})
+    _shift(store, expires_at=datetime.utcnow() - timedelta(seconds=1))
+    assert store.begin(KEY, SCOPE, "0" * 64) is None
+    with store.session_factory() as db:
+        row = db.query(IdempotencyKey).one()
+        assert (row.status, row.fingerprint) == ("in_progress", "0" * 64)
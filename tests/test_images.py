@@ -0,0 +1,67 @@
+# test_images.py
+# ربط الصور بالمواعيد: المريض يربط صوره بمواعيده فقط، وأرشيف الطبيب لا يضم صور مريض آخر
+from datetime import date, datetime
+
+import pytest
+from fastapi import HTTPException
+
+from core import sharding
+from Controller import images_controller
+from model.doctor_model import Doctors
+from model.images_model import Images
+from model.patient_model import Users
+
+OTHER_PATIENT = 2
+DAY = date(2030, 1, 6)
+
+
+@pytest.fixture
+def clinic(cluster, monkeypatch):
+    monkeypatch.setattr(images_controller, "shards", cluster)
+    with sharding.SessionLocal() as db:
+        db.add(Users(id=OTHER_PATIENT, email="o@example.com", username="other", first_name="O", last_name="Q",
+                     hashed_password="x"))
+        db.commit()
+    with sharding.SessionLocal() as db:
+        yield db
+
+
+@pytest.mark.parametrize("clinic_name", ["primary", "east"])
+def test_appointment_must_belong_to_the_uploader(clinic, seed, book, clinic_name):
+    clinic_id = seed.east_clinic if clinic_name == "east" else seed.primary_clinic
+    doctor_id = seed.east_doctor if clinic_name == "east" else seed.primary_doctor
+    appointment_id = book(doctor_id, clinic_id, datetime(2030, 1, 6, 10, 0))
+
+    images_controller.ensure_own_appointment(clinic, seed.patient, appointment_id)
+    images_controller.ensure_own_appointment(clinic, OTHER_PATIENT, None)
+    with pytest.raises(HTTPException) as error:
+        images_controller.ensure_own_appointment(clinic, OTHER_PATIENT, appointment_id)
+    assert error.value.status_code == 404
+
+
+def test_direct_upload_rejects_another_patients_appointment(clinic, seed, book):
+    appointment_id = book(seed.east_doctor, seed.east_clinic, datetime(2030, 1, 6, 10, 0))
+    data = images_controller.CompleteUploadRequest(
+        upload_token=images_controller._upload_token(OTHER_PATIENT, "never-uploaded.png"),
+        appointment_id=appointment_id,
+    )
+    with pytest.raises(HTTPException) as error:
+        images_controller.complete_direct_upload(clinic, OTHER_PATIENT, data)
+    assert error.value.status_code == 404
+    assert clinic.query(Images).count() == 0
+
+
+def test_day_archive_only_includes_the_appointment_patients_images(clinic, seed, book):
+    appointment_id = book(seed.east_doctor, seed.east_clinic, datetime(2030, 1, 6, 10, 0))
+    clinic.add_all([
+        Images(filename="mine.png", url="/uploads/mine.png", user_id=seed.patient, appointment_id=appointment_id),
+        # صف قديم رُبط بموعد مريض آخر قبل التحقق من الملكية
+        Images(filename="planted.png", url="/uploads/planted.png", user_id=OTHER_PATIENT,
+               appointment_id=appointment_id),
+    ])
+    clinic.commit()
+
+    doctor = clinic.get(Doctors, seed.east_doctor)
+    entries, patients, total = images_controller.doctor_day_archive_entries(clinic, doctor, DAY)
+    assert [entry.key for entry in entries] == ["mine.png"]
+    assert patients == [seed.patient] and total == 1
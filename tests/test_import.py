@@ -0,0 +1,52 @@
+# test_import.py
+# مسار COPY للاستيراد الجماعي مع المشغلين psycopg2 وpsycopg (الإصدار 3) على Postgres حقيقي.
+import io
+import os
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+
+from Controller import import_controller
+from model.patient_model import Users
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+@pytest.fixture(params=["psycopg2", "psycopg"])
+def pg_session(request):
+    pytest.importorskip(request.param)
+    engine = create_engine(make_url(POSTGRES_URL).set(drivername=f"postgresql+{request.param}"))
+    Users.__table__.create(engine, checkfirst=True)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        yield db
+    engine.dispose()
+
+
+def test_copy_import_with_each_driver(pg_session):
+    tag = uuid.uuid4().hex[:10]
+    rows = "".join(f"u{tag}{i},u{tag}{i}@example.com,First,Last,secret{i}\n" for i in range(5))
+    csv_file = io.StringIO("username,email,first_name,last_name,password\n" + rows
+                           + f"u{tag}0,other{tag}@example.com,First,Last,x\n"
+                           + "broken,not-an-email,First,Last,x\n")
+    try:
+        report = import_controller.import_accounts(pg_session, "patients", csv_file, batch_size=3, workers=2)
+        assert report["rows_read"] == 7
+        assert report["inserted"] == 5
+        assert report["invalid"] == 2
+        stored = pg_session.execute(
+            select(func.count()).select_from(Users).where(Users.username.like(f"u{tag}%"))
+        ).scalar()
+        assert stored == 5
+        # إعادة نفس الملف لا تضيف شيئًا (ON CONFLICT DO NOTHING)
+        csv_file.seek(0)
+        again = import_controller.import_accounts(pg_session, "patients", csv_file, batch_size=3, workers=2)
+        assert again["inserted"] == 0
+        assert again["already_existing"] == 5
+    finally:
+        pg_session.execute(delete(Users).where(Users.username.like(f"u{tag}%")))
+        pg_session.commit()
@@ -0,0 +1,101 @@
+# test_sharding.py
+# التوجيه والقراءة الموزعة ونقل العيادات على ثلاث قواعد SQLite (رئيسية + شاردان)
+import threading
+from datetime import date, datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from core import sharding
+from Controller import analytics_controller
+from model.analytics_model import AppointmentRollup
+from model.appointment_model import Appointment
+from model.clinic_model import ClinicShard
+from model.doctor_model import Doctors
+from model.patient_model import Users
+
+
+def count(registry, shard: str, model) -> int:
+    with registry.session(shard) as db:
+        return db.execute(select(func.count()).select_from(model)).scalar()
+
+
+def test_route_follows_clinic_directory(cluster, seed):
+    assert cluster.route(seed.east_clinic) == "east"
+    assert cluster.route(seed.primary_clinic) == sharding.PRIMARY_SHARD
+    assert cluster.route(None) == sharding.PRIMARY_SHARD
+
+    with sharding.SessionLocal() as db:
+        db.get(ClinicShard, seed.east_clinic).moving = True
+        db.commit()
+    cluster.forget(seed.east_clinic)
+    with pytest.raises(HTTPException) as error:
+        cluster.route(seed.east_clinic)
+    assert error.value.status_code == 503
+
+
+def test_bookings_are_written_to_the_clinic_shard(cluster, seed, book):
+    book(seed.east_doctor, seed.east_clinic, datetime(2030, 1, 6, 10, 0))
+    assert count(cluster, "east", Appointment) == 1
+    assert count(cluster, sharding.PRIMARY_SHARD, Appointment) == 0
+    # صف المريض والطبيب نُسخا بنفس المعرف حتى تتحقق المفاتيح الأجنبية
+    with cluster.session("east") as db:
+        assert db.get(Users, seed.patient) is not None and db.get(Doctors, seed.east_doctor) is not None
+
+
+def test_scatter_gather_reads_every_shard_and_keeps_request_session_in_caller_thread(cluster, seed, book):
+    # SQLite لا يوزع التسلسلات، فالمعرف نفسه يتكرر بين الشاردات
+    first = book(seed.primary_doctor, seed.primary_clinic, datetime(2030, 1, 6, 10, 0))
+    second = book(seed.east_doctor, seed.east_clinic, datetime(2030, 1, 6, 10, 30))
+    assert first == second
+
+    caller = threading.current_thread()
+    primary_threads = []
+
+    def collect(session):
+        if session is primary_db:
+            primary_threads.append(threading.current_thread())
+        return session.execute(select(Appointment.id, Appointment.doctor_id).where(Appointment.user_id == seed.patient)).all()
+
+    with sharding.SessionLocal() as primary_db:
+        results = cluster.scatter_gather(collect, primary_db)
+
+    assert [sorted(row.doctor_id for row in rows) for rows in results] == [[seed.primary_doctor], [seed.east_doctor], []]
+    assert primary_threads == [caller]
+
+
+def test_rollups_are_read_and_reconciled_across_shards(cluster, seed, book):
+    when = datetime.combine(date.today(), datetime.min.time()).replace(hour=10)
+    book(seed.primary_doctor, seed.primary_clinic, when)
+    book(seed.east_doctor, seed.east_clinic, when)
+
+    with sharding.SessionLocal() as db:
+        rows = analytics_controller.get_doctor_rollups(db, "day", when.date(), when.date())["rows"]
+        assert [(row["doctor_id"], row["scheduled"]) for row in rows] == [(seed.primary_doctor, 1), (seed.east_doctor, 1)]
+        specialties = analytics_controller.get_specialty_rollups(db, "day", when.date(), when.date())["rows"]
+        assert [(row["specialty"], row["scheduled"]) for row in specialties] == [("cardiology", 2)]
+
+    # انحراف في عدادات الشارد يُصحح من مواعيد نفس الشارد
+    with cluster.session("east") as db:
+        db.execute(AppointmentRollup.__table__.update().values(scheduled=99))
+        db.commit()
+    assert analytics_controller.reconcile_rollups() == 4
+    with cluster.session("east") as db:
+        assert set(db.execute(select(AppointmentRollup.scheduled)).scalars()) == {1}
+
+
+def test_move_clinic_copies_rows_then_switches_directory(cluster, seed, book):
+    for hour in (10, 11, 12):
+        book(seed.east_doctor, seed.east_clinic, datetime(2030, 1, 6, hour, 0))
+
+    report = sharding.move_clinic(seed.east_clinic, "west", batch_size=2, settle_seconds=0)
+
+    assert report == {"clinic_id": seed.east_clinic, "shard": "west", "appointments": 3, "rollups": 2}
+    assert cluster.route(seed.east_clinic) == "west"
+    assert count(cluster, "west", Appointment) == 3
+    assert count(cluster, "west", AppointmentRollup) == 2
+    assert count(cluster, "east", Appointment) == 0
+    assert count(cluster, "east", AppointmentRollup) == 0
+    with cluster.session("west") as db:
+        assert db.get(Users, seed.patient) is not None
@@ -0,0 +1,83 @@
+# test_storage.py
+# التخزين المحلي: روابط الرفع الموقعة، تجميع الرفع متعدد الأجزاء، ومدة الحجر
+import hashlib
+import os
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pytest
+from fastapi import HTTPException
+
+from core.storage import LocalDiskStorage, sign_local_url, verify_local_url
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalDiskStorage(tmp_path)
+
+
+def _upload_parts(storage, upload_id, *chunks):
+    etags = []
+    for number, chunk in enumerate(chunks, start=1):
+        path = storage.part_path(upload_id, number)
+        path.write_bytes(chunk)
+        etags.append((number, hashlib.md5(chunk).hexdigest()))
+    return etags
+
+
+def test_signed_url_quotes_the_key():
+    key = "scan 1#a?b.jpg"
+    url = urlsplit(sign_local_url(key))
+    assert url.path == "/images/direct/scan%201%23a%3Fb.jpg"
+    assert set(parse_qs(url.query)) == {"token"}
+    # FastAPI يفك ترميز معامل المسار قبل المقارنة بالمفتاح الموقع
+    token = parse_qs(url.query)["token"][0]
+    assert verify_local_url(unquote(url.path.rsplit("/", 1)[1]), token)["key"] == key
+
+
+def test_complete_multipart_assembles_parts(storage):
+    upload_id = storage.create_multipart("scan.bin", "application/octet-stream")
+    etags = _upload_parts(storage, upload_id, b"a" * 10, b"b" * 5)
+    storage.complete_multipart("scan.bin", upload_id, etags)
+    assert storage.path("scan.bin").read_bytes() == b"a" * 10 + b"b" * 5
+    assert not (storage.multipart_dir / upload_id).exists()
+
+
+@pytest.mark.parametrize("broken", ["etag", "missing"])
+def test_failed_completion_removes_partial_target(storage, broken):
+    upload_id = storage.create_multipart("scan.bin", "application/octet-stream")
+    etags = _upload_parts(storage, upload_id, b"a" * 10, b"b" * 5)
+    if broken == "etag":
+        etags[1] = (2, '"' + "0" * 32 + '"')
+    else:
+        storage.part_path(upload_id, 2).unlink()
+    with pytest.raises(HTTPException) as error:
+        storage.complete_multipart("scan.bin", upload_id, etags)
+    assert error.value.status_code == 400
+    assert not storage.path("scan.bin").exists()
+    # الأجزاء السليمة تبقى ليعيد العميل المحاولة
+    assert storage.part_path(upload_id, 1).exists()
+
+
+@pytest.mark.parametrize("order", [[2, 1], [1, 3], []])
+def test_complete_multipart_rejects_bad_part_lists(storage, order):
+    upload_id = storage.create_multipart("scan.bin", "application/octet-stream")
+    etags = dict(_upload_parts(storage, upload_id, b"a", b"b", b"c"))
+    with pytest.raises(HTTPException) as error:
+        storage.complete_multipart("scan.bin", upload_id, [(number, etags[number]) for number in order])
+    assert error.value.status_code == 400
+    assert not storage.path("scan.bin").exists()
+
+
+def test_quarantined_file_survives_retention(storage, monkeypatch):
+    from core import storage_gc
+    monkeypatch.setattr(storage_gc, "storage", storage)
+    old = time.time() - 10 * 24 * 60 * 60
+    storage.path("orphan.jpg").write_bytes(b"x" * 10)
+    os.utime(storage.path("orphan.jpg"), (old, old))
+
+    storage_gc._dispose_orphan("orphan.jpg", "quarantine")
+    # المهلة تبدأ من الحجر، لا من عمر الملف الأصلي
+    assert storage_gc.purge_quarantine(retention_seconds=7 * 24 * 60 * 60) == (0, 0)
+    assert (storage.quarantine_dir / "orphan.jpg").exists()
+    assert storage.purge_quarantine(time.time() + 60) == (1, 10)
@@ -0,0 +1,136 @@
+# test_storage_s3.py
+# S3Storage على bucket وهمي من moto (نفس واجهة boto3 التي يستخدمها MinIO أو AWS)
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from fastapi import HTTPException
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from botocore.config import Config  # noqa: E402
+
+from core.storage import QUARANTINE_PREFIX, S3Storage  # noqa: E402
+
+BUCKET = "clinic-images-test"
+PART_SIZE = 5 * 1024 * 1024   # أصغر جزء يقبله S3 (عدا الأخير)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1", config=Config(signature_version="s3v4"))
+        client.create_bucket(Bucket=BUCKET)
+        yield S3Storage(bucket=BUCKET, region="us-east-1", client=client)
+
+
+def _put(storage, key, body=b"image"):
+    storage.client.put_object(Bucket=storage.bucket, Key=key, Body=body)
+
+
+def _upload_parts(storage, key, upload_id, *chunks):
+    parts = []
+    for number, chunk in enumerate(chunks, start=1):
+        response = storage.client.upload_part(Bucket=storage.bucket, Key=key, UploadId=upload_id,
+                                              PartNumber=number, Body=chunk)
+        parts.append((number, response["ETag"]))
+    return parts
+
+
+def _read_all(storage, key, chunk_size=4):
+    async def collect():
+        return b"".join([chunk async for chunk in storage.read_chunks(key, chunk_size)])
+    return asyncio.run(collect())
+
+
+def test_presign_put(s3):
+    grant = s3.presign_put("scan.png", "image/png", expires=60)
+    url = urlsplit(grant["url"])
+    query = parse_qs(url.query)
+    assert grant["method"] == "PUT"
+    assert grant["headers"] == {"Content-Type": "image/png"}
+    assert url.path.endswith("/scan.png") and BUCKET in grant["url"]
+    assert query["X-Amz-Expires"] == ["60"]
+    assert "content-type" in query["X-Amz-SignedHeaders"][0]
+
+
+def test_multipart_upload_roundtrip(s3):
+    upload_id = s3.create_multipart("big.png", "image/png")
+    grant = s3.presign_part("big.png", upload_id, 2)
+    query = parse_qs(urlsplit(grant["url"]).query)
+    assert grant["method"] == "PUT"
+    assert query["uploadId"] == [upload_id] and query["partNumber"] == ["2"]
+
+    first, last = b"a" * PART_SIZE, b"b" * 10
+    parts = _upload_parts(s3, "big.png", upload_id, first, last)
+    s3.complete_multipart("big.png", upload_id, parts)
+
+    size, modified = s3.stat("big.png")
+    assert size == PART_SIZE + 10
+    assert modified > (datetime.now(timezone.utc) - timedelta(minutes=5)).timestamp()
+    assert hashlib.md5(_read_all(s3, "big.png", PART_SIZE)).hexdigest() == hashlib.md5(first + last).hexdigest()
+
+
+@pytest.mark.parametrize("parts", [
+    [],
+    [(2, '"b"'), (1, '"a"')],     # بترتيب غير صحيح
+    [(1, '"a"'), (3, '"c"')],     # فجوة
+    [(1, '"a"'), (1, '"a"')],     # تكرار
+])
+def test_complete_multipart_rejects_bad_part_lists(s3, parts):
+    upload_id = s3.create_multipart("big.png", "image/png")
+    with pytest.raises(HTTPException) as error:
+        s3.complete_multipart("big.png", upload_id, parts)
+    assert error.value.status_code == 400
+    assert s3.stat("big.png") is None
+
+
+def test_complete_multipart_with_wrong_etag(s3):
+    upload_id = s3.create_multipart("big.png", "image/png")
+    _upload_parts(s3, "big.png", upload_id, b"a" * 10)
+    with pytest.raises(HTTPException) as error:
+        s3.complete_multipart("big.png", upload_id, [(1, '"' + "0" * 32 + '"')])
+    assert error.value.status_code == 400
+
+
+def test_abort_multipart(s3):
+    upload_id = s3.create_multipart("big.png", "image/png")
+    _upload_parts(s3, "big.png", upload_id, b"a" * 10)
+    s3.abort_multipart("big.png", upload_id)
+    assert s3.client.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    assert s3.stat("big.png") is None
+
+
+def test_stat_and_read_chunks(s3):
+    _put(s3, "scan.png", b"0123456789")
+    assert s3.stat("scan.png")[0] == 10
+    assert s3.stat("missing.png") is None
+    assert _read_all(s3, "scan.png") == b"0123456789"
+    with pytest.raises(FileNotFoundError):
+        _read_all(s3, "missing.png")
+
+
+def test_iter_keys_skips_prefixes(s3):
+    _put(s3, "a.png")
+    _put(s3, "b.png")
+    _put(s3, f"{QUARANTINE_PREFIX}/old.png")
+    assert sorted(s3.iter_keys()) == ["a.png", "b.png"]
+
+
+def test_quarantine_and_purge(s3):
+    _put(s3, "orphan.png", b"12345")
+    s3.quarantine("orphan.png")
+    assert s3.stat("orphan.png") is None
+    assert s3.stat(f"{QUARANTINE_PREFIX}/orphan.png")[0] == 5
+    assert list(s3.iter_keys()) == []
+
+    # المهلة تُحسب من وقت الحجر (وقت النسخ)، فالملف المحجور الآن يبقى
+    now = datetime.now(timezone.utc).timestamp()
+    assert s3.purge_quarantine(now - 3600) == (0, 0)
+    assert s3.purge_quarantine(now + 3600) == (1, 5)
+    assert s3.stat(f"{QUARANTINE_PREFIX}/orphan.png") is None
@@ -0,0 +1,84 @@
+# test_tasks.py
+# إيقاف العامل أثناء إعادة التشغيل التدريجية: إشعارات الدخول الجارية تُنتظر ولا تُلغى،
+# بينما الخدمات الدائمة تُلغى (نفس ترتيب drain_background_jobs في main.py)
+import asyncio
+
+from core.tasks import registry
+
+NOTIFICATION_SECONDS = 0.2
+DRAIN_TIMEOUT = 5
+
+
+async def _send_login_notification(sent: list, email: str, delay: float = NOTIFICATION_SECONDS):
+    """بديل بطيء لـ send_login_notification (لا بريد حقيقي)."""
+    await asyncio.sleep(delay)
+    sent.append(email)
+
+
+async def _service():
+    while True:
+        await asyncio.sleep(3600)
+
+
+async def _shutdown() -> int:
+    abandoned = await registry.drain(DRAIN_TIMEOUT)
+    await registry.stop_services()
+    return abandoned
+
+
+def test_drain_awaits_every_notification():
+    async def scenario():
+        sent = []
+        service = registry.start_service(_service(), name="test-service")
+        tasks = [
+            registry.spawn(_send_login_notification(sent, f"p{n}@example.com"), name="login-notification")
+            for n in range(5)
+        ]
+        assert registry.pending == 5
+
+        abandoned = await _shutdown()
+
+        assert abandoned == 0
+        assert sorted(sent) == sorted(f"p{n}@example.com" for n in range(5))
+        assert all(task.done() and not task.cancelled() for task in tasks)
+        assert service.cancelled()
+        assert registry.pending == 0
+
+    asyncio.run(scenario())
+
+
+def test_drain_awaits_tasks_spawned_while_draining():
+    async def scenario():
+        sent = []
+        late = []
+
+        async def notify_then_spawn():
+            # تسجيل دخول يكتمل أثناء الإيقاف ويطلق إشعارًا جديدًا
+            await _send_login_notification(sent, "first@example.com")
+            late.append(registry.spawn(_send_login_notification(sent, "late@example.com"), name="login-notification"))
+
+        first = registry.spawn(notify_then_spawn(), name="login-notification")
+
+        abandoned = await _shutdown()
+
+        assert abandoned == 0
+        assert sent == ["first@example.com", "late@example.com"]
+        assert len(late) == 1
+        assert not first.cancelled() and late[0].done() and not late[0].cancelled()
+        assert registry.pending == 0
+
+    asyncio.run(scenario())
+
+
+def test_drain_cancels_only_after_timeout():
+    async def scenario():
+        sent = []
+        slow = registry.spawn(_send_login_notification(sent, "slow@example.com", delay=10), name="login-notification")
+        abandoned = await registry.drain(0.1)
+        await asyncio.gather(slow, return_exceptions=True)
+        assert abandoned == 1
+        assert slow.cancelled()
+        assert sent == []
+        assert registry.pending == 0
+
+    asyncio.run(scenario())